@@ -0,0 +1,278 @@
+"""Pub/sub backplane that joins the WebSocket managers of every worker and node.
+
+Each broadcast is fanned out to the local clients directly and published
+once to the backplane; every other process receives it and fans it out to
+its own clients. Envelopes carry a message id and the publishing node's id,
+so a node never re-delivers its own messages (or one it has already seen).
+
+Backends: "memory" (one process, or several managers sharing an
+InMemoryHub in tests), "redis" (pub/sub on REDIS_URL) and "postgres"
+(LISTEN/NOTIFY on the application database).
+"""
+import abc
+import asyncio
+import json
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional, Set
+from config import DATABASE_URL, REDIS_URL, WS_BACKPLANE, WS_BACKPLANE_CHANNEL
+from metrics import Counter
+
+Deliver = Callable[[dict], Awaitable[None]]
+
+# Postgres rejects NOTIFY payloads of 8000 bytes or more; longer envelopes
+# go out as chunks "#<chunk id>:<index>:<count>:<piece>" (whole ones start with "{")
+PG_NOTIFY_MAX_BYTES = 7999
+PG_CHUNK_PREFIX = "#"
+PG_CHUNK_HEADER_BYTES = 64
+PG_MAX_PARTIAL = 64  # envelopes being reassembled at once
+RETRY_SECONDS = 1.0
+
+
+class Backplane(abc.ABC):
+    name = "base"
+
+    def __init__(self):
+        self.node_id = uuid.uuid4().hex
+        self._deliver: Optional[Deliver] = None
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self.published = Counter("ws_backplane_published_total", "Envelopes published to other nodes")
+        self.received = Counter("ws_backplane_received_total", "Envelopes received from other nodes")
+        self.publish_failures = Counter("ws_backplane_publish_failures_total", "Envelopes that could not be published")
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        pass
+
+    def envelope(self, text: str, room: Optional[str], exclude_session: Optional[str], coalesce_key: Optional[str]) -> dict:
+        return {
+            "id": uuid.uuid4().hex,
+            "node": self.node_id,
+            "room": room,
+            "exclude": exclude_session,
+            "key": coalesce_key,
+            "text": text,
+        }
+
+    async def publish(self, envelope: dict):
+        """Send an envelope to every other node; failures only cost remote delivery"""
+        self._remember(envelope["id"])
+        try:
+            await self._publish(json.dumps(envelope, separators=(",", ":")))
+            self.published.inc()
+        except Exception as e:
+            self.publish_failures.inc()
+            print(f"[BACKPLANE] Publish failed on {self.name}: {e!r}")
+
+    @abc.abstractmethod
+    async def _publish(self, payload: str):
+        ...
+
+    async def _receive(self, payload):
+        envelope = json.loads(payload)
+        # Our own messages come back on Redis and Postgres channels: skip them
+        if envelope.get("node") == self.node_id or not self._remember(envelope.get("id")):
+            return
+        self.received.inc()
+        if self._deliver is not None:
+            await self._deliver(envelope)
+
+    def _remember(self, message_id: str) -> bool:
+        """Record a message id; False if it was already seen"""
+        if message_id in self._seen:
+            return False
+        self._seen[message_id] = None
+        if len(self._seen) > 10000:
+            self._seen.popitem(last=False)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "node": self.node_id,
+            "published": self.published.value,
+            "received": self.received.value,
+            "publish_failures": self.publish_failures.value,
+        }
+
+
+class InMemoryHub:
+    """In-process stand-in for a broker: every attached backplane is one "node" """
+
+    def __init__(self):
+        self.members: List["InMemoryBackplane"] = []
+
+
+class InMemoryBackplane(Backplane):
+    name = "memory"
+
+    def __init__(self, hub: Optional[InMemoryHub] = None):
+        super().__init__()
+        self.hub = hub or InMemoryHub()
+        self.hub.members.append(self)
+
+    async def _publish(self, payload: str):
+        for member in list(self.hub.members):
+            if member is not self:
+                await member._receive(payload)
+
+    async def stop(self):
+        if self in self.hub.members:
+            self.hub.members.remove(self)
+
+
+class RedisBackplane(Backplane):
+    name = "redis"
+
+    def __init__(self, url: str = REDIS_URL, channel: str = WS_BACKPLANE_CHANNEL, client=None):
+        super().__init__()
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url)
+        self.client = client
+        self.channel = channel
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.channel)
+        self._listener = asyncio.get_running_loop().create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub):
+        while True:
+            try:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None:
+                    await self._receive(message["data"])
+            except asyncio.CancelledError:
+                await pubsub.aclose()
+                raise
+            except Exception as e:
+                print(f"[BACKPLANE] Redis listener error, retrying: {e!r}")
+                await asyncio.sleep(RETRY_SECONDS)
+
+    async def _publish(self, payload: str):
+        await self.client.publish(self.channel, payload)
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+
+class PostgresBackplane(Backplane):
+    """LISTEN/NOTIFY over a dedicated asyncpg connection per process"""
+
+    name = "postgres"
+
+    def __init__(self, dsn: str, channel: str = WS_BACKPLANE_CHANNEL):
+        super().__init__()
+        # asyncpg wants a plain libpq URL, not an SQLAlchemy one
+        self.dsn = dsn.replace("postgresql+asyncpg://", "postgresql://").replace("postgres://", "postgresql://")
+        self.channel = channel
+        self._connection = None
+        self._supervisor: Optional[asyncio.Task] = None
+        # One asyncpg connection runs one statement at a time
+        self._publish_lock = asyncio.Lock()
+        self._pending: Set[asyncio.Task] = set()
+        self._partial: "OrderedDict[str, List[str]]" = OrderedDict()
+        self.chunked = Counter("ws_backplane_chunked_total", "Envelopes split across several NOTIFY payloads")
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        await self._connect()
+        self._supervisor = asyncio.get_running_loop().create_task(self._supervise())
+
+    async def _connect(self):
+        import asyncpg
+
+        self._connection = await asyncpg.connect(self.dsn)
+        await self._connection.add_listener(self.channel, self._on_notify)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        if payload.startswith(PG_CHUNK_PREFIX):
+            payload = self._reassemble(payload)
+            if payload is None:
+                return
+        task = asyncio.get_running_loop().create_task(self._receive(payload))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _supervise(self):
+        """Reconnect and re-LISTEN if the listening connection drops"""
+        while True:
+            await asyncio.sleep(RETRY_SECONDS)
+            if self._connection is not None and not self._connection.is_closed():
+                continue
+            try:
+                await self._connect()
+                print("[BACKPLANE] Postgres listener reconnected")
+            except Exception as e:
+                print(f"[BACKPLANE] Postgres reconnect failed: {e!r}")
+
+    async def _publish(self, payload: str):
+        parts = chunk_payload(payload)
+        if len(parts) > 1:
+            self.chunked.inc()
+        async with self._publish_lock:
+            # Notifications of one transaction are delivered together and in
+            # order, so listeners see every chunk of an envelope or none
+            async with self._connection.transaction():
+                for part in parts:
+                    await self._connection.execute("SELECT pg_notify($1, $2)", self.channel, part)
+
+    def _reassemble(self, part: str) -> Optional[str]:
+        """Collect one chunk; returns the whole payload once its last chunk arrives"""
+        chunk_id, index, count, piece = part[len(PG_CHUNK_PREFIX):].split(":", 3)
+        pieces = self._partial.setdefault(chunk_id, [])
+        if int(index) != len(pieces):
+            # An earlier chunk went missing (the listener reconnected): drop it
+            del self._partial[chunk_id]
+            return None
+        pieces.append(piece)
+        if len(pieces) < int(count):
+            if len(self._partial) > PG_MAX_PARTIAL:
+                self._partial.popitem(last=False)
+            return None
+        del self._partial[chunk_id]
+        return "".join(pieces)
+
+    async def stop(self):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            self._supervisor = None
+        if self._connection is not None and not self._connection.is_closed():
+            await self._connection.close()
+        self._connection = None
+
+
+def chunk_payload(payload: str, limit: int = PG_NOTIFY_MAX_BYTES) -> List[str]:
+    """Split a payload into NOTIFY-sized parts (itself, if it already fits)"""
+    if len(payload.encode()) <= limit:
+        return [payload]
+    if not payload.isascii():
+        # Envelopes come from json.dumps, which escapes everything else
+        raise ValueError("only ASCII payloads can be chunked")
+    size = limit - PG_CHUNK_HEADER_BYTES
+    pieces = [payload[start:start + size] for start in range(0, len(payload), size)]
+    chunk_id = uuid.uuid4().hex
+    return [f"{PG_CHUNK_PREFIX}{chunk_id}:{index}:{len(pieces)}:{piece}" for index, piece in enumerate(pieces)]
+
+
+def create_backplane() -> Backplane:
+    if WS_BACKPLANE == "memory":
+        return InMemoryBackplane()
+    if WS_BACKPLANE == "redis":
+        return RedisBackplane(REDIS_URL)
+    if WS_BACKPLANE == "postgres":
+        if not DATABASE_URL.startswith("postgres"):
+            raise ValueError("WS_BACKPLANE=postgres needs a PostgreSQL DATABASE_URL")
+        return PostgresBackplane(DATABASE_URL)
+    raise ValueError(f"Unknown WS_BACKPLANE: {WS_BACKPLANE}")
@@ -0,0 +1,111 @@
+"""Batching stage between receiving client WebSocket messages and broadcasting them.
+
+Messages from one session (and room) are held for WS_BATCH_WINDOW_MS. An
+update that supersedes an earlier one still in the window (same type and
+target ``data.field``, or a repeated resync notice) replaces it, and whatever
+is left goes out as one frame: the message itself if only one remains,
+otherwise ``{"type": "batch", "messages": [...]}``.
+"""
+import asyncio
+import itertools
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+from config import WS_BATCH_MAX_MESSAGES, WS_BATCH_WINDOW_MS
+from metrics import Counter
+from websocket_manager import NOTIFICATION_TYPES, ConnectionManager, manager
+
+BucketKey = Tuple[str, Optional[str]]  # (sender session, room)
+
+
+def supersede_key(message: dict) -> Optional[Hashable]:
+    """Messages with equal keys from one sender replace each other"""
+    message_type = message.get("type")
+    if message_type in NOTIFICATION_TYPES:
+        return (message_type,)
+    data = message.get("data")
+    if isinstance(data, dict) and data.get("field") is not None:
+        # Edit operations also name the row and, for JSON fields, the key
+        return (message_type, data.get("entity"), data.get("id"), str(data["field"]), data.get("key"))
+    return None
+
+
+class MessageBatcher:
+    def __init__(self, manager: ConnectionManager, window_ms: float = WS_BATCH_WINDOW_MS,
+                 max_messages: int = WS_BATCH_MAX_MESSAGES):
+        self.manager = manager
+        self.window = window_ms / 1000
+        self.max_messages = max_messages
+        self._pending: Dict[BucketKey, "OrderedDict[Hashable, dict]"] = {}
+        self._timers: Dict[BucketKey, asyncio.TimerHandle] = {}
+        self._flushes: Set[asyncio.Task] = set()
+        self._unique = itertools.count()
+        self.messages_in = Counter("ws_messages_in_total", "Messages received from clients for broadcast")
+        self.superseded = Counter("ws_messages_superseded_total", "Messages replaced by a newer one in the window")
+        self.frames_out = Counter("ws_frames_out_total", "Frames broadcast after batching")
+
+    async def submit(self, session_id: str, message: dict, room: Optional[str] = None):
+        self.messages_in.inc()
+        if self.window <= 0:
+            await self._send(session_id, room, [message])
+            return
+
+        bucket_key = (session_id, room)
+        bucket = self._pending.get(bucket_key)
+        if bucket is None:
+            bucket = self._pending[bucket_key] = OrderedDict()
+            loop = asyncio.get_running_loop()
+            self._timers[bucket_key] = loop.call_later(self.window, self._flush_later, bucket_key)
+
+        key = supersede_key(message)
+        if key is None:
+            key = ("unique", next(self._unique))
+        elif key in bucket:
+            # The newer update moves to the end so ordering reflects the latest change
+            del bucket[key]
+            self.superseded.inc()
+        bucket[key] = message
+
+        if len(bucket) >= self.max_messages:
+            await self.flush(bucket_key)
+
+    def _flush_later(self, bucket_key: BucketKey):
+        task = asyncio.get_running_loop().create_task(self.flush(bucket_key))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def flush(self, bucket_key: BucketKey):
+        timer = self._timers.pop(bucket_key, None)
+        if timer is not None:
+            timer.cancel()
+        bucket = self._pending.pop(bucket_key, None)
+        if bucket:
+            await self._send(bucket_key[0], bucket_key[1], list(bucket.values()))
+
+    async def flush_all(self):
+        for bucket_key in list(self._pending):
+            await self.flush(bucket_key)
+
+    async def _send(self, session_id: str, room: Optional[str], messages: List[dict]):
+        timestamp = str(datetime.now())
+        if len(messages) == 1:
+            frame = {**messages[0], "timestamp": timestamp}
+        else:
+            frame = {"type": "batch", "session_id": session_id, "timestamp": timestamp, "messages": messages}
+            if room:
+                frame["room"] = room
+        self.frames_out.inc()
+        await self.manager.broadcast(frame, exclude_session=session_id, room=room)
+
+    def stats(self) -> dict:
+        messages_in, frames_out = self.messages_in.value, self.frames_out.value
+        return {
+            "window_ms": round(self.window * 1000, 3),
+            "messages_in": messages_in,
+            "superseded": self.superseded.value,
+            "frames_out": frames_out,
+            "messages_per_frame": round(messages_in / frames_out, 3) if frames_out else 0.0,
+        }
+
+
+batcher = MessageBatcher(manager)
@@ -0,0 +1,80 @@
+"""N single-row REST calls versus one batch request, for events and card reordering.
+
+"single" is what clients had to do before: POST /api/events once per event,
+and PUT /api/project-cards/{id} once per card whose order changes, each its
+own transaction. "batch" sends the same work as one POST /api/events:batch
+or PATCH /api/project-cards:batch. Both run in-process through TestClient,
+so the gap is per-request and per-commit overhead, not network latency.
+
+    python -m benchmarks.bench_batch --events 10000 --cards 1000
+"""
+import argparse
+import time
+
+from benchmarks.common import emit, reset_database
+
+
+def _event(index: int) -> dict:
+    return {"name": f"League game {index}", "date_time": f"2027-{index % 12 + 1:02d}-{index % 28 + 1:02d}T18:00:00",
+            "location": f"Field {index % 6}", "event_type": "sportsplex" if index % 2 else "school"}
+
+
+def _elapsed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def events(client, count: int) -> dict:
+    def single():
+        for index in range(count):
+            client.post("/api/events", json=_event(index)).raise_for_status()
+
+    def batch():
+        response = client.post("/api/events:batch", json={"create": [_event(index) for index in range(count)]})
+        response.raise_for_status()
+        assert len(response.json()["created"]) == count
+
+    single_s, batch_s = _elapsed(single), _elapsed(batch)
+    return {"rows": count, "single_s": round(single_s, 3), "batch_s": round(batch_s, 3),
+            "single_rows_per_s": round(count / single_s), "batch_rows_per_s": round(count / batch_s),
+            "speedup": round(single_s / batch_s, 1)}
+
+
+def cards(client, count: int) -> dict:
+    response = client.patch("/api/project-cards:batch", json={
+        "create": [{"title": f"Card {index}", "description": "Quarterly plan", "order": index} for index in range(count)]})
+    response.raise_for_status()
+    ids = [card["id"] for card in client.get("/api/project-cards", params={"fields": "order"}).json()]
+
+    def single():
+        # Reverse the list: every card's order changes
+        for position, card_id in enumerate(reversed(ids), start=1):
+            client.put(f"/api/project-cards/{card_id}", json={"order": position}).raise_for_status()
+
+    def batch():
+        client.patch("/api/project-cards:batch", json={"reorder": ids}).raise_for_status()
+
+    single_s, batch_s = _elapsed(single), _elapsed(batch)
+    return {"cards": len(ids), "single_reorder_s": round(single_s, 3), "batch_reorder_s": round(batch_s, 3),
+            "speedup": round(single_s / batch_s, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--cards", type=int, default=1000)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+    import main as app_module
+
+    reset_database()
+    with TestClient(app_module.app) as client:
+        results = {"events": events(client, args.events), "cards": cards(client, args.cards)}
+    emit("batch", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Broadcast fan-out latency with many clients, some of them slow.
+
+Runs in-process against simulated sockets (no network), so it isolates the
+fan-out itself: the old sequential ``await send_json`` loop versus the
+queued ConnectionManager under each back-pressure policy. Fast clients
+complete a send after one loop iteration; slow clients take --slow-ms.
+
+    python -m benchmarks.bench_broadcast --clients 1000 --slow 5 --messages 50
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+
+from benchmarks.common import emit, summarize
+
+
+class SimulatedSocket:
+    def __init__(self, delay_s: float):
+        self.delay_s = delay_s
+        self.latencies_ms: list = []
+        # What ConnectionManager.connect reads to negotiate the subprotocol
+        self.scope = {"subprotocols": []}
+        self.headers = {}
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+    async def send_text(self, text: str):
+        if self.delay_s:
+            await asyncio.sleep(self.delay_s)
+        else:
+            await asyncio.sleep(0)
+        sent = json.loads(text)["data"]["sent"]
+        self.latencies_ms.append((time.perf_counter() - sent) * 1000)
+
+    async def send_json(self, message: dict):
+        await self.send_text(json.dumps(message, separators=(",", ":")))
+
+
+def _sockets(clients: int, slow: int, slow_ms: float):
+    # Spread the slow ones out so the sequential loop meets them early and late
+    step = max(1, clients // max(slow, 1))
+    return [SimulatedSocket(slow_ms / 1000 if slow and index % step == 0 and index // step < slow else 0)
+            for index in range(clients)]
+
+
+def _result(sockets, broadcast_ms: list, wall_s: float, extra: dict = None) -> dict:
+    fast = [ms for ws in sockets if not ws.delay_s for ms in ws.latencies_ms]
+    slow = [ms for ws in sockets if ws.delay_s for ms in ws.latencies_ms]
+    return {
+        "broadcast_call": summarize(broadcast_ms),
+        "fast_clients": summarize(fast) if fast else {"count": 0},
+        "slow_clients": summarize(slow) if slow else {"count": 0},
+        "wall_s": round(wall_s, 3),
+        **(extra or {}),
+    }
+
+
+async def _sequential(args) -> dict:
+    """The pre-queue implementation: one awaited send_json per client, in turn"""
+    sockets = _sockets(args.clients, args.slow, args.slow_ms)
+    broadcast_ms: list = []
+    start = time.perf_counter()
+    for index in range(args.messages):
+        message = {"type": "data_updated", "session_id": f"peer-{index % 2}", "data": {"sent": time.perf_counter()}}
+        call_start = time.perf_counter()
+        for ws in sockets:
+            await ws.send_json(message)
+        broadcast_ms.append((time.perf_counter() - call_start) * 1000)
+        await asyncio.sleep(args.interval_ms / 1000)
+    return _result(sockets, broadcast_ms, time.perf_counter() - start)
+
+
+async def _queued(args, policy: str) -> dict:
+    from websocket_manager import ConnectionManager
+
+    manager = ConnectionManager(queue_size=args.queue_size, policy=policy)
+    sockets = _sockets(args.clients, args.slow, args.slow_ms)
+    for index, ws in enumerate(sockets):
+        await manager.connect(ws, f"client-{index}")
+    broadcast_ms: list = []
+    start = time.perf_counter()
+    for index in range(args.messages):
+        # Alternate two senders so coalescing has something to merge
+        message = {"type": "data_updated", "session_id": f"peer-{index % 2}", "data": {"sent": time.perf_counter()}}
+        call_start = time.perf_counter()
+        await manager.broadcast(message)
+        broadcast_ms.append((time.perf_counter() - call_start) * 1000)
+        await asyncio.sleep(args.interval_ms / 1000)
+    # Let the writers drain what is still queued
+    deadline = time.perf_counter() + 30
+    while any(connection.queue for connection in manager.connections.values()) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    wall_s = time.perf_counter() - start
+    stats = manager.stats()
+    await manager.shutdown()
+    return _result(sockets, broadcast_ms, wall_s, {
+        "dropped": stats["dropped"],
+        "coalesced": stats["coalesced"],
+        "slow_disconnects": stats["slow_disconnects"],
+    })
+
+
+async def run(args) -> dict:
+    results = {"sequential": await _sequential(args)}
+    for policy in ("drop_oldest", "coalesce", "disconnect"):
+        results[f"queued_{policy}"] = await _queued(args, policy)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--slow", type=int, default=5, help="how many of the clients are slow")
+    parser.add_argument("--slow-ms", type=float, default=50.0, help="send time of a slow client")
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--interval-ms", type=float, default=10.0, help="pause between broadcasts")
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    # The manager logs every connect and disconnect; keep 1000 clients quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(run(args))
+    emit("broadcast", {
+        "clients": args.clients, "slow": args.slow, "slow_ms": args.slow_ms,
+        "messages": args.messages, "queue_size": args.queue_size, **results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
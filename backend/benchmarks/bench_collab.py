@@ -0,0 +1,147 @@
+"""Merge throughput and memory of the collaborative text engine.
+
+Simulates --editors replicas typing into one document at random positions.
+Each editor sends its operations to the server engine in small batches and
+applies the relayed updates of the others after a random delay, so edits
+interleave concurrently the way they do over real connections. At the end
+every replica must hold the server's text.
+
+    python -m benchmarks.bench_collab --editors 20 --ops 5000
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from benchmarks.common import emit, summarize
+
+
+def _json_size(ops) -> int:
+    """Size of the same operations as naive JSON, for comparison"""
+    return len(json.dumps([list(op) for op in ops], separators=(",", ":")).encode())
+
+
+def _sequence_bytes(sequence) -> int:
+    """Rough footprint of one replica: items, their ids and the id index"""
+    total = sys.getsizeof(sequence.items) + sys.getsizeof(sequence.index)
+    for item in sequence.items:
+        total += sys.getsizeof(item) + sys.getsizeof(item.id)
+    return total
+
+
+class Editor:
+    def __init__(self, site: str, sequence_cls, snapshot):
+        self.sequence = sequence_cls(site)
+        self.sequence.load_snapshot(*snapshot)
+        self.outbox = []
+        self.inbox = []
+
+    def edit(self, rng: random.Random, words: list):
+        length = len(self.sequence.text())
+        if length > 20 and rng.random() < 0.3:
+            position = rng.randrange(length)
+            self.outbox += self.sequence.local_delete(position, rng.randint(1, 3))
+        else:
+            self.outbox += self.sequence.local_insert(rng.randint(0, length), rng.choice(words) + " ")
+
+
+async def run(editors: int, ops: int, batch: int, delay: int, snapshot_every: int, seed: int) -> dict:
+    from collab import CollabDocument, CollabEngine, decode_update, encode_update, parse_doc_id, Sequence
+
+    rng = random.Random(seed)
+    words = ["falnote", "note", "sync", "merge", "editor", "page", "card", "ünïcode", "😀"]
+    doc_id = "page:content:bench"
+    initial = "Shared notes for the weekly meeting. "
+    engine = CollabEngine(snapshot_every=snapshot_every)
+    saves = []
+    engine.set_saver(lambda op, session_id: saves.append(len(op.value)))
+    engine.documents[doc_id] = CollabDocument(doc_id, parse_doc_id(doc_id), initial)
+    _, snapshot = decode_update(await engine.sync(doc_id, {}))
+    replicas = [Editor(f"editor-{index}", Sequence, snapshot) for index in range(editors)]
+
+    tracemalloc.start()
+    merge_ms, client_ms = [], []
+    binary_bytes = json_bytes = operations = 0
+    edits = 0
+    start = time.perf_counter()
+    while edits < ops or any(editor.outbox or editor.inbox for editor in replicas):
+        editor = rng.choice(replicas)
+        action = rng.random()
+        if edits < ops and action < 0.5:
+            editor.edit(rng, words)
+            edits += 1
+        elif editor.outbox and (action < 0.8 or edits >= ops):
+            sent, editor.outbox = editor.outbox[:batch], editor.outbox[batch:]
+            update = encode_update(sent)
+            binary_bytes += len(update)
+            json_bytes += _json_size(sent)
+            operations += len(sent)
+            began = time.perf_counter()
+            relay = await engine.apply_update(doc_id, update, editor.sequence.site)
+            merge_ms.append((time.perf_counter() - began) * 1000)
+            if relay is not None:
+                for other in replicas:
+                    if other is not editor:
+                        other.inbox.append(relay)
+        elif editor.inbox:
+            # Apply a random prefix, as if the rest were still in flight
+            count = rng.randint(1, min(delay, len(editor.inbox))) if edits < ops else len(editor.inbox)
+            received, editor.inbox = editor.inbox[:count], editor.inbox[count:]
+            began = time.perf_counter()
+            for update in received:
+                editor.sequence.apply(decode_update(update)[1])
+            client_ms.append((time.perf_counter() - began) * 1000)
+    wall_s = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+
+    document = engine.documents[doc_id]
+    text = document.sequence.text()
+    diverged = [editor.sequence.site for editor in replicas if editor.sequence.text() != text]
+
+    tracemalloc.stop()
+    engine.compact(document)
+    snapshot = await engine.sync(doc_id, {})
+
+    merge_total_s = sum(merge_ms) / 1000
+    return {
+        "editors": editors,
+        "operations": operations,
+        "converged": not diverged,
+        "diverged": diverged,
+        "text_chars": len(text),
+        "items": len(document.sequence.items),
+        "tombstones": sum(1 for item in document.sequence.items if item.deleted),
+        "server_merge": summarize(merge_ms),
+        "server_ops_per_s": round(operations / merge_total_s) if merge_total_s else None,
+        "client_apply": summarize(client_ms) if client_ms else {"count": 0},
+        "wire_bytes": {"binary": binary_bytes, "json": json_bytes,
+                       "ratio": round(binary_bytes / json_bytes, 3) if json_bytes else None},
+        "snapshot_bytes": len(snapshot),
+        "snapshots": engine.snapshots.value,
+        "saves": len(saves),
+        "log_ops_left": len(document.log),
+        "server_document_mb": round(_sequence_bytes(document.sequence) / 1e6, 2),
+        "peak_traced_mb": round(peak / 1e6, 2),
+        "wall_s": round(wall_s, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--editors", type=int, default=20)
+    parser.add_argument("--ops", type=int, default=5000, help="local edits in total (each edit is one word)")
+    parser.add_argument("--batch", type=int, default=16, help="operations per update sent to the server")
+    parser.add_argument("--delay", type=int, default=8, help="max relayed updates an editor applies at once")
+    parser.add_argument("--snapshot-every", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    results = asyncio.run(run(args.editors, args.ops, args.batch, args.delay, args.snapshot_every, args.seed))
+    emit("collab", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Payload size and latency of the card-list and page-data endpoints.
+
+Seeds N cards that each carry a 2 MB image (both as a legacy inline column
+and in the blob store) and compares the old "load every blob and base64 it"
+listing with the current endpoints, with and without image IDs.
+
+    python -m benchmarks.bench_listing --cards 60 --image-mb 2
+"""
+import argparse
+import base64
+import json
+import os
+
+from benchmarks.common import emit, reset_database, summarize, timer
+
+
+def seed(card_count: int, image_bytes: int):
+    from database import SessionLocal
+    from images import store_image
+    import models
+
+    db = SessionLocal()
+    try:
+        page = models.PageData(content=json.dumps({"intro": "Benchmark page"}))
+        page_image = os.urandom(image_bytes)
+        page.background_image = page_image
+        page.background_image_id = store_image(db, page_image)
+        db.add(page)
+        for index in range(card_count):
+            image = os.urandom(image_bytes)
+            db.add(models.ProjectCard(
+                title=f"Project {index}",
+                description="Lorem ipsum dolor sit amet " * 8,
+                formatting=json.dumps({"title": {"bold": True}}),
+                order=index,
+                image=image,
+                image_id=store_image(db, image),
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def legacy_card_listing() -> bytes:
+    """The pre-image-endpoint handler: full rows plus base64 image bytes"""
+    from sqlalchemy.orm import undefer
+    from database import SessionLocal
+    import models
+
+    db = SessionLocal()
+    try:
+        cards = (
+            db.query(models.ProjectCard)
+            .options(undefer(models.ProjectCard.image))
+            .order_by(models.ProjectCard.order)
+            .all()
+        )
+        return json.dumps([{
+            "id": card.id,
+            "title": card.title,
+            "description": card.description,
+            "order": card.order,
+            "formatting": json.loads(card.formatting or "{}"),
+            "image": base64.b64encode(card.image).decode("utf-8") if card.image else None,
+            "created_at": card.created_at,
+            "updated_at": card.updated_at,
+        } for card in cards], default=str).encode()
+    finally:
+        db.close()
+
+
+def measure(fetch, iterations: int) -> dict:
+    samples, size = [], 0
+    for _ in range(iterations):
+        with timer(samples):
+            size = len(fetch())
+    return {"bytes": size, **summarize(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, default=60)
+    parser.add_argument("--image-mb", type=float, default=2.0)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+    from main import app
+
+    reset_database()
+    seed(args.cards, int(args.image_mb * 1024 * 1024))
+    client = TestClient(app)
+
+    results = {
+        "cards": args.cards,
+        "image_mb": args.image_mb,
+        "legacy_cards_base64": measure(legacy_card_listing, args.iterations),
+        "cards_with_image_ids": measure(lambda: client.get("/api/project-cards").content, args.iterations),
+        "cards_without_images": measure(
+            lambda: client.get("/api/project-cards", params={"include_images": "false"}).content, args.iterations),
+        "cards_titles_only": measure(
+            lambda: client.get("/api/project-cards", params={"fields": "title,order"}).content, args.iterations),
+        "page_data": measure(lambda: client.get("/api/page-data").content, args.iterations),
+    }
+    emit("listing", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""Load test of the running API: a weighted REST request mix plus N WebSocket editors.
+
+Seeds a page, --cards cards with --image-kb images and --events events,
+starts the app under uvicorn (benchmarks/common.py: throwaway SQLite unless
+DATABASE_URL is set; every table is dropped first, so never point it at a
+database you care about), then for --duration seconds after a --warmup:
+
+- --concurrency REST workers pick requests from --mix (``name=weight``
+  pairs; see SCENARIOS) and record latency, status and bytes received
+- --editors WebSocket clients each type --edit-rate edits per second into
+  a card description, the way the editor does, and time how long each
+  edit takes to reach the other editors (--protocol json or msgpack)
+- the server process's resident memory is sampled throughout
+
+Results carry the git commit, so runs on two commits can be compared with
+``python -m benchmarks.compare before.json after.json``.
+
+    python -m benchmarks.bench_load --duration 30 --concurrency 16 --editors 20
+    python -m benchmarks.bench_load --mix cards=1 --editors 0 --output cards.json
+    DATABASE_URL=postgresql://localhost/falnote_bench python -m benchmarks.bench_load
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import defaultdict
+
+from benchmarks.common import emit, reset_database, start_server, stop_server, summarize
+
+# Image bytes only need to sniff as PNG; the server never decodes originals
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+WORDS = ("swim", "robotics", "science", "chess", "soccer", "choir", "drama", "gala", "relay", "showcase")
+DEFAULT_MIX = ("page=20,cards=15,cards_conditional=10,cards_page=5,events=10,events_range=5,search=5,"
+               "image=5,changes=5,patch_card=10,create_event=5,batch_events=5")
+
+
+def seed(cards: int, image_bytes: int, events: int):
+    from database import SessionLocal
+    from images import store_image
+    import models
+
+    rng = random.Random(23)
+    db = SessionLocal()
+    try:
+        content = {f"section{index}": f"Strategy notes for {rng.choice(WORDS)} " * 20 for index in range(30)}
+        content.update({f"section{index}_formatting": json.dumps({"bold": index % 2 == 0}) for index in range(30)})
+        db.add(models.PageData(main_title="Falnote", main_subtitle="Load test", content=content))
+        for index in range(cards):
+            db.add(models.ProjectCard(
+                title=f"Project {index} {rng.choice(WORDS)}",
+                description="Quarterly plan and milestones " * 6,
+                formatting={"title": {"bold": True}},
+                order=index + 1,
+                image_id=store_image(db, PNG_SIGNATURE + os.urandom(image_bytes)) if image_bytes else None,
+            ))
+        db.add_all(models.Event(
+            name=f"{rng.choice(WORDS).title()} {rng.choice(('meet', 'night', 'finals', 'practice'))} {index}",
+            date_time=f"2027-{index % 12 + 1:02d}-{index % 28 + 1:02d}T{8 + index % 12:02d}:00:00",
+            location=f"Field {index % 6}",
+            event_type="sportsplex" if index % 2 else "school",
+        ) for index in range(events))
+        db.commit()
+    finally:
+        db.close()
+
+
+class Context:
+    """What the scenarios need to know about the seeded data"""
+
+    def __init__(self, card_ids: list, image_ids: list, cards_etag: str, cursor: int):
+        self.card_ids = card_ids
+        self.image_ids = image_ids
+        self.cards_etag = cards_etag
+        self.cursor = cursor
+
+
+def _event(rng: random.Random) -> dict:
+    return {"name": f"{rng.choice(WORDS).title()} load test", "date_time": "2027-06-01T18:00:00",
+            "location": "Field 1", "event_type": rng.choice(("school", "sportsplex"))}
+
+
+# name -> (rng, context) -> request kwargs for httpx.AsyncClient.request
+SCENARIOS = {
+    "page": lambda rng, ctx: {"method": "GET", "url": "/api/page-data"},
+    "cards": lambda rng, ctx: {"method": "GET", "url": "/api/project-cards"},
+    "cards_conditional": lambda rng, ctx: {"method": "GET", "url": "/api/project-cards",
+                                           "headers": {"If-None-Match": ctx.cards_etag}},
+    "cards_page": lambda rng, ctx: {"method": "GET", "url": "/api/project-cards", "params": {"limit": 50}},
+    "events": lambda rng, ctx: {"method": "GET", "url": "/api/events", "params": {"limit": 100}},
+    "events_range": lambda rng, ctx: {"method": "GET", "url": "/api/events", "params": {
+        "event_type": "school", "start": "2027-03-01", "end": "2027-04-01", "limit": 100}},
+    "search": lambda rng, ctx: {"method": "GET", "url": "/api/search", "params": {"q": rng.choice(WORDS)}},
+    "image": lambda rng, ctx: {"method": "GET", "url": f"/api/images/{rng.choice(ctx.image_ids)}"}
+    if ctx.image_ids else {"method": "GET", "url": "/api/page-data"},
+    "changes": lambda rng, ctx: {"method": "GET", "url": "/api/changes", "params": {"since": ctx.cursor}},
+    "patch_card": lambda rng, ctx: {
+        "method": "PATCH", "url": f"/api/project-cards/{rng.choice(ctx.card_ids)}",
+        "content": json.dumps({"title": f"Project {rng.randrange(10 ** 6)}"}),
+        "headers": {"Content-Type": "application/merge-patch+json"}},
+    "create_event": lambda rng, ctx: {"method": "POST", "url": "/api/events", "json": _event(rng)},
+    "batch_events": lambda rng, ctx: {"method": "POST", "url": "/api/events:batch",
+                                      "json": {"create": [_event(rng) for _ in range(50)]}},
+}
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies_ms = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.bytes_in = defaultdict(int)
+
+    def result(self, seconds: float) -> dict:
+        scenarios = {}
+        for name in sorted(set(self.latencies_ms) | set(self.errors)):
+            samples = self.latencies_ms[name]
+            scenarios[name] = {
+                "requests": len(samples),
+                "errors": self.errors[name],
+                "rps": round(len(samples) / seconds, 1),
+                "statuses": dict(self.statuses[name]),
+                "bytes_per_request": round(self.bytes_in[name] / len(samples)) if samples else 0,
+                **(summarize(samples) if samples else {}),
+            }
+        everything = [ms for samples in self.latencies_ms.values() for ms in samples]
+        return {
+            "total": {
+                "requests": len(everything),
+                "errors": sum(self.errors.values()),
+                "rps": round(len(everything) / seconds, 1),
+                "bytes_in": sum(self.bytes_in.values()),
+                **(summarize(everything) if everything else {}),
+            },
+            "scenarios": scenarios,
+        }
+
+
+def _response_bytes(response) -> int:
+    """Status line, headers and body as received (transfer framing aside)"""
+    headers = sum(len(name) + len(value) + 4 for name, value in response.headers.raw)
+    return len(response.content) + headers + 17
+
+
+async def rest_worker(client, weights: dict, ctx: Context, rng: random.Random, measure_from: float,
+                      deadline: float, recorder: Recorder):
+    import httpx
+
+    names, odds = list(weights), list(weights.values())
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, odds)[0]
+        start = time.perf_counter()
+        try:
+            response = await client.request(**SCENARIOS[name](rng, ctx))
+        except httpx.HTTPError:
+            if start >= measure_from:
+                recorder.errors[name] += 1
+            continue
+        if start < measure_from:
+            continue
+        recorder.latencies_ms[name].append((time.perf_counter() - start) * 1000)
+        recorder.statuses[name][response.status_code] += 1
+        recorder.bytes_in[name] += _response_bytes(response)
+        if response.status_code >= 400:
+            recorder.errors[name] += 1
+
+
+class Editors:
+    """N simulated editors typing into card descriptions over WebSockets"""
+
+    def __init__(self, protocol: str):
+        self.protocol = protocol
+        self.latencies_ms: list = []
+        self.sent = 0
+        self.received = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.errors = 0
+        self.measuring = False
+
+    def encode(self, message: dict):
+        if self.protocol == "msgpack":
+            import wire
+            return wire.encode_binary(message)
+        return json.dumps(message, separators=(",", ":"))
+
+    def decode(self, frame):
+        if isinstance(frame, bytes):
+            import wire
+            return wire.decode_binary(frame)
+        return json.loads(frame)
+
+    def _observe(self, message: dict, now: float):
+        for inner in message.get("messages") or [message]:
+            data = inner.get("data") or {}
+            if inner.get("type") == "edit" and isinstance(data.get("value"), str):
+                sent = data["value"].split(" ", 1)[0]
+                try:
+                    self.latencies_ms.append((now - float(sent)) * 1000)
+                except ValueError:
+                    pass
+
+    async def _receive(self, websocket):
+        async for frame in websocket:
+            message = self.decode(frame)
+            if message.get("type") == "ping":
+                await websocket.send(self.encode({"type": "pong", "data": message.get("data")}))
+                continue
+            if self.measuring:
+                self.received += 1
+                self.bytes_in += len(frame)
+                self._observe(message, time.time())
+
+    async def run(self, ws_url: str, index: int, card_id: int, rate: float, deadline: float):
+        import websockets
+
+        subprotocols = ["falnote.msgpack.v1"] if self.protocol == "msgpack" else None
+        try:
+            websocket = await websockets.connect(f"{ws_url}/ws/editor-{index}", subprotocols=subprotocols,
+                                                 max_size=None)
+        except Exception:
+            self.errors += 1
+            return
+        receiver = asyncio.create_task(self._receive(websocket))
+        rng = random.Random(index)
+        # Stagger the editors so their keystrokes don't arrive in lockstep
+        await asyncio.sleep(rng.random() / rate)
+        try:
+            while time.perf_counter() < deadline:
+                frame = self.encode({"type": "edit", "data": {
+                    "entity": "project-card", "id": card_id, "field": "description",
+                    "value": f"{time.time():.6f} draft by editor {index}",
+                }})
+                await websocket.send(frame)
+                if self.measuring:
+                    self.sent += 1
+                    self.bytes_out += len(frame)
+                await asyncio.sleep(1 / rate)
+        except Exception:
+            self.errors += 1
+        finally:
+            receiver.cancel()
+            await websocket.close()
+
+    def result(self, seconds: float, editors: int) -> dict:
+        return {
+            "editors": editors,
+            "protocol": self.protocol,
+            "edits_sent": self.sent,
+            "frames_received": self.received,
+            "edits_per_s": round(self.sent / seconds, 1),
+            "bytes_out": self.bytes_out,
+            "bytes_in": self.bytes_in,
+            "errors": self.errors,
+            "delivery": summarize(self.latencies_ms) if self.latencies_ms else {"count": 0},
+        }
+
+
+def _rss_mb(pid: int) -> dict:
+    """Resident and peak memory of a process, from /proc (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            fields = dict(line.split(":", 1) for line in status if ":" in line)
+    except OSError:
+        return {}
+    return {key: round(int(fields[name].split()[0]) / 1024, 1)
+            for key, name in (("rss_mb", "VmRSS"), ("peak_mb", "VmHWM")) if name in fields}
+
+
+async def sample_memory(pid: int, samples: list, stop: asyncio.Event):
+    while not stop.is_set():
+        samples.append(_rss_mb(pid).get("rss_mb"))
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def prepare(base_url: str) -> Context:
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        cards = (await client.get("/api/project-cards", params={"fields": "image"})).json()
+        etag = (await client.get("/api/project-cards")).headers.get("etag", "")
+        cursor = (await client.get("/api/changes/cursor")).json()["cursor"]
+    return Context([card["id"] for card in cards], [card["image"] for card in cards if card.get("image")],
+                   etag, cursor)
+
+
+async def drive(base_url: str, pid: int, args) -> dict:
+    import httpx
+
+    ctx = await prepare(base_url)
+    weights = parse_mix(args.mix)
+    recorder, editors = Recorder(), Editors(args.protocol)
+    memory: list = []
+    stop_sampling = asyncio.Event()
+    memory_before = _rss_mb(pid)
+
+    start = time.perf_counter()
+    measure_from = start + args.warmup
+    deadline = measure_from + args.duration
+    sampler = asyncio.create_task(sample_memory(pid, memory, stop_sampling))
+
+    async def begin_measuring():
+        await asyncio.sleep(args.warmup)
+        editors.measuring = True
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    ws_url = base_url.replace("http://", "ws://")
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        await asyncio.gather(
+            begin_measuring(),
+            *(rest_worker(client, weights, ctx, random.Random(worker), measure_from, deadline, recorder)
+              for worker in range(args.concurrency)),
+            *(editors.run(ws_url, index, ctx.card_ids[index % min(args.editor_cards, len(ctx.card_ids))], args.edit_rate, deadline)
+              for index in range(args.editors)),
+        )
+    stop_sampling.set()
+    await sampler
+    rss = [value for value in memory if value is not None]
+    return {
+        "rest": recorder.result(args.duration) if args.concurrency else {},
+        "websocket": editors.result(args.duration, args.editors) if args.editors else {},
+        "server_memory": {
+            "before_mb": memory_before.get("rss_mb"),
+            "mean_mb": round(sum(rss) / len(rss), 1) if rss else None,
+            "max_mb": max(rss) if rss else None,
+            "after_mb": _rss_mb(pid).get("rss_mb"),
+            "peak_mb": _rss_mb(pid).get("peak_mb"),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds first")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent REST workers (0 for none)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"name=weight,...; scenarios: {', '.join(SCENARIOS)}")
+    parser.add_argument("--editors", type=int, default=10, help="simulated WebSocket editors (0 for none)")
+    parser.add_argument("--edit-rate", type=float, default=5, help="edits per second per editor")
+    parser.add_argument("--editor-cards", type=int, default=3, help="cards the editors share")
+    parser.add_argument("--protocol", choices=("json", "msgpack"), default="json")
+    parser.add_argument("--cards", type=int, default=50)
+    parser.add_argument("--image-kb", type=int, default=200, help="image size per card (0 for none)")
+    parser.add_argument("--events", type=int, default=5000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db-async", action="store_true", help="run the server with DB_ASYNC=True")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    reset_database()
+    seed(args.cards, args.image_kb * 1024, args.events)
+    process, base_url = start_server(args.port, {"DB_ASYNC": "True" if args.db_async else "False"})
+    try:
+        results = asyncio.run(drive(base_url, process.pid, args))
+    finally:
+        stop_server(process)
+    emit("load", {
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "cache": os.environ.get("CACHE_BACKEND", "memory"),
+        **results,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Event date-range filters and full-text search at scale, against the scans they replace.
+
+Seeds --events events (names drawn from a small vocabulary, ISO date_time
+strings spread over two years, a fifth of them with no recognisable date),
+then builds starts_at and the search index the way migrations do on an
+existing database. "before" is what answering the same questions took
+without them: parsing every date_time in Python, and LIKE over every name.
+
+    python -m benchmarks.bench_search --events 1000000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import emit, reset_database, summarize, timer
+
+WORDS = ("swim", "track", "robotics", "science", "chess", "soccer", "tennis", "choir", "drama", "art",
+         "coding", "debate", "gala", "fair", "relay", "tournament", "showcase", "camp", "clinic", "league")
+KINDS = ("meet", "night", "open", "finals", "practice", "session", "trials", "workshop")
+LOCATIONS = ("North Pool", "Main Gym", "Library", "Field 2", "Auditorium", "Lab 101")
+EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+SPAN_MINUTES = 2 * 365 * 24 * 60
+
+
+def seed(count: int, batch: int = 20000) -> dict:
+    from sqlalchemy import insert
+    from database import engine
+    from search import parse_event_time
+    import models
+
+    rng = random.Random(21)
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        for offset in range(0, count, batch):
+            rows = []
+            for index in range(offset, min(count, offset + batch)):
+                when = EPOCH + timedelta(minutes=rng.randrange(SPAN_MINUTES))
+                date_time = when.strftime("%Y-%m-%dT%H:%M:00") if index % 5 else "TBD"
+                rows.append({
+                    "name": f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {rng.choice(KINDS)} #{index}",
+                    "date_time": date_time,
+                    "starts_at": None,
+                    "location": rng.choice(LOCATIONS),
+                    "event_type": "sportsplex" if index % 2 else "school",
+                })
+            conn.execute(insert(models.Event), rows)
+    seeded = time.perf_counter() - start
+    # Columns that did not exist yet: filled in by migrations
+    from migrations import backfill_event_times, create_missing_indexes
+    from search import backfill_search_index, create_fulltext_index
+    start = time.perf_counter()
+    backfill_event_times(engine)
+    parsed = time.perf_counter() - start
+    start = time.perf_counter()
+    create_missing_indexes(engine)
+    create_fulltext_index(engine)
+    indexed = backfill_search_index(engine)
+    built = time.perf_counter() - start
+    return {"insert_s": round(seeded, 2), "parse_starts_at_s": round(parsed, 2),
+            "build_search_index_s": round(built, 2), "search_documents": indexed}
+
+
+def scan_range(event_type: str, start: datetime, end: datetime) -> int:
+    """The only way to answer a date-range query before: parse every row in Python"""
+    from sqlalchemy import select
+    from database import SessionLocal
+    from search import parse_event_time
+    import models
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(select(models.Event.id, models.Event.date_time)
+                          .where(models.Event.event_type == event_type)).all()
+        return sum(1 for row in rows if (when := parse_event_time(row.date_time)) and start <= when < end)
+    finally:
+        db.close()
+
+
+def scan_like(word: str) -> int:
+    from sqlalchemy import func, select
+    from database import SessionLocal
+    import models
+
+    db = SessionLocal()
+    try:
+        return db.scalar(select(func.count()).where(models.Event.name.icontains(word)))
+    finally:
+        db.close()
+
+
+def query_plans() -> dict:
+    from sqlalchemy import text
+    from database import engine
+
+    if engine.dialect.name == "sqlite":
+        explain = "EXPLAIN QUERY PLAN "
+    elif engine.dialect.name == "postgresql":
+        explain = "EXPLAIN "
+    else:
+        return {}
+    statements = {
+        "range": "SELECT count(*) FROM events WHERE event_type = 'school' "
+                 "AND starts_at >= '2026-03-01' AND starts_at < '2026-04-01'",
+    }
+    with engine.connect() as conn:
+        return {name: [" ".join(str(value) for value in row) for row in conn.execute(text(explain + sql))]
+                for name, sql in statements.items()}
+
+
+def measure(fetch, iterations: int) -> dict:
+    samples, result = [], None
+    for _ in range(iterations):
+        with timer(samples):
+            result = fetch()
+    return {"result": result, **summarize(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--iterations", type=int, default=50, help="requests per indexed query")
+    parser.add_argument("--scan-iterations", type=int, default=3, help="runs of each full-scan baseline")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+    import main as app_module
+
+    reset_database()
+    setup = seed(args.events)
+    start, end = datetime(2026, 3, 1, tzinfo=timezone.utc), datetime(2026, 4, 1, tzinfo=timezone.utc)
+    window = {"event_type": "school", "start": start.isoformat(), "end": end.isoformat()}
+
+    with TestClient(app_module.app) as client:
+        def get(path, params):
+            response = client.get(path, params=params)
+            response.raise_for_status()
+            return response
+
+        results = {
+            "events": args.events,
+            "setup": setup,
+            "range": {
+                "before_python_scan": measure(lambda: scan_range("school", start, end), args.scan_iterations),
+                "after_page_of_100": measure(
+                    lambda: len(get("/api/events", {**window, "limit": 100}).json()), args.iterations),
+                "after_all_matching": measure(lambda: len(get("/api/events", window).json()), args.scan_iterations),
+            },
+            "search": {
+                "before_like_scan": measure(lambda: scan_like("robotics"), args.scan_iterations),
+                "after_common_word": measure(
+                    lambda: len(get("/api/search", {"q": "robotics", "limit": 20}).json()), args.iterations),
+                "after_two_words": measure(
+                    lambda: len(get("/api/search", {"q": "chess finals", "limit": 20}).json()), args.iterations),
+                "after_rare_word": measure(
+                    lambda: len(get("/api/search", {"q": f"{args.events // 2}", "limit": 20}).json()),
+                    args.iterations),
+            },
+            # Index maintenance is paid here, in the write's own transaction
+            "create_event": measure(lambda: client.post("/api/events", json={
+                "name": "Robotics showcase", "date_time": "2026-05-01T17:00:00",
+                "location": "Lab 101", "event_type": "school"}).status_code, args.iterations),
+            "plans": query_plans(),
+        }
+    emit("search", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Serialization cost of the page-data and card-list responses, before and after orjson.
+
+"before" is the previous path: ``json.dumps(jsonable_encoder(...))`` for the
+projected dicts, and FastAPI's response_model validation plus
+jsonable_encoder for ORM rows. "after" is serialization.py: orjson for the
+projections and a cached TypeAdapter for rows. The endpoint section times
+real requests; run it with CACHE_BACKEND=none to include serialization in
+every request, or on two commits with --output to compare.
+
+    python -m benchmarks.bench_serialization --cards 200 --sections 60
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks.common import emit, reset_database, summarize, timer
+
+
+def seed(cards: int, sections: int):
+    from database import SessionLocal
+    import models
+
+    db = SessionLocal()
+    try:
+        content = {f"section{index}": "Strategy notes " * 40 for index in range(sections)}
+        content.update({f"section{index}_formatting": json.dumps({"bold": True, "size": 14}) for index in range(sections)})
+        db.add(models.PageData(main_title="Falnote", main_subtitle="Benchmark", content=content))
+        db.add_all(models.ProjectCard(title=f"Project {index}", description="Card description " * 20,
+                                      formatting={"title": {"bold": True}}, order=index)
+                   for index in range(cards))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _per_call_us(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return round((time.perf_counter() - start) / repeat * 1e6, 2)
+
+
+def micro(repeat: int) -> dict:
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+    from database import SessionLocal
+    import main
+    import models
+    import schemas
+    from serialization import dump_model, dumps
+
+    def old_dumps(content):
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                          separators=(",", ":")).encode("utf-8")
+
+    def old_model(schema, rows):
+        # What FastAPI does for response_model: validate, dump, jsonable_encoder, json.dumps
+        adapter = TypeAdapter(schema)
+        return old_dumps(adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json"))
+
+    db = SessionLocal()
+    try:
+        page = db.query(models.PageData).first()
+        cards = db.query(models.ProjectCard).order_by(models.ProjectCard.order).all()
+        page_dict = main._project(page, main.PAGE_FIELDS, list(main.PAGE_FIELDS))
+        card_dicts = [main._project(card, main.CARD_FIELDS, list(main.CARD_FIELDS)) for card in cards]
+        card_schema = list[schemas.ProjectCardResponse]
+        assert json.loads(old_dumps(card_dicts)) == json.loads(dumps(card_dicts))
+        results = {}
+        for name, before, after, size in (
+            ("page_projection", lambda: old_dumps(page_dict), lambda: dumps(page_dict), len(dumps(page_dict))),
+            ("cards_projection", lambda: old_dumps(card_dicts), lambda: dumps(card_dicts), len(dumps(card_dicts))),
+            ("page_model", lambda: old_model(schemas.PageDataResponse, page),
+             lambda: dumps(dump_model(schemas.PageDataResponse, page)), None),
+            ("cards_model", lambda: old_model(card_schema, cards),
+             lambda: dumps(dump_model(card_schema, cards)), None),
+        ):
+            before_us, after_us = _per_call_us(before, repeat), _per_call_us(after, repeat)
+            results[name] = {"before_us": before_us, "after_us": after_us,
+                             "speedup": round(before_us / after_us, 2) if after_us else None}
+            if size:
+                results[name]["bytes"] = size
+        return results
+    finally:
+        db.close()
+
+
+def endpoints(requests: int) -> dict:
+    from fastapi.testclient import TestClient
+    import main
+
+    results = {}
+    with TestClient(main.app) as client:
+        for path in ("/api/page-data", "/api/project-cards", "/api/changes"):
+            client.get(path)
+            samples = []
+            for _ in range(requests):
+                with timer(samples):
+                    response = client.get(path)
+                    response.raise_for_status()
+            results[path] = {**summarize(samples), "bytes": len(response.content)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=200)
+    parser.add_argument("--sections", type=int, default=60, help="content keys on the page")
+    parser.add_argument("--repeat", type=int, default=200, help="calls per micro-benchmark")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+
+    reset_database()
+    seed(args.cards, args.sections)
+    emit("serialization", {
+        "cards": args.cards,
+        "sections": args.sections,
+        "cache": os.environ.get("CACHE_BACKEND", "memory"),
+        "micro": micro(args.repeat),
+        "endpoints": endpoints(args.requests),
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Bytes per frame and encode/decode CPU: JSON text frames versus the msgpack subprotocol.
+
+Each message shape is replayed --frames times with varying values. Deflate
+columns model permessage-deflate with context takeover (one compressor per
+connection, sync-flushed per frame, as the websockets library does), so the
+deflate cost is paid per recipient while encoding is paid once per broadcast.
+
+    python -m benchmarks.bench_wire --frames 2000
+"""
+import argparse
+import json
+import time
+import uuid
+import zlib
+
+from benchmarks.common import emit
+
+DEFLATE_TAIL = b"\x00\x00\xff\xff"
+
+
+def _edit(index: int, session_id: str) -> dict:
+    return {
+        "type": "edit",
+        "data": {"entity": "project-card", "id": index % 12 + 1, "field": "description", "key": None,
+                 "value": f"Quarterly roadmap draft, revision {index}: ship sync, polish editor"},
+        "session_id": session_id,
+        "timestamp": "2026-10-18 09:30:%02d.%06d" % (index % 60, index * 7919 % 1000000),
+    }
+
+
+def _shapes(session_id: str) -> dict:
+    return {
+        "notice": lambda i: {"type": "data_updated", "session_id": session_id,
+                             "timestamp": "2026-10-18 09:30:%02d.%06d" % (i % 60, i)},
+        "edit": lambda i: _edit(i, session_id),
+        "patch": lambda i: {"type": "patch", "session_id": session_id, "data": {
+            "entity": "page", "id": 1, "version": i + 2, "format": "json-patch",
+            "patch": [{"op": "replace", "path": f"/content/section{i % 8}", "value": f"Updated text {i}"},
+                      {"op": "add", "path": "/content/updated_by", "value": session_id}]}},
+        "batch20": lambda i: {"type": "batch", "session_id": session_id,
+                              "timestamp": "2026-10-18 09:31:00.%06d" % i,
+                              "messages": [_edit(i * 20 + n, session_id) for n in range(20)]},
+    }
+
+
+def _time_us(fn, items) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def _deflate_stream(frames):
+    """Per-frame compressed sizes and CPU for one connection's compressor"""
+    compressor = zlib.compressobj(wbits=-15)
+    decompressor = zlib.decompressobj(wbits=-15)
+    sizes, compressed = [], []
+    start = time.perf_counter()
+    for frame in frames:
+        data = frame.encode() if isinstance(frame, str) else frame
+        payload = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        payload = payload[:-4] if payload.endswith(DEFLATE_TAIL) else payload
+        compressed.append(payload)
+        sizes.append(len(payload))
+    deflate_us = (time.perf_counter() - start) / len(frames) * 1e6
+    start = time.perf_counter()
+    for payload in compressed:
+        decompressor.decompress(payload + DEFLATE_TAIL)
+    inflate_us = (time.perf_counter() - start) / len(frames) * 1e6
+    return sum(sizes) / len(sizes), deflate_us, inflate_us
+
+
+def run(frames: int) -> dict:
+    import wire
+    from websocket_manager import encode
+
+    if wire.msgpack is None:
+        raise SystemExit("msgpack is not installed: pip install msgpack")
+    session_id = str(uuid.uuid4())
+    results = {}
+    for name, make in _shapes(session_id).items():
+        messages = [make(index) for index in range(frames)]
+        json_frames = [encode(message) for message in messages]
+        binary_frames = [wire.encode_binary(message) for message in messages]
+        json_bytes = sum(len(frame.encode()) for frame in json_frames) / frames
+        binary_bytes = sum(len(frame) for frame in binary_frames) / frames
+        json_deflated, json_deflate_us, json_inflate_us = _deflate_stream(json_frames)
+        binary_deflated, binary_deflate_us, binary_inflate_us = _deflate_stream(binary_frames)
+        results[name] = {
+            "bytes_per_frame": {
+                "json": round(json_bytes, 1),
+                "msgpack": round(binary_bytes, 1),
+                "json_deflate": round(json_deflated, 1),
+                "msgpack_deflate": round(binary_deflated, 1),
+                "msgpack_vs_json": round(binary_bytes / json_bytes, 3),
+            },
+            "encode_us": {"json": round(_time_us(encode, messages), 2),
+                          "msgpack": round(_time_us(wire.encode_binary, messages), 2)},
+            "decode_us": {"json": round(_time_us(json.loads, json_frames), 2),
+                          "msgpack": round(_time_us(wire.decode_binary, binary_frames), 2)},
+            # Paid for every recipient, not once per broadcast
+            "deflate_us_per_connection": {"json": round(json_deflate_us, 2), "msgpack": round(binary_deflate_us, 2)},
+            "inflate_us": {"json": round(json_inflate_us, 2), "msgpack": round(binary_inflate_us, 2)},
+        }
+    return {"frames": frames, "shapes": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=2000, help="frames per message shape")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    args = parser.parse_args()
+    emit("wire", run(args.frames), args.output)
+
+
+if __name__ == "__main__":
+    main()
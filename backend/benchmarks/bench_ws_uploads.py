@@ -0,0 +1,117 @@
+"""WebSocket broadcast latency while image uploads hit the same server.
+
+Starts the API under uvicorn once per database mode (sync threadpool
+adapter vs SQLAlchemy asyncio), connects N WebSocket clients, and has one
+of them broadcast timestamped messages, first on an idle server and then
+while concurrent multi-MB uploads are running.
+
+    python -m benchmarks.bench_ws_uploads --clients 20 --uploads 40
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from benchmarks.common import emit, start_server, stop_server, summarize
+
+
+async def _receiver(websocket, latencies: list, done: asyncio.Event):
+    while not done.is_set():
+        try:
+            raw = await asyncio.wait_for(websocket.recv(), timeout=0.5)
+        except asyncio.TimeoutError:
+            continue
+        now = time.time()
+        message = json.loads(raw)
+        # Messages sent within one batch window arrive as a single "batch" frame
+        for inner in message.get("messages") or [message]:
+            sent = (inner.get("data") or {}).get("sent")
+            if sent is not None:
+                latencies.append((now - sent) * 1000)
+
+
+async def _broadcast_phase(ws_url: str, clients: int, messages: int, interval_s: float, background=None) -> dict:
+    import websockets
+
+    sockets = [await websockets.connect(f"{ws_url}/ws/bench-{index}") for index in range(clients)]
+    latencies: list = []
+    done = asyncio.Event()
+    receivers = [asyncio.create_task(_receiver(ws, latencies, done)) for ws in sockets[1:]]
+    background_task = asyncio.create_task(background()) if background else None
+    try:
+        for _ in range(messages):
+            await sockets[0].send(json.dumps({"type": "bench", "data": {"sent": time.time()}}))
+            await asyncio.sleep(interval_s)
+        await asyncio.sleep(1.0)
+    finally:
+        done.set()
+        await asyncio.gather(*receivers)
+        if background_task:
+            await background_task
+        for ws in sockets:
+            await ws.close()
+    return summarize(latencies) if latencies else {"count": 0}
+
+
+async def _upload_storm(base_url: str, uploads: int, concurrency: int, image_bytes: int) -> dict:
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    durations: list = []
+
+    async def upload(client, index):
+        payload = b"\x89PNG\r\n\x1a\n" + os.urandom(image_bytes)
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(
+                f"/api/project-cards/{index % 3 + 1}/image",
+                files={"file": (f"bench-{index}.png", payload, "image/png")},
+            )
+            response.raise_for_status()
+            durations.append((time.perf_counter() - start) * 1000)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        await asyncio.gather(*(upload(client, index) for index in range(uploads)))
+    return summarize(durations)
+
+
+def run_mode(mode: str, port: int, args) -> dict:
+    process, base_url = start_server(port, {"DB_ASYNC": "True" if mode == "async" else "False"})
+    ws_url = base_url.replace("http://", "ws://")
+    upload_stats = {}
+
+    async def uploads():
+        upload_stats.update(await _upload_storm(base_url, args.uploads, args.upload_concurrency,
+                                                int(args.image_mb * 1024 * 1024)))
+
+    try:
+        idle = asyncio.run(_broadcast_phase(ws_url, args.clients, args.messages, args.interval_ms / 1000))
+        loaded = asyncio.run(_broadcast_phase(ws_url, args.clients, args.messages, args.interval_ms / 1000,
+                                              background=uploads))
+    finally:
+        stop_server(process)
+    return {"broadcast_idle": idle, "broadcast_during_uploads": loaded, "uploads": upload_stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", default="sync,async", help="Comma-separated: sync, async")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--interval-ms", type=float, default=10)
+    parser.add_argument("--uploads", type=int, default=40)
+    parser.add_argument("--upload-concurrency", type=int, default=8)
+    parser.add_argument("--image-mb", type=float, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = {"clients": args.clients, "uploads": args.uploads, "image_mb": args.image_mb}
+    for mode in args.modes.split(","):
+        results[mode] = run_mode(mode, args.port, args)
+    emit("ws_during_uploads", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
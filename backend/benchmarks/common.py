@@ -0,0 +1,115 @@
+"""Shared setup for the benchmark scripts.
+
+Import this module before any backend module: it points the app at a
+throwaway SQLite database and blob directory unless DATABASE_URL /
+BLOB_STORE_PATH are already set (e.g. to benchmark against Postgres).
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="falnote-bench-")
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}")
+os.environ.setdefault("BLOB_STORE_PATH", os.path.join(WORK_DIR, "blobs"))
+os.environ.setdefault("DEBUG", "False")
+
+
+def reset_database():
+    """Drop and recreate every table so each run starts from a known state"""
+    from database import engine
+    import models
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+
+
+def summarize(samples_ms: list[float]) -> dict:
+    """Latency summary in milliseconds"""
+    ordered = sorted(samples_ms)
+
+    def pct(p: float) -> float:
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+        return round(ordered[index], 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+@contextmanager
+def timer(samples_ms: list[float]):
+    start = time.perf_counter()
+    yield
+    samples_ms.append((time.perf_counter() - start) * 1000)
+
+
+def git_commit() -> str:
+    """Short hash of the checked-out commit (with "+dirty" for local changes), or None outside git"""
+    import subprocess
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+dirty" if dirty else "")
+
+
+def emit(benchmark: str, results: dict, output: str = None):
+    """Print results as JSON (and optionally write them) for cross-commit comparison"""
+    payload = {"benchmark": benchmark, "database": os.environ["DATABASE_URL"].split("://")[0],
+               "commit": git_commit(), **results}
+    text = json.dumps(payload, indent=2, default=str)
+    print(text)
+    if output:
+        with open(output, "w") as handle:
+            handle.write(text + "\n")
+
+
+def start_server(port: int, extra_env: dict = None):
+    """Run the API under uvicorn in a subprocess and wait until it answers"""
+    import subprocess
+    import urllib.request
+
+    env = {**os.environ, **(extra_env or {})}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(base_url + "/", timeout=1):
+                return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("uvicorn did not start within 30s")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except Exception:
+        process.kill()
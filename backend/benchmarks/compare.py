@@ -0,0 +1,52 @@
+"""Compare two result files written with --output by any benchmark script.
+
+Prints every numeric field present in both, with the relative change, so a
+run on a branch can be checked against the same run on main:
+
+    git checkout main && python -m benchmarks.bench_load --output before.json
+    git checkout my-branch && python -m benchmarks.bench_load --output after.json
+    python -m benchmarks.compare before.json after.json --only p50_ms,p95_ms,p99_ms,rps
+
+Lower is better for latencies, sizes and memory, higher for throughput;
+read the sign with that in mind.
+"""
+import argparse
+import json
+
+
+def flatten(value, prefix: str = "") -> dict:
+    """{"a": {"b": 1}} -> {"a.b": 1}, numeric leaves only"""
+    if isinstance(value, dict):
+        flat = {}
+        for key, inner in value.items():
+            flat.update(flatten(inner, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--only", help="comma-separated field names to keep (matched on the last path part)")
+    args = parser.parse_args()
+
+    with open(args.before) as handle:
+        before = json.load(handle)
+    with open(args.after) as handle:
+        after = json.load(handle)
+    print(f"{before.get('benchmark')}: {before.get('commit')} -> {after.get('commit')}")
+    only = set(args.only.split(",")) if args.only else None
+    old, new = flatten(before), flatten(after)
+    width = max((len(key) for key in old), default=0)
+    for key in sorted(set(old) & set(new)):
+        if only and key.rsplit(".", 1)[-1] not in only:
+            continue
+        change = f"{(new[key] - old[key]) / old[key] * 100:+.1f}%" if old[key] else ""
+        print(f"{key:<{width}}  {old[key]:>12}  {new[key]:>12}  {change}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Pluggable content-addressed blob storage for uploaded files.
+
+Blobs are keyed by the hex SHA-256 of their content, so identical uploads
+are stored once. ``LocalBlobStore`` keeps them on the filesystem; any other
+backend (e.g. an S3-compatible bucket) only needs to implement ``BlobStore``.
+"""
+import abc
+import hashlib
+import os
+import tempfile
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+import aiofiles
+import aiofiles.os
+from config import BLOB_STORE_BACKEND, BLOB_STORE_PATH
+
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class BlobInfo:
+    hash: str
+    size: int
+    created: bool  # False when identical content was already stored
+
+
+class BlobStore(abc.ABC):
+    """Interface every blob backend implements"""
+
+    @abc.abstractmethod
+    async def put_stream(self, chunks: AsyncIterator[bytes]) -> BlobInfo:
+        """Store a stream of chunks, hashing as it goes"""
+
+    @abc.abstractmethod
+    def put_bytes(self, data: bytes) -> BlobInfo:
+        """Store an in-memory blob (used by migrations and tooling)"""
+
+    @abc.abstractmethod
+    def exists(self, digest: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def size(self, digest: str) -> Optional[int]:
+        """Return the blob size in bytes, or None if it is missing"""
+
+    @abc.abstractmethod
+    def iter_range(self, digest: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """Yield the bytes in the inclusive range [start, end]"""
+
+    @abc.abstractmethod
+    def read_bytes(self, digest: str) -> bytes:
+        ...
+
+    def local_path(self, digest: str) -> Optional[str]:
+        """Filesystem path of the blob when the backend keeps one, else None"""
+        return None
+
+    @abc.abstractmethod
+    def delete(self, digest: str):
+        ...
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files under ``root/ab/cd/<hash>``, written atomically via rename"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path_for(self, digest: str) -> str:
+        if len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+            raise ValueError(f"Invalid blob id: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def _commit(self, tmp_path: str, digest: str, size: int) -> BlobInfo:
+        final_path = self.path_for(digest)
+        if os.path.exists(final_path):
+            os.unlink(tmp_path)
+            return BlobInfo(hash=digest, size=size, created=False)
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(tmp_path, final_path)
+        return BlobInfo(hash=digest, size=size, created=True)
+
+    async def put_stream(self, chunks: AsyncIterator[bytes]) -> BlobInfo:
+        hasher = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        try:
+            async with aiofiles.open(tmp_path, "wb") as out:
+                async for chunk in chunks:
+                    hasher.update(chunk)
+                    size += len(chunk)
+                    await out.write(chunk)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                await aiofiles.os.remove(tmp_path)
+            raise
+        return self._commit(tmp_path, hasher.hexdigest(), size)
+
+    def put_bytes(self, data: bytes) -> BlobInfo:
+        digest = hashlib.sha256(data).hexdigest()
+        if os.path.exists(self.path_for(digest)):
+            return BlobInfo(hash=digest, size=len(data), created=False)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        return self._commit(tmp_path, digest, len(data))
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path_for(digest))
+
+    def size(self, digest: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self.path_for(digest))
+        except OSError:
+            return None
+
+    def iter_range(self, digest: str, start: int, end: int) -> AsyncIterator[bytes]:
+        return iter_file_range(self.path_for(digest), start, end)
+
+    def local_path(self, digest: str) -> Optional[str]:
+        return self.path_for(digest)
+
+    def read_bytes(self, digest: str) -> bytes:
+        with open(self.path_for(digest), "rb") as blob:
+            return blob.read()
+
+    def delete(self, digest: str):
+        try:
+            os.unlink(self.path_for(digest))
+        except FileNotFoundError:
+            pass
+
+
+async def iter_file_range(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    """Yield the inclusive byte range [start, end] of a file in chunks"""
+    remaining = end - start + 1
+    async with aiofiles.open(path, "rb") as handle:
+        await handle.seek(start)
+        while remaining > 0:
+            chunk = await handle.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def iter_bytes(data: bytes, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+    """Adapt in-memory bytes to the chunked stream interface"""
+    end = len(data) - 1 if end is None else end
+    view = memoryview(data)
+    for offset in range(start, end + 1, CHUNK_SIZE):
+        yield bytes(view[offset:min(offset + CHUNK_SIZE, end + 1)])
+
+
+def _create_store() -> BlobStore:
+    if BLOB_STORE_BACKEND == "local":
+        return LocalBlobStore(BLOB_STORE_PATH)
+    raise ValueError(f"Unknown BLOB_STORE_BACKEND: {BLOB_STORE_BACKEND}")
+
+
+blob_store = _create_store()
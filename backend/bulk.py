@@ -0,0 +1,89 @@
+"""Batched creates, updates and deletes of events and project cards.
+
+A batch runs as one unit-of-work flush inside a single transaction: the
+affected rows are loaded with one ``SELECT ... WHERE id IN (...)``, new
+rows go out as multi-row ``INSERT ... VALUES ... RETURNING`` statements
+and updates as ``executemany`` groups. Going through the Session (rather
+than Core bulk statements) keeps the version counters, the change log and
+the search index hooks exactly as they are for single-row writes.
+
+Any missing id, duplicate id or stale ``version`` fails the whole batch
+before anything is written.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+
+def _check_ids(updates: Sequence[dict], deletes: Sequence[int]):
+    ids = [update["id"] for update in updates] + list(deletes)
+    if len(set(ids)) != len(ids):
+        seen, repeated = set(), set()
+        for row_id in ids:
+            (repeated if row_id in seen else seen).add(row_id)
+        raise HTTPException(status_code=422, detail=f"Ids appear more than once in the batch: {sorted(repeated)}")
+
+
+def apply_batch(session: Session, model, creates: Sequence[dict], updates: Sequence[dict],
+                deletes: Sequence[int], reorder: Optional[Sequence[int]] = None) -> Tuple[list, List[int]]:
+    """Stage a batch and flush it; returns (created rows, ids of updated rows).
+
+    ``updates`` are dicts with an ``id``, the fields to set and optionally
+    the ``version`` the client last saw. ``reorder`` lists ids whose
+    ``order`` becomes 1..n; every other existing row keeps its relative
+    position after them, and created rows keep the order they were given.
+    Run it with ``db.run_sync`` and commit afterwards.
+    """
+    _check_ids(updates, deletes)
+    if reorder is not None:
+        if len(set(reorder)) != len(reorder):
+            raise HTTPException(status_code=422, detail="reorder lists an id more than once")
+        if set(reorder) & set(deletes):
+            raise HTTPException(status_code=422, detail="reorder lists deleted ids")
+    wanted = [update["id"] for update in updates] + list(deletes)
+    rows: Dict[int, object] = {}
+    if reorder is not None:
+        # Reordering renumbers every row, so load them all
+        rows = {row.id: row for row in session.scalars(select(model).order_by(model.order, model.id))}
+    elif wanted:
+        rows = {row.id: row for row in session.scalars(select(model).where(model.id.in_(wanted)))}
+
+    missing = sorted({row_id for row_id in wanted + list(reorder or ()) if row_id not in rows})
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Not found: {missing}")
+    stale = sorted(update["id"] for update in updates
+                   if update.get("version") is not None and update["version"] != rows[update["id"]].version)
+    if stale:
+        raise HTTPException(status_code=412, detail=f"Modified since the given version: {stale}")
+
+    changed = set()
+    for update in updates:
+        row = rows[update["id"]]
+        for field, value in update.items():
+            if field not in ("id", "version") and getattr(row, field) != value:
+                setattr(row, field, value)
+                changed.add(row.id)
+    for row_id in deletes:
+        session.delete(rows.pop(row_id))
+    if reorder is not None:
+        listed = set(reorder)
+        sequence = list(reorder) + [row_id for row_id in rows if row_id not in listed]
+        for position, row_id in enumerate(sequence, start=1):
+            if rows[row_id].order != position:
+                rows[row_id].order = position
+                changed.add(row_id)
+
+    created = [model(**values) for values in creates]
+    session.add_all(created)
+    session.flush()
+    return created, sorted(changed)
+
+
+async def load_rows(db, model, ids: Sequence[int]) -> list:
+    """Fresh copies of ``ids`` after commit (server-side timestamps included)"""
+    if not ids:
+        return []
+    return list((await db.scalars(
+        select(model).where(model.id.in_(ids)).order_by(model.id).execution_options(populate_existing=True)
+    )).all())
@@ -0,0 +1,177 @@
+"""Read-through cache of serialized API responses with version-based invalidation.
+
+Entries are keyed by resource, the resource's current version and a variant
+(e.g. the query string). Mutation handlers bump the version after they
+commit, which orphans every cached variant at once; orphans age out through
+the TTL and size bounds. With the Redis backend the versions are shared, so
+a write handled by one uvicorn worker invalidates the others too.
+"""
+import abc
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from config import CACHE_BACKEND, CACHE_MAX_BYTES, CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, REDIS_URL
+from metrics import Counter
+
+
+class CacheBackend(abc.ABC):
+    """Storage interface for cached bodies and per-resource versions"""
+
+    name = "base"
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: bytes, ttl: float):
+        ...
+
+    @abc.abstractmethod
+    async def get_version(self, resource: str) -> int:
+        ...
+
+    @abc.abstractmethod
+    async def bump_version(self, resource: str) -> int:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Per-process LRU bounded by entry count and total bytes"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        if len(value) > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self.total_bytes += len(value)
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= len(entry[1])
+
+    async def get_version(self, resource: str) -> int:
+        return self._versions.get(resource, 0)
+
+    async def bump_version(self, resource: str) -> int:
+        self._versions[resource] = self._versions.get(resource, 0) + 1
+        return self._versions[resource]
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self.total_bytes}
+
+
+class RedisCacheBackend(CacheBackend):
+    """Shared cache in Redis; versions are INCR counters every worker sees"""
+
+    name = "redis"
+    PREFIX = "falnote:cache:"
+
+    def __init__(self, url: str = REDIS_URL, client=None):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url)
+        self.client = client
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.PREFIX + key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(self.PREFIX + key, value, px=int(ttl * 1000))
+
+    async def get_version(self, resource: str) -> int:
+        value = await self.client.get(f"{self.PREFIX}version:{resource}")
+        return int(value or 0)
+
+    async def bump_version(self, resource: str) -> int:
+        return await self.client.incr(f"{self.PREFIX}version:{resource}")
+
+
+class ResponseCache:
+    def __init__(self, backend: Optional[CacheBackend], ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = Counter("response_cache_hits_total", "Responses served from the cache")
+        self.misses = Counter("response_cache_misses_total", "Responses built because the cache missed")
+        self.invalidations = Counter("response_cache_invalidations_total", "Resource version bumps")
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def get_or_build(self, resource: str, variant: str, build: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Return the cached body for (resource, variant), building and storing it on a miss"""
+        if self.backend is None:
+            return await build()
+        # Read the version before the database so a concurrent write can only
+        # leave stale data under the version it is about to retire
+        version = await self.backend.get_version(resource)
+        key = f"{resource}:v{version}:{variant}"
+        body = await self.backend.get(key)
+        if body is not None:
+            self.hits.inc()
+            return body
+        self.misses.inc()
+        body = await build()
+        await self.backend.set(key, body, self.ttl)
+        return body
+
+    async def invalidate(self, *resources: str):
+        """Retire every cached variant of the given resources; call after commit"""
+        if self.backend is None:
+            return
+        for resource in resources:
+            await self.backend.bump_version(resource)
+            self.invalidations.inc()
+
+    def stats(self) -> dict:
+        if self.backend is None:
+            return {"backend": "none"}
+        lookups = self.hits.value + self.misses.value
+        return {
+            "backend": self.backend.name,
+            "hits": self.hits.value,
+            "misses": self.misses.value,
+            "hit_ratio": round(self.hits.value / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations.value,
+            **self.backend.stats(),
+        }
+
+
+def _create_backend() -> Optional[CacheBackend]:
+    if CACHE_BACKEND == "memory":
+        return InMemoryCacheBackend(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES)
+    if CACHE_BACKEND == "redis":
+        return RedisCacheBackend(REDIS_URL)
+    if CACHE_BACKEND == "none":
+        return None
+    raise ValueError(f"Unknown CACHE_BACKEND: {CACHE_BACKEND}")
+
+
+response_cache = ResponseCache(_create_backend(), CACHE_TTL_SECONDS)
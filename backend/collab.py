@@ -0,0 +1,768 @@
+"""Collaborative text editing with a sequence CRDT (RGA).
+
+Every character is an item with a unique id ``(clock, site)`` and the id of
+the item it was typed after (its origin). Replicas that have applied the
+same set of operations hold the same sequence whatever order those
+operations arrived in, so concurrent editors merge instead of overwriting
+each other. Deleted characters stay as tombstones because later
+operations may still reference them.
+
+Documents are plain-text fields addressed as ``page:main_title``,
+``page:content:<key>`` or ``project-card:<id>:<field>``. The server keeps
+one authoritative replica per open document with an operation log since
+its last snapshot. The text of edited documents is saved through the
+write-behind buffer every COLLAB_SAVE_INTERVAL_MS, and every
+COLLAB_SNAPSHOT_EVERY operations the log is folded into a snapshot
+(tombstones lose their character). Updates travel as compact binary frames,
+see ``encode_update``.
+
+Replicas in different processes would each load the text under their own
+root site and save over one another, so the engine refuses documents
+whenever more than one process serves WebSockets: configured as such (see
+``disabled_reason``) or found at startup, when only the process that takes
+the ``HostLock`` hosts documents.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from sqlalchemy import select, text
+from config import (
+    COLLAB_ENABLED, COLLAB_IDLE_SECONDS, COLLAB_MAX_DOCUMENTS, COLLAB_SAVE_INTERVAL_MS, COLLAB_SNAPSHOT_EVERY,
+    DATABASE_URL, DB_PGBOUNCER, WEB_CONCURRENCY, WS_BACKPLANE,
+)
+from database import engine, session_scope
+from metrics import Counter, Histogram
+import models
+import schemas
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the configuration checks apply
+    fcntl = None
+
+ItemId = Tuple[int, str]  # (lamport clock, site); compared clock first
+# ("i", id, origin, char) inserts a character after origin (None: at the start)
+# ("d", id, targets) deletes the characters with the given ids
+Operation = tuple
+
+ROOT_SITE = "~"  # prefix of the site that owns the text a document was loaded with
+FRAME_UPDATE = 0x01
+# Arbitrary application-wide key for the Postgres advisory lock of HostLock
+_HOST_LOCK_KEY = 0x4641_434C
+UPDATE_OPS = 0
+UPDATE_SNAPSHOT = 1
+
+
+class CollabError(ValueError):
+    pass
+
+
+class Item:
+    __slots__ = ("id", "char", "deleted")
+
+    def __init__(self, item_id: ItemId, char: Optional[str], deleted: bool = False):
+        self.id = item_id
+        self.char = char
+        self.deleted = deleted
+
+
+class Sequence:
+    """One replica of an RGA text sequence; used by the server and by clients"""
+
+    def __init__(self, site: str):
+        self.site = site
+        self.clock = 0
+        self.items: List[Item] = []
+        self.index: Dict[ItemId, Item] = {}
+        # Highest clock integrated per site, for "send me what I'm missing"
+        self.vector: Dict[str, int] = {}
+        self._pending: List[Operation] = []
+        # (id, position) of the last insert: typing continues right after it
+        self._last: Optional[Tuple[ItemId, int]] = None
+
+    # -- local edits -------------------------------------------------------
+
+    def _next_id(self) -> ItemId:
+        self.clock += 1
+        return (self.clock, self.site)
+
+    def _visible(self) -> List[Item]:
+        return [item for item in self.items if not item.deleted]
+
+    def local_insert(self, position: int, text: str) -> List[Operation]:
+        """Insert ``text`` before the visible character at ``position``"""
+        visible = self._visible()
+        origin = visible[position - 1].id if position > 0 else None
+        ops = []
+        for char in text:
+            op = ("i", self._next_id(), origin, char)
+            self._integrate(op)
+            ops.append(op)
+            origin = op[1]
+        return ops
+
+    def local_delete(self, position: int, length: int) -> List[Operation]:
+        targets = tuple(item.id for item in self._visible()[position:position + length])
+        if not targets:
+            return []
+        op = ("d", self._next_id(), targets)
+        self._integrate(op)
+        return [op]
+
+    # -- remote operations -------------------------------------------------
+
+    def apply(self, ops: Iterable[Operation]) -> List[Operation]:
+        """Integrate remote operations; returns those that were new.
+
+        Operations whose dependencies have not arrived yet wait until they do.
+        """
+        applied = []
+        for op in ops:
+            if self._known(op):
+                continue
+            if self._ready(op):
+                self._integrate(op)
+                applied.append(op)
+                applied.extend(self._drain_pending())
+            else:
+                self._pending.append(op)
+        return applied
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _known(self, op: Operation) -> bool:
+        if op[0] == "i":
+            return op[1] in self.index
+        # Deleting twice is harmless; this only keeps repeats from being relayed
+        clock, site = op[1]
+        return clock <= self.vector.get(site, 0) and all(
+            target in self.index and self.index[target].deleted for target in op[2])
+
+    def _ready(self, op: Operation) -> bool:
+        if op[0] == "i":
+            return op[2] is None or op[2] in self.index
+        return all(target in self.index for target in op[2])
+
+    def _drain_pending(self) -> List[Operation]:
+        applied = []
+        progress = True
+        while progress and self._pending:
+            progress = False
+            for op in list(self._pending):
+                if self._known(op):
+                    self._pending.remove(op)
+                elif self._ready(op):
+                    self._pending.remove(op)
+                    self._integrate(op)
+                    applied.append(op)
+                    progress = True
+        return applied
+
+    def _integrate(self, op: Operation):
+        item_id = op[1]
+        clock, site = item_id
+        if op[0] == "i":
+            origin = op[2]
+            if origin is None:
+                position = 0
+            elif self._last is not None and self._last[0] == origin:
+                position = self._last[1] + 1
+            else:
+                position = self.items.index(self.index[origin]) + 1
+            # Concurrent inserts after the same origin: the higher id goes
+            # first. Anything inserted after a higher id has a higher id itself,
+            # so skipping every higher id keeps those runs together.
+            items = self.items
+            while position < len(items) and items[position].id > item_id:
+                position += 1
+            item = Item(item_id, op[3])
+            items.insert(position, item)
+            self.index[item_id] = item
+            self._last = (item_id, position)
+        else:
+            for target in op[2]:
+                self.index[target].deleted = True
+        if clock > self.clock:
+            self.clock = clock
+        if clock > self.vector.get(site, 0):
+            self.vector[site] = clock
+
+    # -- state -------------------------------------------------------------
+
+    def text(self) -> str:
+        return "".join(item.char for item in self.items if not item.deleted)
+
+    def load_text(self, text: str, root: str = ROOT_SITE):
+        """Start from plain text, attributed to the site ``root``"""
+        self.items = [Item((clock, root), char) for clock, char in enumerate(text, start=1)]
+        self.index = {item.id: item for item in self.items}
+        self.vector = {root: len(text)} if text else {}
+        self._last = None
+        self.clock = max(self.clock, len(text))
+        self._pending = []
+
+    def load_snapshot(self, items: List[Item], vector: Dict[str, int]):
+        """Replace this replica's state with a snapshot from the server"""
+        self.items = [Item(item.id, item.char, item.deleted) for item in items]
+        self.index = {item.id: item for item in self.items}
+        self.vector = dict(vector)
+        self._last = None
+        self.clock = max([self.clock, *vector.values()]) if vector else self.clock
+        pending, self._pending = self._pending, []
+        self.apply(pending)
+
+    def drop_tombstone_text(self):
+        for item in self.items:
+            if item.deleted:
+                item.char = None
+
+
+# -- binary encoding -------------------------------------------------------
+#
+# update   := kind:u8 nsites:varint site* body
+# site     := len:varint utf8
+# ops body := nops:varint op*, where op is one of
+#   0 site clock text          run of inserts at the start: clocks clock.., each after the previous
+#   1 site clock osite oclock text
+#                              run of inserts after (oclock, osite)
+#   2 site clock nranges (site clock len)*
+#                              delete op (clock, site) of ranges of consecutive clocks
+# snapshot := vector, nruns:varint (site clock deleted:u8 len text?)*
+#   runs of items with consecutive clocks from one site; deleted runs carry no text
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def varint(self) -> int:
+        result = shift = 0
+        while True:
+            if self.pos >= len(self.data):
+                raise CollabError("Truncated update")
+            byte = self.data[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+            if shift > 63:
+                raise CollabError("Varint too long")
+
+    def count(self, entry_size: int = 1) -> int:
+        """A varint count of entries at least ``entry_size`` bytes long each.
+
+        Checked against the bytes left before the caller loops over it, so a
+        forged count fails at once instead of after a long decode.
+        """
+        value = self.varint()
+        if value * entry_size > len(self.data) - self.pos:
+            raise CollabError("Count exceeds the update size")
+        return value
+
+    def byte(self) -> int:
+        if self.pos >= len(self.data):
+            raise CollabError("Truncated update")
+        self.pos += 1
+        return self.data[self.pos - 1]
+
+    def text(self) -> str:
+        length = self.varint()
+        if self.pos + length > len(self.data):
+            raise CollabError("Truncated update")
+        value = self.data[self.pos:self.pos + length].decode("utf-8")
+        self.pos += length
+        return value
+
+
+class _SiteTable:
+    def __init__(self):
+        self.sites: Dict[str, int] = {}
+
+    def __call__(self, site: str) -> int:
+        return self.sites.setdefault(site, len(self.sites))
+
+    def header(self, kind: int) -> bytearray:
+        out = bytearray([kind])
+        _write_varint(out, len(self.sites))
+        for site in self.sites:
+            encoded = site.encode("utf-8")
+            _write_varint(out, len(encoded))
+            out += encoded
+        return out
+
+
+def _write_text(out: bytearray, text: str):
+    encoded = text.encode("utf-8")
+    _write_varint(out, len(encoded))
+    out += encoded
+
+
+def _insert_runs(ops: List[Operation]):
+    """Group inserts typed one after another into (first op, text) runs"""
+    run_start, chars, previous = None, [], None
+    for op in ops:
+        if op[0] == "i" and previous is not None and op[1][1] == previous[1][1] \
+                and op[1][0] == previous[1][0] + 1 and op[2] == previous[1]:
+            chars.append(op[3])
+        else:
+            if run_start is not None:
+                yield run_start, "".join(chars)
+            run_start, chars = (op, [op[3]]) if op[0] == "i" else (None, [])
+            if op[0] == "d":
+                yield op, None
+        previous = op if op[0] == "i" else None
+    if run_start is not None:
+        yield run_start, "".join(chars)
+
+
+def _clock_ranges(ids: Iterable[ItemId]):
+    """Collapse ids into (site, first clock, count) runs of consecutive clocks"""
+    ranges: List[List] = []
+    for clock, site in ids:
+        last = ranges[-1] if ranges else None
+        if last and last[0] == site and last[1] + last[2] == clock:
+            last[2] += 1
+        else:
+            ranges.append([site, clock, 1])
+    return ranges
+
+
+def encode_update(ops: List[Operation]) -> bytes:
+    sites = _SiteTable()
+    body = bytearray()
+    runs = list(_insert_runs(ops))
+    _write_varint(body, len(runs))
+    for op, text in runs:
+        clock, site = op[1]
+        if op[0] == "d":
+            body.append(2)
+            _write_varint(body, sites(site))
+            _write_varint(body, clock)
+            ranges = _clock_ranges(op[2])
+            _write_varint(body, len(ranges))
+            for target_site, first, count in ranges:
+                _write_varint(body, sites(target_site))
+                _write_varint(body, first)
+                _write_varint(body, count)
+        elif op[2] is None:
+            body.append(0)
+            _write_varint(body, sites(site))
+            _write_varint(body, clock)
+            _write_text(body, text)
+        else:
+            body.append(1)
+            _write_varint(body, sites(site))
+            _write_varint(body, clock)
+            _write_varint(body, sites(op[2][1]))
+            _write_varint(body, op[2][0])
+            _write_text(body, text)
+    return bytes(sites.header(UPDATE_OPS) + body)
+
+
+def encode_snapshot(sequence: Sequence) -> bytes:
+    sites = _SiteTable()
+    body = bytearray()
+    _write_varint(body, len(sequence.vector))
+    for site, clock in sequence.vector.items():
+        _write_varint(body, sites(site))
+        _write_varint(body, clock)
+    runs: List[list] = []  # [site, first clock, deleted, chars]
+    for item in sequence.items:
+        clock, site = item.id
+        last = runs[-1] if runs else None
+        if last and last[0] == site and last[1] + len(last[3]) == clock and last[2] == item.deleted:
+            last[3].append(item.char or "")
+        else:
+            runs.append([site, clock, item.deleted, [item.char or ""]])
+    _write_varint(body, len(runs))
+    for site, first, deleted, chars in runs:
+        _write_varint(body, sites(site))
+        _write_varint(body, first)
+        body.append(1 if deleted else 0)
+        if deleted:
+            _write_varint(body, len(chars))
+        else:
+            _write_text(body, "".join(chars))
+    return bytes(sites.header(UPDATE_SNAPSHOT) + body)
+
+
+def decode_update(data: bytes, max_items: Optional[int] = None):
+    """Return ("ops", [op, ...]) or ("snapshot", (items, vector)).
+
+    ``max_items`` bounds how many characters the update may refer to beyond
+    those it inserts itself; the server passes the document's length
+    (tombstones included), since a run of deleted ids costs a few bytes on
+    the wire but one entry per character once expanded.
+    """
+    reader = _Reader(data)
+    kind = reader.byte()
+    sites = [reader.text() for _ in range(reader.count())]
+    budget = max_items
+
+    def site() -> str:
+        index = reader.varint()
+        if index >= len(sites):
+            raise CollabError("Unknown site index")
+        return sites[index]
+
+    def expand(count: int) -> int:
+        nonlocal budget
+        if budget is not None:
+            budget -= count
+            if budget < 0:
+                raise CollabError("Update refers to more characters than the document has")
+        return count
+
+    if kind == UPDATE_SNAPSHOT:
+        vector = {}
+        for _ in range(reader.count(2)):
+            name = site()
+            vector[name] = reader.varint()
+        items = []
+        for _ in range(reader.count(4)):
+            name, first, deleted = site(), reader.varint(), reader.byte() == 1
+            if deleted:
+                items.extend(Item((first + offset, name), None, True) for offset in range(expand(reader.varint())))
+            else:
+                chars = reader.text()
+                expand(len(chars))
+                items.extend(Item((first + offset, name), char) for offset, char in enumerate(chars))
+        return "snapshot", (items, vector)
+
+    if kind != UPDATE_OPS:
+        raise CollabError(f"Unknown update kind {kind}")
+    ops: List[Operation] = []
+    for _ in range(reader.count(3)):
+        tag = reader.byte()
+        name, clock = site(), reader.varint()
+        if tag == 2:
+            targets = []
+            for _ in range(reader.count(3)):
+                target_site, first, count = site(), reader.varint(), reader.varint()
+                targets.extend((first + offset, target_site) for offset in range(expand(count)))
+            ops.append(("d", (clock, name), tuple(targets)))
+            continue
+        if tag == 0:
+            origin = None
+        elif tag == 1:
+            origin_site = site()
+            origin = (reader.varint(), origin_site)
+            # Integration relies on every insert sorting after its origin
+            if clock <= origin[0]:
+                raise CollabError("Insert clock must be greater than its origin's")
+        else:
+            raise CollabError(f"Unknown operation tag {tag}")
+        chars = reader.text()
+        if budget is not None:
+            # Later deletes in this update may target these characters
+            budget += len(chars)
+        for offset, char in enumerate(chars):
+            op = ("i", (clock + offset, name), origin, char)
+            ops.append(op)
+            origin = op[1]
+    return "ops", ops
+
+
+def encode_frame(doc_id: str, update: bytes) -> bytes:
+    out = bytearray([FRAME_UPDATE])
+    _write_text(out, doc_id)
+    return bytes(out + update)
+
+
+def decode_frame(frame: bytes) -> Tuple[str, bytes]:
+    reader = _Reader(frame)
+    if reader.byte() != FRAME_UPDATE:
+        raise CollabError("Unknown frame type")
+    doc_id = reader.text()
+    return doc_id, frame[reader.pos:]
+
+
+# -- server engine ---------------------------------------------------------
+
+def disabled_reason() -> Optional[str]:
+    """Why this process must not host documents, or None"""
+    if not COLLAB_ENABLED:
+        return "Collaborative editing is disabled (COLLAB_ENABLED=False)"
+    if WS_BACKPLANE != "memory":
+        return f"Collaborative editing needs a single process; WS_BACKPLANE={WS_BACKPLANE} joins several"
+    if WEB_CONCURRENCY > 1:
+        return f"Collaborative editing needs a single process; WEB_CONCURRENCY={WEB_CONCURRENCY}"
+    return None
+
+
+class HostLock:
+    """Held for its lifetime by the one process that may host documents.
+
+    A session-level advisory lock on Postgres covers every instance sharing
+    the database; elsewhere (and behind PgBouncer, which hands sessions
+    around) an flock on a file named after DATABASE_URL covers this host.
+    """
+
+    def __init__(self):
+        self._connection = None
+        self._file = None
+
+    def acquire(self) -> bool:
+        """Take the lock without waiting; False if another process has it"""
+        if engine.dialect.name == "postgresql" and not DB_PGBOUNCER:
+            connection = engine.connect()
+            # Out of the pool: the lock lives exactly as long as this session
+            connection.detach()
+            held = connection.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": _HOST_LOCK_KEY})
+            connection.commit()
+            if held:
+                self._connection = connection
+            else:
+                connection.close()
+            return bool(held)
+        if fcntl is None:
+            return True
+        digest = hashlib.sha256(DATABASE_URL.encode()).hexdigest()[:16]
+        lock_file = open(os.path.join(tempfile.gettempdir(), f"falnote-collab-{digest}.lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+    def release(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+def parse_doc_id(doc_id: str) -> schemas.EditOperation:
+    """Map a document id to the field it edits (value filled in on save)"""
+    parts = doc_id.split(":")
+    if parts[0] == "page" and len(parts) == 2 and parts[1] in ("main_title", "main_subtitle"):
+        return schemas.EditOperation(entity="page", field=parts[1])
+    if parts[0] == "page" and len(parts) == 3 and parts[1] == "content" and parts[2]:
+        return schemas.EditOperation(entity="page", field="content", key=parts[2])
+    if parts[0] == "project-card" and len(parts) == 3 and parts[1].isdigit() and parts[2] in ("title", "description"):
+        return schemas.EditOperation(entity="project-card", id=int(parts[1]), field=parts[2])
+    raise CollabError(f"Unknown document: {doc_id}")
+
+
+def doc_prefix(entity: str, row_id: Optional[int] = None) -> str:
+    """Prefix shared by the document ids of one row"""
+    return "page:" if entity == "page" else f"{entity}:{row_id}:"
+
+
+class CollabDocument:
+    def __init__(self, doc_id: str, target: schemas.EditOperation, text: str):
+        self.doc_id = doc_id
+        self.target = target
+        self.sequence = Sequence(ROOT_SITE)
+        # A root site unique to this load: replicas of an earlier load (before a
+        # restart or a REST write) never look up to date and get a snapshot
+        self.sequence.load_text(text, f"{ROOT_SITE}{time.time_ns():x}")
+        self.log: List[Operation] = []
+        # What a client must already have for the log alone to bring it up to date
+        self.base_vector = dict(self.sequence.vector)
+        self.dirty = False
+        self.last_used = time.monotonic()
+
+
+class CollabEngine:
+    def __init__(self, snapshot_every: int = COLLAB_SNAPSHOT_EVERY, max_documents: int = COLLAB_MAX_DOCUMENTS,
+                 idle_seconds: float = COLLAB_IDLE_SECONDS, save_interval_ms: float = COLLAB_SAVE_INTERVAL_MS):
+        self.snapshot_every = snapshot_every
+        self.max_documents = max_documents
+        self.idle_seconds = idle_seconds
+        self.save_interval = save_interval_ms / 1000
+        self.documents: "OrderedDict[str, CollabDocument]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Lock] = {}
+        self._save = None
+        self._task: Optional[asyncio.Task] = None
+        self._host_lock = HostLock()
+        self.disabled = disabled_reason()
+        self.ops_applied = Counter("collab_ops_total", "CRDT operations integrated")
+        self.duplicates = Counter("collab_duplicate_ops_total", "Operations received more than once")
+        self.snapshots = Counter("collab_snapshots_total", "Operation logs compacted into snapshots")
+        self.merge_time = Histogram("collab_merge_seconds", "Time to integrate one update")
+
+    def set_saver(self, save):
+        """``save(EditOperation, session_id)`` persists a document's text"""
+        self._save = save
+
+    async def start(self):
+        """Take the host lock, then save edited documents every save_interval until stop().
+
+        Workers started without WEB_CONCURRENCY (``uvicorn --workers``) get
+        past ``disabled_reason``; all but the first to start stop here.
+        """
+        if self._task is not None or self.disabled:
+            return
+        try:
+            hosting = await asyncio.to_thread(self._host_lock.acquire)
+        except Exception as e:
+            print(f"[COLLAB] Could not take the host lock: {e!r}")
+            hosting = False
+        if not hosting:
+            self.disabled = "Collaborative editing is hosted by another process serving this database"
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.save_interval)
+            try:
+                self.persist_all()
+            except Exception as e:
+                print(f"[COLLAB] Saving documents failed: {e!r}")
+
+    async def stop(self):
+        """Stop the saver and save whatever is still unsaved"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.persist_all()
+        self._host_lock.release()
+
+    async def document(self, doc_id: str) -> CollabDocument:
+        if self.disabled:
+            raise CollabError(self.disabled)
+        document = self.documents.get(doc_id)
+        if document is None:
+            lock = self._loading.setdefault(doc_id, asyncio.Lock())
+            async with lock:
+                document = self.documents.get(doc_id)
+                if document is None:
+                    target = parse_doc_id(doc_id)
+                    document = CollabDocument(doc_id, target, await _load_text(target))
+                    self.documents[doc_id] = document
+                    self._evict()
+            self._loading.pop(doc_id, None)
+        self.documents.move_to_end(doc_id)
+        document.last_used = time.monotonic()
+        return document
+
+    async def apply_update(self, doc_id: str, update: bytes, session_id: str) -> Optional[bytes]:
+        """Integrate a client's binary update; returns the update to relay, or None"""
+        document = await self.document(doc_id)
+        # Checked before decoding: a snapshot is never accepted from a client
+        if update[:1] != bytes([UPDATE_OPS]):
+            raise CollabError("Clients may only send operations")
+        _, ops = decode_update(update, max_items=len(document.sequence.items))
+        for op in ops:
+            if op[1][1].startswith(ROOT_SITE):
+                raise CollabError("Site id is reserved")
+        start = time.perf_counter()
+        pending = document.sequence.pending
+        applied = document.sequence.apply(ops)
+        self.merge_time.observe(time.perf_counter() - start)
+        self.ops_applied.inc(len(applied))
+        self.duplicates.inc(len(ops) - len(applied) - (document.sequence.pending - pending))
+        if not applied:
+            return None
+        document.log.extend(applied)
+        document.dirty = True
+        if len(document.log) >= self.snapshot_every:
+            self.compact(document, session_id)
+        # Relay exactly what was new, re-encoded so duplicates are not echoed
+        return update if len(applied) == len(ops) else encode_update(applied)
+
+    async def sync(self, doc_id: str, vector: Dict[str, int]) -> bytes:
+        """Operations a client with ``vector`` is missing, or a snapshot if the log no longer has them"""
+        document = await self.document(doc_id)
+        # The log only covers changes since the last snapshot
+        if all(vector.get(site, 0) >= clock for site, clock in document.base_vector.items()):
+            return encode_update([op for op in document.log if op[1][0] > vector.get(op[1][1], 0)])
+        return encode_snapshot(document.sequence)
+
+    def compact(self, document: CollabDocument, session_id: Optional[str] = None):
+        """Fold the log into a snapshot and save the text"""
+        document.sequence.drop_tombstone_text()
+        document.base_vector = dict(document.sequence.vector)
+        document.log = []
+        self.snapshots.inc()
+        self._persist(document, session_id)
+
+    def _persist(self, document: CollabDocument, session_id: Optional[str] = None):
+        if not document.dirty or self._save is None:
+            return
+        op = document.target.model_copy(update={"value": document.sequence.text()})
+        self._save(op, session_id or "collab")
+        document.dirty = False
+
+    def _evict(self):
+        """Unload idle documents beyond the limit, saving them first"""
+        now = time.monotonic()
+        for doc_id in list(self.documents):
+            if len(self.documents) <= self.max_documents:
+                break
+            document = self.documents[doc_id]
+            if now - document.last_used >= self.idle_seconds:
+                self._persist(document)
+                del self.documents[doc_id]
+
+    def release(self, prefix: Union[str, Tuple[str, ...]], save: bool = True) -> List[str]:
+        """Unload the open documents whose id starts with ``prefix`` (or any of several).
+
+        REST writes release a row's documents (saving them first) before
+        writing, and discard any reloaded meanwhile once committed.
+        """
+        released = [doc_id for doc_id in self.documents if doc_id.startswith(prefix)]
+        for doc_id in released:
+            document = self.documents.pop(doc_id)
+            if save:
+                self._persist(document)
+        return released
+
+    def persist_all(self):
+        """Save every document edited since it was last saved"""
+        for document in self.documents.values():
+            self._persist(document)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": not self.disabled,
+            "disabled_reason": self.disabled,
+            "documents": len(self.documents),
+            "log_ops": sum(len(document.log) for document in self.documents.values()),
+            "ops": self.ops_applied.value,
+            "duplicates": self.duplicates.value,
+            "snapshots": self.snapshots.value,
+            "merge": self.merge_time.summary(),
+        }
+
+
+async def _load_text(target: schemas.EditOperation) -> str:
+    async with session_scope() as db:
+        if target.entity == "page":
+            row = await db.scalar(select(models.PageData).limit(1))
+        else:
+            row = await db.get(models.ProjectCard, target.id)
+    if row is None:
+        raise CollabError("Document target does not exist")
+    value = getattr(row, target.field)
+    if target.key is not None:
+        value = (value or {}).get(target.key) if isinstance(value, dict) else None
+    return value if isinstance(value, str) else ""
+
+
+collab = CollabEngine()
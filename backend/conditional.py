@@ -0,0 +1,100 @@
+"""ETags, conditional GET (304) and If-Match preconditions for REST resources.
+
+Item ETags are built from the row's ``version`` counter, e.g.
+``"project-card-7-v3"``. Collection ETags digest the aggregate state of a
+table (row count, max id, max updated_at and the sum of versions), which a
+single aggregate query yields without loading or serializing any rows.
+"""
+import hashlib
+import re
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import HTTPException, Request
+from sqlalchemy import func, select
+
+_VERSION_TAG = re.compile(r'^(?:W/)?"(?P<tag>[a-z-]+-\d+-v\d+)(?:;[^"]*)?"$')
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison as required for If-None-Match (RFC 9110 13.1.2)"""
+    if header.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+
+def item_tag(kind: str, item_id: int, version: int) -> str:
+    return f"{kind}-{item_id}-v{version}"
+
+
+def item_etag(kind: str, item_id: int, version: int, variant: str = "") -> str:
+    """Strong ETag for one row; projections get a variant suffix"""
+    suffix = f";{_short_hash(variant)}" if variant else ""
+    return f'"{item_tag(kind, item_id, version)}{suffix}"'
+
+
+def collection_etag(kind: str, digest: str, variant: str = "") -> str:
+    suffix = f";{_short_hash(variant)}" if variant else ""
+    return f'W/"{kind}-{digest}{suffix}"'
+
+
+def _short_hash(value: str) -> str:
+    return hashlib.sha1(value.encode()).hexdigest()[:8]
+
+
+async def collection_digest(db, model, *criteria) -> str:
+    """Digest of a table's aggregate state; changes on any insert, update or delete"""
+    row = (await db.execute(
+        select(
+            func.count(model.id),
+            func.max(model.id),
+            func.max(model.updated_at),
+            func.sum(model.version),
+        ).where(*criteria)
+    )).one()
+    return hashlib.sha1("|".join(str(value) for value in row).encode()).hexdigest()[:16]
+
+
+def http_date(value: Optional[datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since (RFC 9110 13.2.2)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def check_if_match(request: Request, kind: str, item_id: int, version: int):
+    """Reject a write with 412 unless If-Match (when sent) names the current version"""
+    if_match = request.headers.get("if-match")
+    if if_match is None or if_match.strip() == "*":
+        return
+    current = item_tag(kind, item_id, version)
+    for candidate in if_match.split(","):
+        match = _VERSION_TAG.match(candidate.strip())
+        if match and match.group("tag") == current:
+            return
+    raise HTTPException(status_code=412, detail="Resource has been modified; reload and retry")
@@ -10,7 +10,7 @@ print(f"[CONFIG] DATABASE_URL from env: {DATABASE_URL[:50] if DATABASE_URL else
 print(f"[CONFIG] ENVIRONMENT: {os.getenv('ENVIRONMENT', 'development')}")
 
 # If DATABASE_URL looks like just a hostname (Render/Railway's issue), build it from components
-if DATABASE_URL and not DATABASE_URL.startswith("postgresql://") and not DATABASE_URL.startswith("postgres://"):
+if DATABASE_URL and not DATABASE_URL.startswith(("postgresql://", "postgres://", "postgresql+", "sqlite")):
     # Build from individual Render variables
     pguser = os.getenv("PGUSER", "postgres")
     pgpassword = os.getenv("PGPASSWORD", "")
@@ -36,5 +36,117 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 DEBUG = os.getenv("DEBUG", "True") == "True"
 
 # WebSocket settings
-WS_HEARTBEAT_INTERVAL = 30  # seconds
-WS_HEARTBEAT_TIMEOUT = 60  # seconds
+# Every connection is pinged once per WS_HEARTBEAT_INTERVAL seconds and closed
+# once nothing has been heard from it for WS_HEARTBEAT_TIMEOUT seconds
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "30"))
+WS_HEARTBEAT_TIMEOUT = float(os.getenv("WS_HEARTBEAT_TIMEOUT", "60"))
+# Outbound messages queued per client before WS_BACKPRESSURE_POLICY applies:
+# "drop_oldest", "coalesce" (a newer message of the same type from the same
+# sender replaces the queued one) or "disconnect". A single send that takes
+# longer than WS_SEND_TIMEOUT seconds disconnects the client.
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+WS_BACKPRESSURE_POLICY = os.getenv("WS_BACKPRESSURE_POLICY", "coalesce")
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+# permessage-deflate for clients that offer it (passed to uvicorn)
+WS_PER_MESSAGE_DEFLATE = os.getenv("WS_PER_MESSAGE_DEFLATE", "True") == "True"
+# Joins the WebSocket clients of every worker/instance: "memory" (single
+# process), "redis" (pub/sub on REDIS_URL) or "postgres" (LISTEN/NOTIFY)
+WS_BACKPLANE = os.getenv("WS_BACKPLANE", "memory")
+WS_BACKPLANE_CHANNEL = os.getenv("WS_BACKPLANE_CHANNEL", "falnote_ws")
+# Client messages are held this long so superseded updates can be dropped
+# and the rest sent as one frame; 0 broadcasts every message immediately
+WS_BATCH_WINDOW_MS = float(os.getenv("WS_BATCH_WINDOW_MS", "25"))
+WS_BATCH_MAX_MESSAGES = int(os.getenv("WS_BATCH_MAX_MESSAGES", "100"))
+# Edits sent over the WebSocket are buffered and written in one transaction
+# once editing pauses for WRITE_BEHIND_INTERVAL_MS, and at least every
+# WRITE_BEHIND_MAX_LAG_MS while it continues
+WRITE_BEHIND_INTERVAL_MS = float(os.getenv("WRITE_BEHIND_INTERVAL_MS", "250"))
+WRITE_BEHIND_MAX_LAG_MS = float(os.getenv("WRITE_BEHIND_MAX_LAG_MS", "2000"))
+# Collaborative text documents: edited documents are saved every
+# COLLAB_SAVE_INTERVAL_MS, the operation log is compacted into a snapshot
+# every COLLAB_SNAPSHOT_EVERY operations; beyond
+# COLLAB_MAX_DOCUMENTS open documents, ones idle for COLLAB_IDLE_SECONDS are unloaded
+COLLAB_SAVE_INTERVAL_MS = float(os.getenv("COLLAB_SAVE_INTERVAL_MS", "1000"))
+COLLAB_SNAPSHOT_EVERY = int(os.getenv("COLLAB_SNAPSHOT_EVERY", "500"))
+COLLAB_MAX_DOCUMENTS = int(os.getenv("COLLAB_MAX_DOCUMENTS", "200"))
+COLLAB_IDLE_SECONDS = float(os.getenv("COLLAB_IDLE_SECONDS", "300"))
+# Documents live in one process, so collaboration is switched off whenever
+# several processes serve WebSockets: a backplane other than "memory", or
+# WEB_CONCURRENCY > 1. Gunicorn and uvicorn both take their default worker
+# count from WEB_CONCURRENCY; prefer it to -w / --workers. Workers started
+# without it still find each other at startup (see collab.HostLock).
+COLLAB_ENABLED = os.getenv("COLLAB_ENABLED", "True") == "True"
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# Blob storage for uploaded images ("local" stores files under BLOB_STORE_PATH)
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "local")
+BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "blobs"))
+
+# Largest image upload accepted; bigger ones are refused with 413
+IMAGE_MAX_UPLOAD_MB = float(os.getenv("IMAGE_MAX_UPLOAD_MB", "25"))
+
+# Resized image derivatives served for /api/images/{id}?w=
+IMAGE_DERIVATIVE_WIDTHS = sorted(int(w) for w in os.getenv("IMAGE_DERIVATIVE_WIDTHS", "320,640,1280").split(","))
+IMAGE_DERIVATIVE_PATH = os.getenv("IMAGE_DERIVATIVE_PATH", os.path.join(BLOB_STORE_PATH, "derivatives"))
+# Limit for the whole directory, shared by every worker that uses it
+IMAGE_DERIVATIVE_CACHE_MB = int(os.getenv("IMAGE_DERIVATIVE_CACHE_MB", "512"))
+IMAGE_DERIVATIVE_QUALITY = int(os.getenv("IMAGE_DERIVATIVE_QUALITY", "80"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+# Use SQLAlchemy asyncio (asyncpg / aiosqlite) for request handlers
+DB_ASYNC = os.getenv("DB_ASYNC", "False") == "True"
+
+# Connection pool (see db_pool.py). DB_PRE_PING: "always" pings on every
+# checkout, "idle" only after DB_PRE_PING_IDLE_SECONDS unused, "never" relies
+# on DB_POOL_RECYCLE and error handling alone.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_PRE_PING = os.getenv("DB_PRE_PING", "idle")
+DB_PRE_PING_IDLE_SECONDS = float(os.getenv("DB_PRE_PING_IDLE_SECONDS", "30"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 disables
+# Set when connecting through PgBouncer in transaction pooling mode
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "False") == "True"
+
+# Response cache for page data and project cards: "memory" (per process),
+# "redis" (shared between workers via REDIS_URL) or "none". With "memory" and
+# several workers, a write made through one worker reaches the others within
+# CACHE_TTL_SECONDS.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# List endpoints: ?limit= page sizes, and rows fetched per round trip when
+# streaming NDJSON exports
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "100"))
+LIST_MAX_PAGE_SIZE = int(os.getenv("LIST_MAX_PAGE_SIZE", "1000"))
+LIST_STREAM_BATCH = int(os.getenv("LIST_STREAM_BATCH", "500"))
+# Most creates + updates + deletes one batch request may carry
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "10000"))
+
+# Change log behind /api/changes: the newest CHANGE_LOG_RETENTION entries are
+# kept; clients whose cursor is older get a full snapshot instead
+CHANGE_LOG_RETENTION = int(os.getenv("CHANGE_LOG_RETENTION", "10000"))
+CHANGE_LOG_COMPACT_EVERY = int(os.getenv("CHANGE_LOG_COMPACT_EVERY", "500"))
+
+# Full-text search (see search.py): the Postgres text search configuration
+# used to stem words, e.g. "english" or "simple"
+SEARCH_LANGUAGE = os.getenv("SEARCH_LANGUAGE", "english")
+
+# Request, SQL statement and serialization timing for /metrics (see
+# instrumentation.py); counters kept by the WebSocket, cache and pool code
+# are exposed either way
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+
+# Sampling profiler (see profiler.py). Requests slower than PROFILE_SLOW_MS
+# are kept with their stack samples and SQL, the newest PROFILE_SLOW_KEEP of
+# them; 0 turns slow-request capture off. Stacks are sampled every
+# PROFILE_INTERVAL_MS. The /api/admin/* endpoints need the X-Admin-Token
+# header to equal PROFILE_ADMIN_TOKEN and are disabled while it is empty.
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_SLOW_KEEP = int(os.getenv("PROFILE_SLOW_KEEP", "50"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
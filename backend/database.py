@@ -1,7 +1,11 @@
+from contextlib import asynccontextmanager
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from config import DATABASE_URL
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+from config import DATABASE_URL, DB_ASYNC
+from db_pool import engine_options, instrument, pool_status
 import os
 
 # Add SSL support for Railway PostgreSQL (only in production)
@@ -16,7 +20,8 @@ if is_production and db_url and "postgresql" in db_url and "sslmode" not in db_u
     print("Added SSL requirement for production")
 
 try:
-    engine = create_engine(db_url, pool_pre_ping=True, echo=False)
+    engine = create_engine(db_url, **engine_options(db_url, is_async=False))
+    pool_stats = instrument(engine, "sync")
     print("Database engine created successfully")
 except Exception as e:
     print(f"Error creating database engine: {e}")
@@ -25,9 +30,115 @@ except Exception as e:
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+def _async_url(url: str) -> str:
+    """Map a sync database URL onto its asyncio driver"""
+    if url.startswith("sqlite"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    url = url.replace("postgresql://", "postgresql+asyncpg://", 1).replace("postgres://", "postgresql+asyncpg://", 1)
+    # asyncpg spells libpq's sslmode as ssl
+    return url.replace("sslmode=", "ssl=")
+
+# The sync engine above is always kept for schema creation and migrations;
+# request handlers use the async engine when DB_ASYNC is enabled.
+async_engine = None
+AsyncSessionLocal = None
+async_pool_stats = None
+if DB_ASYNC:
+    async_engine = create_async_engine(_async_url(db_url), **engine_options(db_url, is_async=True))
+    async_pool_stats = instrument(async_engine, "async")
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    print("Async database engine created")
+
+class SyncSessionAdapter:
+    """Exposes a sync Session through the awaitable subset of AsyncSession.
+
+    Every database call runs in the threadpool, so handlers written against
+    AsyncSession never block the event loop when DB_ASYNC is off.
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, statement, *args, **kwargs)
+
+    async def stream(self, statement, *args, **kwargs):
+        """Like AsyncSession.stream: rows are fetched in the threadpool, a partition at a time"""
+        result = await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs)
+        return _ThreadedResult(result)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance, attribute_names=None):
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+class _ThreadedResult:
+    """The ``partitions()`` part of AsyncResult over a sync Result"""
+
+    def __init__(self, result):
+        self._result = result
+
+    async def partitions(self, size=None):
+        iterator = self._result.partitions(size)
+        while True:
+            rows = await run_in_threadpool(next, iterator, None)
+            if rows is None:
+                return
+            yield rows
+
+@asynccontextmanager
+async def session_scope():
+    """An AsyncSession, or a SyncSessionAdapter when DB_ASYNC is off, closed on exit"""
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    # Objects stay usable after commit without a lazy reload on the event loop
+    db = SyncSessionAdapter(SessionLocal(expire_on_commit=False))
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
+
+async def get_db():
+    """Request dependency wrapping session_scope()"""
+    async with session_scope() as db:
+        yield db
+
+
+def get_pool_status() -> dict:
+    status = {"sync": pool_status(engine, pool_stats)}
+    if async_engine is not None:
+        status["async"] = pool_status(async_engine, async_pool_stats)
+    return status
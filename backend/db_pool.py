@@ -0,0 +1,166 @@
+"""Connection pool configuration and instrumentation for the database engines"""
+import time
+import uuid
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from config import (
+    DB_MAX_OVERFLOW,
+    DB_PGBOUNCER,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_PRE_PING,
+    DB_PRE_PING_IDLE_SECONDS,
+    DB_STATEMENT_TIMEOUT_MS,
+)
+from metrics import Counter, Histogram
+
+# A checkout slower than this had to wait for a free connection (or to connect)
+WAIT_THRESHOLD_SECONDS = 0.001
+
+
+class PoolStats:
+    """Checkout latency and wait/timeout counts for one engine's pool"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkout_latency = Histogram(f"db_pool_{name}_checkout_seconds", "Time to obtain a pooled connection")
+        self.waits = Counter(f"db_pool_{name}_waits_total", "Checkouts that had to wait")
+        self.wait_time = Histogram(f"db_pool_{name}_wait_seconds", "Duration of checkouts that waited")
+        self.timeouts = Counter(f"db_pool_{name}_timeouts_total", "Checkouts that hit DB_POOL_TIMEOUT")
+        self.pings = Counter(f"db_pool_{name}_pings_total", "Liveness pings issued on checkout")
+        self.ping_failures = Counter(f"db_pool_{name}_ping_failures_total", "Pings that found a dead connection")
+
+    def record_checkout(self, elapsed: float):
+        self.checkout_latency.observe(elapsed)
+        if elapsed > WAIT_THRESHOLD_SECONDS:
+            self.waits.inc()
+            self.wait_time.observe(elapsed)
+
+
+def _timed_do_get(pool_cls):
+    """Subclass a QueuePool flavour so every checkout is timed"""
+
+    class Instrumented(pool_cls):
+        stats: PoolStats = None
+
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                if self.stats:
+                    self.stats.timeouts.inc()
+                raise
+            finally:
+                if self.stats:
+                    self.stats.record_checkout(time.perf_counter() - start)
+
+        def recreate(self):
+            new_pool = super().recreate()
+            new_pool.stats = self.stats
+            return new_pool
+
+    Instrumented.__name__ = f"Instrumented{pool_cls.__name__}"
+    return Instrumented
+
+
+InstrumentedQueuePool = _timed_do_get(QueuePool)
+InstrumentedAsyncQueuePool = _timed_do_get(AsyncAdaptedQueuePool)
+
+
+def engine_options(url: str, is_async: bool) -> dict:
+    """Keyword arguments for create_engine / create_async_engine from config"""
+    options = {"echo": False, "pool_pre_ping": DB_PRE_PING == "always"}
+    connect_args = {}
+    is_postgres = url.startswith("postgres")
+
+    if DB_PGBOUNCER:
+        # PgBouncer already pools server connections; keep none idle here
+        options["poolclass"] = NullPool
+    else:
+        options["poolclass"] = InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+
+    if url.startswith("sqlite"):
+        if not is_async:
+            connect_args["check_same_thread"] = False
+    elif is_postgres and is_async:
+        if DB_PGBOUNCER:
+            # Transaction-mode PgBouncer may route each statement to a different
+            # server connection, so prepared statements must not be cached
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+        if DB_STATEMENT_TIMEOUT_MS and not DB_PGBOUNCER:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+    elif is_postgres:
+        if DB_STATEMENT_TIMEOUT_MS and not DB_PGBOUNCER:
+            connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+    options["connect_args"] = connect_args
+    return options
+
+
+def instrument(engine, name: str) -> PoolStats:
+    """Attach stats and the idle pre-ping strategy to an engine's pool"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    stats = PoolStats(name)
+    sync_engine.pool.stats = stats
+
+    if DB_STATEMENT_TIMEOUT_MS and DB_PGBOUNCER and sync_engine.dialect.name == "postgresql":
+        # PgBouncer drops startup options, so set the timeout per transaction instead
+        @event.listens_for(sync_engine, "begin")
+        def _statement_timeout(conn):
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(DB_STATEMENT_TIMEOUT_MS)}")
+
+    if DB_PRE_PING == "idle":
+        @event.listens_for(sync_engine.pool, "checkin")
+        def _mark_idle(dbapi_connection, connection_record):
+            connection_record.info["checked_in_at"] = time.monotonic()
+
+        @event.listens_for(sync_engine.pool, "checkout")
+        def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+            checked_in_at = connection_record.info.get("checked_in_at")
+            if checked_in_at is None or time.monotonic() - checked_in_at < DB_PRE_PING_IDLE_SECONDS:
+                return
+            stats.pings.inc()
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+            except Exception as e:
+                stats.ping_failures.inc()
+                # The pool discards this connection and retries with a fresh one
+                raise exc.DisconnectionError() from e
+            finally:
+                cursor.close()
+    return stats
+
+
+def pool_status(engine, stats: PoolStats) -> dict:
+    """Point-in-time pool occupancy plus accumulated checkout metrics"""
+    pool = getattr(engine, "sync_engine", engine).pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    status.update(
+        checkout=stats.checkout_latency.summary(),
+        waits=stats.waits.value,
+        wait=stats.wait_time.summary(),
+        timeouts=stats.timeouts.value,
+        pre_ping=DB_PRE_PING,
+        pings=stats.pings.value,
+        ping_failures=stats.ping_failures.value,
+    )
+    return status
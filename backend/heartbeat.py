@@ -0,0 +1,116 @@
+"""Application-level heartbeats for every WebSocket connection from a single task.
+
+Connections are spread over the slots of a timer wheel that turns once per
+WS_HEARTBEAT_INTERVAL; each tick visits one slot, so every connection is
+checked once per interval and the work is spread evenly. A visit reaps the
+connection if nothing has been heard from it for WS_HEARTBEAT_TIMEOUT, and
+otherwise queues ``{"type": "ping", "data": {"id": n}}``. Clients answer
+with ``{"type": "pong", "data": {"id": n}}``; any inbound frame counts as
+a sign of life. Dead and half-open sockets are closed here instead of being
+found by a broadcast whose send times out.
+"""
+import asyncio
+import itertools
+import time
+from typing import Dict, List, Optional, Set
+from config import WS_HEARTBEAT_INTERVAL, WS_HEARTBEAT_TIMEOUT
+from metrics import Counter, Histogram
+from websocket_manager import ClientConnection, ConnectionManager, manager
+
+TICK_SECONDS = 1.0
+CLOSE_HEARTBEAT_TIMEOUT = 1001  # going away
+
+
+class HeartbeatScheduler:
+    def __init__(self, manager: ConnectionManager, interval: float = WS_HEARTBEAT_INTERVAL,
+                 timeout: float = WS_HEARTBEAT_TIMEOUT):
+        self.manager = manager
+        self.interval = interval
+        self.timeout = timeout
+        self.slots: List[Set[ClientConnection]] = [set() for _ in range(max(1, round(interval / TICK_SECONDS)))]
+        self.tick = interval / len(self.slots)
+        self._position = 0
+        self._ping_ids = itertools.count(1)
+        self._task: Optional[asyncio.Task] = None
+        self.pings = Counter("ws_heartbeat_pings_total", "Heartbeat pings queued")
+        self.pongs = Counter("ws_heartbeat_pongs_total", "Heartbeat pongs received")
+        self.reaped = Counter("ws_reaped_total", "Connections closed for missing heartbeats")
+        self.rtt = Histogram("ws_heartbeat_rtt_seconds", "Heartbeat round-trip time")
+
+    def _slot(self, connection: ClientConnection) -> Set[ClientConnection]:
+        return self.slots[connection.id % len(self.slots)]
+
+    def add(self, connection: ClientConnection):
+        self.touch(connection)
+        self._slot(connection).add(connection)
+
+    def remove(self, connection: ClientConnection):
+        self._slot(connection).discard(connection)
+
+    def touch(self, connection: ClientConnection):
+        """Record that the client is alive"""
+        data = self.manager.connection_data.get(connection.id)
+        if data is not None:
+            data["last_seen"] = time.monotonic()
+
+    def pong(self, connection: ClientConnection, payload: Optional[dict]):
+        self.pongs.inc()
+        data = self.manager.connection_data.get(connection.id)
+        outstanding = data.pop("ping", None) if data is not None else None
+        if outstanding is not None and isinstance(payload, dict) and payload.get("id") == outstanding[0]:
+            rtt = time.monotonic() - outstanding[1]
+            self.rtt.observe(rtt)
+            data["rtt_ms"] = round(rtt * 1000, 3)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self._visit(self.slots[self._position])
+            except Exception as e:
+                print(f"[HEARTBEAT] Tick failed: {e!r}")
+            self._position = (self._position + 1) % len(self.slots)
+
+    def _visit(self, slot: Set[ClientConnection]):
+        now = time.monotonic()
+        for connection in list(slot):
+            data = self.manager.connection_data.get(connection.id)
+            if data is None:
+                slot.discard(connection)
+                continue
+            if now - data.get("last_seen", now) > self.timeout:
+                print(f"Reaping connection of {connection.session_id}: no heartbeat for {now - data['last_seen']:.0f}s")
+                self.reaped.inc()
+                self.manager.disconnect(connection)
+                self.manager.close_later(connection.websocket, CLOSE_HEARTBEAT_TIMEOUT)
+                continue
+            ping_id = next(self._ping_ids)
+            data["ping"] = (ping_id, now)
+            connection.send({"type": "ping", "data": {"id": ping_id}})
+            self.pings.inc()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "interval_s": self.interval,
+            "timeout_s": self.timeout,
+            "pings": self.pings.value,
+            "pongs": self.pongs.value,
+            "reaped": self.reaped.value,
+            "rtt": self.rtt.summary(),
+        }
+
+
+heartbeat = HeartbeatScheduler(manager)
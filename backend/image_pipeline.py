@@ -0,0 +1,282 @@
+"""Width-bucketed image derivatives (thumbnails) generated off the event loop.
+
+Derivatives are rendered with Pillow in a process pool, eagerly after an
+upload and lazily on the first ``?w=`` request that misses. They live in an
+on-disk cache next to the blob store, shared by all workers, that is bounded
+by total size and evicts the least recently used files first.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Set, Tuple
+from blob_store import blob_store
+from config import (
+    IMAGE_DERIVATIVE_CACHE_MB,
+    IMAGE_DERIVATIVE_PATH,
+    IMAGE_DERIVATIVE_QUALITY,
+    IMAGE_DERIVATIVE_WIDTHS,
+    IMAGE_WORKERS,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: workers evict without coordinating
+    fcntl = None
+
+try:
+    from PIL import Image as PILImage, UnidentifiedImageError
+    # The image itself is at fault: rendering it again cannot succeed
+    DECODE_ERRORS = (UnidentifiedImageError, PILImage.DecompressionBombError)
+except ImportError:  # Pillow missing: originals are served for every ?w= request
+    PILImage = None
+    DECODE_ERRORS = ()
+
+FORMATS = {"webp": "image/webp", "jpeg": "image/jpeg"}
+# Vector and animated formats are served as uploaded
+RESIZABLE_TYPES = {"image/png", "image/jpeg", "image/webp", "image/bmp"}
+# After a failure that may be transient, serve the original this long before retrying
+RETRY_AFTER_SECONDS = 60
+
+
+def pick_width(requested: int) -> int:
+    """Snap a requested width to the smallest bucket that covers it"""
+    for width in IMAGE_DERIVATIVE_WIDTHS:
+        if requested <= width:
+            return width
+    return IMAGE_DERIVATIVE_WIDTHS[-1]
+
+
+def negotiate_format(requested: Optional[str], accept: str) -> str:
+    if requested in FORMATS:
+        return requested
+    return "webp" if "image/webp" in (accept or "") else "jpeg"
+
+
+def _render(source, destination: str, width: int, fmt: str, quality: int):
+    """Process-pool worker: resize ``source`` (path or bytes) and write it atomically"""
+    import io
+    from PIL import Image as PILImage, ImageOps
+
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    with PILImage.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), PILImage.LANCZOS)
+        if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+            # JPEG has no alpha channel: flatten onto white
+            background = PILImage.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.convert("RGBA").split()[-1])
+            image = background
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        tmp_path = f"{destination}.{os.getpid()}.tmp"
+        image.save(tmp_path, format=fmt.upper(), quality=quality, optimize=True)
+        os.replace(tmp_path, destination)
+
+
+class DerivativeCache:
+    """Size-bounded on-disk cache of rendered derivatives with LRU eviction.
+
+    The directory is the only state, so every worker process can share it:
+    a file's mtime is its last use (refreshed on hits, at most once per
+    TOUCH_SECONDS) and the size bound is enforced by scanning the directory
+    under an exclusive lock file. Each worker rescans once it has written
+    SCAN_FRACTION of the limit since its last scan, so between scans the
+    cache can exceed the limit by at most workers x SCAN_FRACTION of it.
+    """
+
+    LOCK_NAME = ".evict.lock"
+    TOUCH_SECONDS = 60
+    SCAN_FRACTION = 1 / 16
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.total_bytes = 0  # as of this process's last scan
+        self._written = 0  # bytes this process added since then
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.enforce()
+
+    def path_for(self, digest: str, width: int, fmt: str) -> str:
+        return os.path.join(self.root, digest[:2], digest, f"{width}.{fmt}")
+
+    def get(self, path: str) -> Optional[int]:
+        """Return the cached file size and mark it recently used, or None on a miss"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if time.time() - stat.st_mtime > self.TOUCH_SECONDS:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                # Evicted by another worker just now
+                return None
+        return stat.st_size
+
+    def add(self, path: str) -> int:
+        size = os.path.getsize(path)
+        with self._lock:
+            self._written += size
+            due = self._written >= self.max_bytes * self.SCAN_FRACTION
+        if due:
+            self.enforce()
+        return size
+
+    def _scan(self):
+        found = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".tmp") or name == self.LOCK_NAME:
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, path, stat.st_size))
+        return found
+
+    def enforce(self):
+        """Scan the directory and delete the least recently used files over the limit"""
+        with self._lock, _file_lock(os.path.join(self.root, self.LOCK_NAME)):
+            found = self._scan()
+            total = sum(size for _, _, size in found)
+            for _, path, size in sorted(found)[:-1]:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self.total_bytes = total
+            self._written = 0
+
+
+class _file_lock:
+    """Exclusive lock shared by every process using the directory (a no-op without fcntl)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._file = open(self.path, "a")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class ImagePipeline:
+    def __init__(self):
+        self.cache = DerivativeCache(IMAGE_DERIVATIVE_PATH, IMAGE_DERIVATIVE_CACHE_MB * 1024 * 1024)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # (digest, width, format) -> (render future, the pool running it)
+        self._in_flight: Dict[Tuple[str, int, str], Tuple[asyncio.Future, ProcessPoolExecutor]] = {}
+        self._warm_tasks: Set[asyncio.Task] = set()
+        self._undecodable: Set[str] = set()
+        self._retry_at: Dict[str, float] = {}  # digest -> when to try rendering again
+
+    @property
+    def available(self) -> bool:
+        return PILImage is not None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        return self._executor
+
+    async def derivative(self, digest: str, content_type: str, width: int, fmt: str) -> Optional[Tuple[str, int]]:
+        """Return (path, size) of the derivative, rendering it on a cache miss.
+
+        Returns None when the image cannot be resized (Pillow missing, vector
+        or animated format, a decoding failure) or the render failed for
+        another reason; callers serve the original. Only decoding failures
+        are remembered; anything else is tried again on the next request.
+        """
+        if not self.available or content_type not in RESIZABLE_TYPES or digest in self._undecodable:
+            return None
+        if digest in self._retry_at:
+            if time.monotonic() < self._retry_at[digest]:
+                return None
+            del self._retry_at[digest]
+        path = self.cache.path_for(digest, width, fmt)
+        size = self.cache.get(path)
+        if size is not None:
+            return path, size
+
+        key = (digest, width, fmt)
+        if key in self._in_flight:
+            pending, executor = self._in_flight[key]
+        else:
+            source = blob_store.local_path(digest) or blob_store.read_bytes(digest)
+            pending, executor = self._submit(source, path, width, fmt)
+            self._in_flight[key] = (pending, executor)
+            pending.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        try:
+            await asyncio.shield(pending)
+        except DECODE_ERRORS as e:
+            if digest not in self._undecodable:
+                self._undecodable.add(digest)
+                print(f"[IMAGES] Cannot decode {digest[:12]}, serving the original from now on: {e}")
+            return None
+        except BrokenProcessPool as e:
+            # A worker died (e.g. OOM-killed): start a fresh pool for the next render
+            self._reset_executor(executor)
+            print(f"[IMAGES] Render pool broke while rendering {digest[:12]}, restarting it: {e!r}")
+            return None
+        except Exception as e:
+            # Full disk, truncated upload...: serve the original for a while, then try again
+            self._retry_at[digest] = time.monotonic() + RETRY_AFTER_SECONDS
+            print(f"[IMAGES] Could not render {digest[:12]}, serving the original: {e!r}")
+            return None
+        # May rescan the cache directory: keep that off the event loop
+        return path, await asyncio.to_thread(self.cache.add, path)
+
+    def _submit(self, source, path: str, width: int, fmt: str) -> Tuple[asyncio.Future, ProcessPoolExecutor]:
+        loop = asyncio.get_running_loop()
+        try:
+            executor = self._get_executor()
+            return loop.run_in_executor(executor, _render, source, path, width, fmt, IMAGE_DERIVATIVE_QUALITY), executor
+        except BrokenProcessPool:
+            # Broke since its last render finished: replace it once
+            self._reset_executor(executor)
+            executor = self._get_executor()
+            return loop.run_in_executor(executor, _render, source, path, width, fmt, IMAGE_DERIVATIVE_QUALITY), executor
+
+    def _reset_executor(self, broken: ProcessPoolExecutor):
+        if self._executor is broken:
+            self._executor = None
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    async def warm(self, digest: str, content_type: str):
+        """Render every width/format bucket for a freshly uploaded image"""
+        for width in IMAGE_DERIVATIVE_WIDTHS:
+            for fmt in FORMATS:
+                await self.derivative(digest, content_type, width, fmt)
+
+    def schedule_warm(self, digest: str, content_type: str):
+        if self.available and content_type in RESIZABLE_TYPES:
+            task = asyncio.get_running_loop().create_task(self.warm(digest, content_type))
+            self._warm_tasks.add(task)
+            task.add_done_callback(self._warm_tasks.discard)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+pipeline = ImagePipeline()
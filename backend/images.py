@@ -0,0 +1,225 @@
+"""Content-addressed image storage and HTTP delivery helpers"""
+from typing import AsyncIterator, Callable, Optional, Tuple
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import models
+from blob_store import blob_store, iter_bytes, CHUNK_SIZE
+from conditional import etag_matches
+from config import IMAGE_MAX_UPLOAD_MB
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+MAX_UPLOAD_BYTES = int(IMAGE_MAX_UPLOAD_MB * 1024 * 1024)
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Magic-number prefixes for the formats the editor accepts
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+# Types served inline as they are; SVG is served inline only in a sandbox
+RASTER_TYPES = {"image/png", "image/jpeg", "image/gif", "image/bmp", "image/webp"}
+SVG_TYPE = "image/svg+xml"
+# SVG can carry script: no fetches, no script, a unique origin
+SVG_CSP = "default-src 'none'; sandbox"
+
+
+def sniff_content_type(data: bytes) -> str:
+    """The image MIME type from its leading bytes; the client's claim is never trusted"""
+    for signature, content_type in _SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data.lstrip()[:5] in (b"<?xml", b"<svg ") or data.lstrip()[:4] == b"<svg":
+        return SVG_TYPE
+    return "application/octet-stream"
+
+
+def safety_headers(content_type: str) -> Tuple[str, dict]:
+    """The type to serve stored bytes as, plus headers that stop them running on our origin"""
+    headers = {"X-Content-Type-Options": "nosniff"}
+    if content_type == SVG_TYPE:
+        headers["Content-Security-Policy"] = SVG_CSP
+    elif content_type not in RASTER_TYPES:
+        # Includes rows stored before uploads were sniffed strictly
+        content_type = "application/octet-stream"
+        headers["Content-Disposition"] = "attachment"
+    return content_type, headers
+
+
+def _register_image(db: Session, digest: str, size: int, content_type: str) -> models.Image:
+    """Create the metadata row for a stored blob unless it already exists"""
+    image = db.get(models.Image, digest)
+    if image is None:
+        image = models.Image(hash=digest, content_type=content_type, size=size)
+        db.add(image)
+        db.flush()
+    return image
+
+
+def store_image(db: Session, data: bytes) -> str:
+    """Save in-memory image bytes once per distinct content and return the image ID"""
+    blob = blob_store.put_bytes(data)
+    _register_image(db, blob.hash, blob.size, sniff_content_type(data))
+    return blob.hash
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Uploads are limited to {IMAGE_MAX_UPLOAD_MB:g} MB")
+
+
+async def save_upload(db: AsyncSession, file: UploadFile) -> models.Image:
+    """Stream an upload into the blob store chunk by chunk and return its image row (413 past the size limit)"""
+    head = b""
+    size = 0
+
+    async def chunks() -> AsyncIterator[bytes]:
+        nonlocal head, size
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                # The blob store discards its partial file
+                raise _too_large()
+            if len(head) < 16:
+                head += chunk[:16]
+            yield chunk
+
+    blob = await blob_store.put_stream(chunks())
+    return await db.run_sync(_register_image, blob.hash, blob.size, sniff_content_type(head))
+
+
+class UploadLimitMiddleware:
+    """Stop multipart bodies at the upload limit, before the form parser spools them to disk"""
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(scope.get("headers") or ()) if scope["type"] == "http" else {}
+        if not headers.get(b"content-type", b"").startswith(b"multipart/"):
+            await self.app(scope, receive, send)
+            return
+        declared = headers.get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > self.max_bytes:
+            await JSONResponse({"detail": _too_large().detail}, status_code=413)(scope, receive, send)
+            return
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside form parsing, so FastAPI answers it as a 413
+                    raise _too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def etag_for(digest: str) -> str:
+    return f'"{digest}"'
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range ``Range`` header into an inclusive (start, end) pair.
+
+    Returns None when the header is absent, malformed or asks for multiple
+    ranges (the full body is sent instead). Raises ValueError when the range
+    cannot be satisfied for a representation of ``size`` bytes.
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+    first, last = (part.strip() for part in spec.split("-", 1))
+    if (first and not first.isdigit()) or (last and not last.isdigit()) or not (first or last):
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("unsatisfiable suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        raise ValueError("range start beyond end of content")
+    return start, min(end, size - 1)
+
+
+def content_response(
+    request: Request,
+    etag: str,
+    size: int,
+    content_type: str,
+    iter_range: Callable[[int, int], AsyncIterator[bytes]],
+    extra_headers: Optional[dict] = None,
+) -> Response:
+    """Build a cacheable streaming response honouring conditional and Range requests"""
+    content_type, safety = safety_headers(content_type)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        **safety,
+        **(extra_headers or {}),
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1 if size else 0)
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=content_type)
+    return StreamingResponse(
+        iter_range(start, end),
+        status_code=status_code,
+        headers=headers,
+        media_type=content_type,
+    )
+
+
+def image_response(request: Request, image: models.Image) -> Response:
+    """Serve an original image from the blob store"""
+    # Rows not yet moved to the blob store still carry their bytes inline
+    if image.data is not None:
+        data = image.data
+        return content_response(request, etag_for(image.hash), len(data), image.content_type,
+                                lambda start, end: iter_bytes(data, start, end))
+    size = blob_store.size(image.hash)
+    if size is None:
+        return Response(status_code=404)
+    return content_response(request, etag_for(image.hash), size, image.content_type,
+                            lambda start, end: blob_store.iter_range(image.hash, start, end))
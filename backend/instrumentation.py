@@ -0,0 +1,118 @@
+"""Per-route request timing and per-statement SQL timing for /metrics.
+
+``MetricsMiddleware`` is a plain ASGI middleware (no per-request Request
+object or task): it times each HTTP request, counts the response body
+bytes and labels both with the route's path template
+(``/api/project-cards/{card_id}``), so one series covers every id.
+
+``install_sql_hooks`` listens for ``before/after_cursor_execute`` on every
+Engine (the async engines' sync engines included) and times each statement.
+Statements run inside a request also add to that request's query count and
+database time, carried on a contextvar that the threadpool and SQLAlchemy's
+greenlet bridge both inherit.
+
+Only the updates happen per request; formatting waits for a scrape.
+"""
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from metrics import COUNT_BUCKETS, SIZE_BUCKETS, Family, Histogram
+
+VERBS = ("SELECT", "INSERT", "UPDATE", "DELETE")
+
+request_seconds = Family(Histogram, "http_request_seconds", "HTTP request latency", ("method", "route", "status"))
+response_bytes = Family(Histogram, "http_response_bytes", "HTTP response body size", ("route",), buckets=SIZE_BUCKETS)
+request_queries = Family(Histogram, "http_request_queries", "SQL statements run per HTTP request", ("route",),
+                         buckets=COUNT_BUCKETS)
+request_db_seconds = Family(Histogram, "http_request_db_seconds", "Time spent in SQL statements per HTTP request",
+                            ("route",))
+statement_seconds = Family(Histogram, "db_statement_seconds", "SQL statement execution time", ("verb",))
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+# endpoint function -> path template, filled in per app on first use
+_route_paths: Dict[int, Dict[object, str]] = {}
+
+
+def route_label(scope) -> str:
+    """The matched route's path template; "unmatched" for 404s"""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    app = scope.get("app")
+    paths = _route_paths.get(id(app))
+    if paths is None or endpoint not in paths:
+        paths = _route_paths[id(app)] = {getattr(route, "endpoint", None): route.path
+                                         for route in getattr(app, "routes", ())}
+        # Mounted sub-apps' endpoints are not in the list; don't rescan for them
+        paths.setdefault(endpoint, "unmatched")
+    return paths[endpoint]
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status, size = 500, 0
+
+        async def send_counted(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_counted)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            route = route_label(scope)
+            request_seconds.labels(scope["method"], route, str(status)).observe(elapsed)
+            response_bytes.labels(route).observe(size)
+            request_queries.labels(route).observe(stats.queries)
+            request_db_seconds.labels(route).observe(stats.db_seconds)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    verb = statement.lstrip()[:6].upper()
+    statement_seconds.labels(verb if verb in VERBS else "OTHER").observe(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+def install_sql_hooks():
+    """Time every statement of every engine (idempotent)"""
+    if not event.contains(Engine, "before_cursor_execute", _before_execute):
+        event.listen(Engine, "before_cursor_execute", _before_execute)
+        event.listen(Engine, "after_cursor_execute", _after_execute)
@@ -0,0 +1,140 @@
+"""JSON Patch (RFC 6902) and JSON Merge Patch (RFC 7396) for PATCH endpoints.
+
+Both functions return a new document and leave their input untouched, so a
+patch that fails half way never leaves a partly modified row behind.
+"""
+import copy
+from typing import Any, List, Tuple
+
+JSON_PATCH = "application/json-patch+json"
+MERGE_PATCH = "application/merge-patch+json"
+
+
+class PatchError(ValueError):
+    """The patch is malformed or does not apply to the document (422)"""
+
+
+class PatchTestFailed(PatchError):
+    """A JSON Patch "test" operation did not match (409)"""
+
+
+def merge_patch(target: Any, patch: Any) -> Any:
+    """Apply an RFC 7396 merge patch: objects merge recursively, null deletes"""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def parse_pointer(pointer: str) -> List[str]:
+    """Split an RFC 6901 JSON Pointer into unescaped reference tokens"""
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise PatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _resolve_parent(document: Any, tokens: List[str]) -> Tuple[Any, str]:
+    parent = document
+    for token in tokens[:-1]:
+        parent = _child(parent, token)
+    return parent, tokens[-1]
+
+
+def _child(container: Any, token: str) -> Any:
+    if isinstance(container, dict):
+        if token not in container:
+            raise PatchError(f"Path segment {token!r} does not exist")
+        return container[token]
+    if isinstance(container, list):
+        return container[_index(container, token)]
+    raise PatchError(f"Cannot descend into {type(container).__name__} at {token!r}")
+
+
+def _index(array: list, token: str, allow_end: bool = False) -> int:
+    if token == "-" and allow_end:
+        return len(array)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise PatchError(f"Invalid array index {token!r}")
+    index = int(token)
+    if index > len(array) or (index == len(array) and not allow_end):
+        raise PatchError(f"Array index {index} out of range")
+    return index
+
+
+def _get(document: Any, pointer: str) -> Any:
+    value = document
+    for token in parse_pointer(pointer):
+        value = _child(value, token)
+    return value
+
+
+def _add(document: Any, pointer: str, value: Any) -> Any:
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        return value
+    parent, last = _resolve_parent(document, tokens)
+    if isinstance(parent, dict):
+        parent[last] = value
+    elif isinstance(parent, list):
+        parent.insert(_index(parent, last, allow_end=True), value)
+    else:
+        raise PatchError(f"Cannot add to {type(parent).__name__} at {pointer!r}")
+    return document
+
+
+def _remove(document: Any, pointer: str) -> Tuple[Any, Any]:
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        raise PatchError("Cannot remove the whole document")
+    parent, last = _resolve_parent(document, tokens)
+    if isinstance(parent, dict):
+        if last not in parent:
+            raise PatchError(f"Path {pointer!r} does not exist")
+        return document, parent.pop(last)
+    if isinstance(parent, list):
+        return document, parent.pop(_index(parent, last))
+    raise PatchError(f"Cannot remove from {type(parent).__name__} at {pointer!r}")
+
+
+def apply_json_patch(document: Any, operations: List[dict]) -> Any:
+    """Apply an RFC 6902 patch atomically"""
+    if not isinstance(operations, list):
+        raise PatchError("A JSON Patch must be an array of operations")
+    result = copy.deepcopy(document)
+    for operation in operations:
+        if not isinstance(operation, dict) or "op" not in operation or "path" not in operation:
+            raise PatchError(f"Malformed operation: {operation!r}")
+        op, path = operation["op"], operation["path"]
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise PatchError(f"{op!r} needs a value")
+        if op == "add":
+            result = _add(result, path, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            result, _ = _remove(result, path)
+        elif op == "replace":
+            result, _ = _remove(result, path) if parse_pointer(path) else (result, None)
+            result = _add(result, path, copy.deepcopy(operation["value"]))
+        elif op in ("move", "copy"):
+            source = operation.get("from")
+            if source is None:
+                raise PatchError(f"{op!r} needs a from")
+            if op == "move":
+                if path.startswith(source + "/"):
+                    raise PatchError("Cannot move a value into one of its children")
+                result, value = _remove(result, source)
+            else:
+                value = copy.deepcopy(_get(result, source))
+            result = _add(result, path, value)
+        elif op == "test":
+            if _get(result, path) != operation["value"]:
+                raise PatchTestFailed(f"Test failed at {path!r}")
+        else:
+            raise PatchError(f"Unknown operation {op!r}")
+    return result
@@ -1,16 +1,49 @@
 """Falnote API - Note-taking application with real-time sync"""
-from fastapi import FastAPI, WebSocket, Depends, File, UploadFile, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, Depends, File, UploadFile, WebSocketDisconnect, Request, HTTPException, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from database import engine, get_db
+from fastapi.responses import ORJSONResponse, Response
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, undefer
+from sqlalchemy.orm.exc import StaleDataError
+from typing import Optional
+from pydantic import ValidationError
+from database import engine, get_db, get_pool_status
 import models
 import schemas
 from websocket_manager import manager
+from heartbeat import heartbeat
+from backplane import create_backplane
+from batching import batcher
+from write_behind import EditError, write_behind
+from collab import FRAME_UPDATE, CollabError, collab, decode_frame, doc_prefix, encode_frame
+from wire import WireError, decode_binary
 import json
 import uuid
-import base64
 import os
-from config import DEBUG
+from datetime import datetime
+from config import (
+    BATCH_MAX_ROWS, DEBUG, LIST_MAX_PAGE_SIZE, LIST_PAGE_SIZE, METRICS_ENABLED, PROFILE_ADMIN_TOKEN,
+    WS_PER_MESSAGE_DEFLATE,
+)
+from images import UploadLimitMiddleware, save_upload, image_response, content_response, etag_for
+from image_pipeline import pipeline, pick_width, negotiate_format, FORMATS
+from blob_store import iter_file_range
+from migrations import run_migrations
+from cache import response_cache
+from json_patch import JSON_PATCH, MERGE_PATCH, PatchError, PatchTestFailed, apply_json_patch, merge_patch
+from changes import changes_since, current_cursor, ids_with_op
+from serialization import dump_model, dumps, json_response, model_response
+from pagination import keyset_page, ndjson_response, wants_ndjson
+from search import search, to_utc
+from bulk import apply_batch, load_rows
+from metrics import render as render_metrics
+from instrumentation import MetricsMiddleware, install_sql_hooks
+from profiler import ProfilingMiddleware, profiler, install_sql_hooks as install_profiler_sql_hooks
+import secrets
+from conditional import (
+    check_if_match, collection_digest, collection_etag, http_date, is_not_modified, item_etag,
+)
 
 # Create tables on startup (with error handling)
 try:
@@ -20,7 +53,9 @@ except Exception as e:
     print(f"⚠ Database initialization warning: {e}")
     print("Will attempt to create tables on first database request")
 
-app = FastAPI(title="Falnote API", version="1.0.0")
+# Handlers that return dicts still skip the stdlib json module; hot paths
+# return pre-serialized bytes (see serialization.py)
+app = FastAPI(title="Falnote API", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Configure CORS - Allow all requests in production for Render domains
 app.add_middleware(
@@ -31,34 +66,137 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(UploadLimitMiddleware)
+
+if profiler.capturing:
+    app.add_middleware(ProfilingMiddleware)
+    install_profiler_sql_hooks()
+
+# Outermost, so the latency it records includes every other middleware
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    install_sql_hooks()
+
 # WebSocket endpoint for real-time sync
 @app.websocket("/ws/{session_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str):
-    await manager.connect(websocket, session_id)
+async def websocket_endpoint(websocket: WebSocket, session_id: str, rooms: Optional[str] = None):
+    """Relay client messages to peers; a message with a "room" only reaches that room's subscribers.
+
+    Clients choose rooms with ``?rooms=page,project-card:7`` when connecting
+    or by sending ``{"type": "subscribe" | "unsubscribe", "rooms": [...]}``.
+    Binary frames carry collaborative text updates (see collab.py) and, for
+    clients that negotiated the msgpack subprotocol, every other message (wire.py).
+    """
+    initial_rooms = [room for room in (rooms or "").split(",") if room]
+    connection = await manager.connect(websocket, session_id, initial_rooms)
     try:
         while True:
-            data = await websocket.receive_json()
-            
-            # Broadcast to all other connected clients
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(received.get("code", 1000))
+            manager.frames_in.inc()
+            heartbeat.touch(connection)
+            frame = received.get("bytes")
+            if frame is not None and frame[:1] == bytes([FRAME_UPDATE]):
+                await _collab_update(connection, frame)
+                continue
+            try:
+                data = decode_binary(frame) if frame is not None else json.loads(received["text"])
+                if not isinstance(data, dict):
+                    raise WireError("A message must be an object")
+            except (WireError, ValueError) as e:
+                # A bad frame costs only itself, not the connection
+                connection.send({"type": "error", "detail": f"Malformed message: {e}"})
+                continue
+            message_type = data.get("type")
+
+            if message_type == "pong":
+                heartbeat.pong(connection, data.get("data"))
+                continue
+
+            if message_type == "collab_sync":
+                await _collab_sync(connection, data)
+                continue
+
+            if message_type in ("subscribe", "unsubscribe"):
+                update = manager.join if message_type == "subscribe" else manager.leave
+                for room in data.get("rooms") or []:
+                    update(connection, room)
+                continue
+
+            if message_type == "edit":
+                # Persisted by the write-behind buffer, then relayed to peers below
+                try:
+                    write_behind.apply(schemas.EditOperation.model_validate(data.get("data") or {}), session_id)
+                except (ValidationError, EditError) as e:
+                    connection.send({"type": "edit_error", "detail": str(e), "data": data.get("data")})
+                    continue
+
+            # Batched, then broadcast to the other connected clients; the
+            # batcher stamps the timestamp once per outgoing frame
             message = {
-                "type": data.get("type"),
+                "type": message_type,
                 "data": data.get("data"),
                 "session_id": session_id,
-                "timestamp": str(__import__("datetime").datetime.now())
             }
+            room = data.get("room")
+            if room:
+                message["room"] = room
             
-            await manager.broadcast(message, exclude_session=session_id)
+            await batcher.submit(session_id, message, room)
             
     except WebSocketDisconnect:
-        manager.disconnect(websocket, session_id)
-        # Notify others that a client disconnected
-        await manager.broadcast({
-            "type": "user_disconnected",
-            "session_id": session_id
-        })
+        await _client_gone(connection)
     except Exception as e:
-        print(f"WebSocket error: {e}")
-        manager.disconnect(websocket, session_id)
+        print(f"WebSocket error: {e!r}")
+        # 1011: unexpected condition on the server
+        manager.close_later(websocket, 1011)
+        await _client_gone(connection)
+
+async def _client_gone(connection):
+    manager.disconnect(connection)
+    # Notify others that a client disconnected
+    await manager.broadcast({
+        "type": "user_disconnected",
+        "session_id": connection.session_id
+    })
+
+def _collab_room(doc_id: str) -> str:
+    return f"collab:{doc_id}"
+
+async def _collab_update(connection, frame: bytes):
+    """Merge a client's CRDT update and relay what was new to the document's room"""
+    try:
+        doc_id, update = decode_frame(frame)
+        relay = await collab.apply_update(doc_id, update, connection.session_id)
+    except (CollabError, ValidationError, UnicodeDecodeError) as e:
+        connection.send({"type": "collab_error", "detail": str(e)})
+        return
+    manager.join(connection, _collab_room(doc_id))
+    if relay is not None:
+        manager.broadcast_binary(encode_frame(doc_id, relay), _collab_room(doc_id), connection.session_id)
+
+async def _collab_sync(connection, data: dict):
+    """Join a document's room and send the client what its state vector lacks"""
+    doc_id = data.get("doc")
+    vector = data.get("vector") or {}
+    try:
+        if not isinstance(doc_id, str) or not isinstance(vector, dict):
+            raise CollabError("collab_sync needs a doc id and a state vector")
+        update = await collab.sync(doc_id, {str(site): int(clock) for site, clock in vector.items()})
+    except (CollabError, ValidationError, ValueError, TypeError) as e:
+        connection.send({"type": "collab_error", "doc": doc_id, "detail": str(e)})
+        return
+    manager.join(connection, _collab_room(doc_id))
+    connection.enqueue(encode_frame(doc_id, update))
+
+async def _collab_reset(entity: str, *row_ids: int):
+    """After a REST write: drop stale copies of the rows' documents and tell editors to resync"""
+    prefixes = tuple(doc_prefix(entity, row_id) for row_id in row_ids or (None,))
+    collab.release(prefixes, save=False)
+    rooms = tuple(_collab_room(prefix) for prefix in prefixes)
+    for room in [room for room in manager.rooms if room.startswith(rooms)]:
+        await manager.broadcast_to_room(room, {"type": "collab_reset", "doc": room[len("collab:"):]})
 
 # REST API Endpoints
 
@@ -74,103 +212,168 @@ def read_root():
     }
 
 @app.get("/health")
-def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_db)):
     """Health check endpoint with database connectivity"""
     try:
         # Test database connection
-        from sqlalchemy import text
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         return {"status": "healthy", "database": "connected"}
     except Exception as e:
         return {"status": "unhealthy", "database": f"connection failed: {str(e)}"}, 503
 
-@app.get("/api/page-data")
-def get_page_data(db: Session = Depends(get_db)):
-    """Get current page data"""
-    page_data = db.query(models.PageData).first()
-    if not page_data:
-        page_data = models.PageData()
-        db.add(page_data)
-        db.commit()
-        db.refresh(page_data)
-    
-    # Parse JSON content if it's a string
-    if isinstance(page_data.content, str):
-        page_data.content = json.loads(page_data.content) if page_data.content else {}
-    
-    # Convert to dict and handle binary image encoding
-    response = {
-        "id": page_data.id,
-        "main_title": page_data.main_title or "",
-        "main_subtitle": page_data.main_subtitle or "",
-        "content": page_data.content or {},
-        "modified_by": page_data.modified_by or "",
-        "background_image": base64.b64encode(page_data.background_image).decode('utf-8') if page_data.background_image else None,
-        "partner_logo": base64.b64encode(page_data.partner_logo).decode('utf-8') if page_data.partner_logo else None,
-        "created_at": page_data.created_at,
-        "updated_at": page_data.updated_at
-    }
-    
-    return response
+def _parse_json(value) -> dict:
+    """Normalize a JSON document column, treating empty or invalid values as {}"""
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return value
+    try:
+        return json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return {}
+
+# Response field -> (column to load, value getter). Image fields are content
+# hashes; the bytes themselves are only ever read by /api/images/{id}.
+PAGE_FIELDS = {
+    "id": (models.PageData.id, lambda p: p.id),
+    "main_title": (models.PageData.main_title, lambda p: p.main_title or ""),
+    "main_subtitle": (models.PageData.main_subtitle, lambda p: p.main_subtitle or ""),
+    "content": (models.PageData.content, lambda p: _parse_json(p.content)),
+    "modified_by": (models.PageData.modified_by, lambda p: p.modified_by or ""),
+    "background_image": (models.PageData.background_image_id, lambda p: p.background_image_id),
+    "partner_logo": (models.PageData.partner_logo_id, lambda p: p.partner_logo_id),
+    "created_at": (models.PageData.created_at, lambda p: p.created_at),
+    "updated_at": (models.PageData.updated_at, lambda p: p.updated_at),
+    "version": (models.PageData.version, lambda p: p.version),
+}
+
+CARD_FIELDS = {
+    "id": (models.ProjectCard.id, lambda c: c.id),
+    "title": (models.ProjectCard.title, lambda c: c.title),
+    "description": (models.ProjectCard.description, lambda c: c.description),
+    "order": (models.ProjectCard.order, lambda c: c.order),
+    "formatting": (models.ProjectCard.formatting, lambda c: _parse_json(c.formatting)),
+    "image": (models.ProjectCard.image_id, lambda c: c.image_id),
+    "created_at": (models.ProjectCard.created_at, lambda c: c.created_at),
+    "updated_at": (models.ProjectCard.updated_at, lambda c: c.updated_at),
+    "version": (models.ProjectCard.version, lambda c: c.version),
+}
+
+IMAGE_FIELDS = {"background_image", "partner_logo", "image"}
 
-@app.put("/api/page-data")
-def update_page_data(page_data: schemas.PageDataUpdate, db: Session = Depends(get_db)):
-    """Update page data"""
+def _select_fields(available: dict, fields: Optional[str], include_images: bool) -> list[str]:
+    """Resolve the ?fields= / ?include_images= query options to response fields"""
+    if fields:
+        selected = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in selected if name not in available]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    else:
+        selected = list(available)
+    if not include_images:
+        selected = [name for name in selected if name not in IMAGE_FIELDS]
+    if "id" not in selected:
+        selected.insert(0, "id")
+    return selected
+
+def _project(obj, available: dict, selected: list[str]) -> dict:
+    return {name: available[name][1](obj) for name in selected}
+
+# Cache resource names; mutation handlers invalidate them after committing
+PAGE_RESOURCE = "page-data"
+CARDS_RESOURCE = "project-cards"
+
+# Conditional GETs must always revalidate, so clients keep sending If-None-Match
+REVALIDATE = "no-cache"
+
+async def _commit_versioned(db: AsyncSession):
+    """Commit, reporting a lost optimistic-concurrency race as 412"""
+    try:
+        await db.commit()
+    except StaleDataError:
+        await db.rollback()
+        raise HTTPException(status_code=412, detail="Resource has been modified; reload and retry")
+
+async def _settle_edits():
+    """Write out buffered WebSocket and collaborative edits, so a read sees every acknowledged one"""
+    try:
+        collab.persist_all()
+        await write_behind.flush()
+    except Exception as e:
+        # The edits stay buffered for the flusher; serve what is committed
+        print(f"[WRITE-BEHIND] Flush before read failed: {e!r}")
+
+@app.get("/api/page-data", response_model=schemas.PageDataResponse)
+async def get_page_data(request: Request, fields: Optional[str] = None, include_images: bool = True, db: AsyncSession = Depends(get_db)):
+    """Get current page data, optionally limited to a subset of fields"""
+    await _settle_edits()
+    selected = _select_fields(PAGE_FIELDS, fields, include_images)
+    variant = ",".join(selected)
+
+    async def page_state() -> bytes:
+        row = (await db.execute(
+            select(models.PageData.id, models.PageData.version, models.PageData.updated_at).limit(1)
+        )).first()
+        return dumps(row._asdict() if row else None)
+
+    # Version and timestamp only: answers conditional requests without loading content
+    state = json.loads(await response_cache.get_or_build(PAGE_RESOURCE, "state", page_state))
+    if not state:
+        db.add(models.PageData())
+        await db.commit()
+        await response_cache.invalidate(PAGE_RESOURCE)
+        state = json.loads(await page_state())
+
+    etag = item_etag("page", state["id"], state["version"], variant)
+    updated_at = datetime.fromisoformat(state["updated_at"]) if state["updated_at"] else None
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE}
+    if updated_at:
+        headers["Last-Modified"] = http_date(updated_at)
+    if is_not_modified(request, etag, updated_at):
+        return Response(status_code=304, headers=headers)
+
+    async def build() -> bytes:
+        columns = [PAGE_FIELDS[name][0] for name in selected]
+        page_data = await db.scalar(select(models.PageData).options(load_only(*columns)).limit(1))
+        return dumps(_project(page_data, PAGE_FIELDS, selected))
+
+    body = await response_cache.get_or_build(PAGE_RESOURCE, variant, build)
+    return json_response(body, headers=headers)
+
+@app.put("/api/page-data", response_model=schemas.PageDataResponse)
+async def update_page_data(page_data: schemas.PageDataUpdate, request: Request, db: AsyncSession = Depends(get_db)):
+    """Update page data; honours If-Match for optimistic concurrency"""
+    # Earlier WebSocket edits land first, so this update is applied on top of them
+    collab.release(doc_prefix("page"))
+    await write_behind.flush()
     try:
-        db_page = db.query(models.PageData).first()
+        db_page = await db.scalar(select(models.PageData).limit(1))
         if not db_page:
             db_page = models.PageData()
             db.add(db_page)
+        else:
+            check_if_match(request, "page", db_page.id, db_page.version)
         
         if page_data.main_title is not None:
             db_page.main_title = page_data.main_title
         if page_data.main_subtitle is not None:
             db_page.main_subtitle = page_data.main_subtitle
         if page_data.content is not None:
-            db_page.content = json.dumps(page_data.content)
+            db_page.content = page_data.content
         if page_data.modified_by is not None:
             db_page.modified_by = page_data.modified_by
         
-        db.commit()
-        db.refresh(db_page)
-        
-        # Parse content back to dict before returning
-        content = {}
-        if db_page.content:
-            try:
-                content = json.loads(db_page.content)
-            except:
-                content = {}
-        
-        # Only include background_image if it exists and can be encoded
-        bg_image = None
-        if db_page.background_image:
-            try:
-                bg_image = base64.b64encode(db_page.background_image).decode('utf-8')
-            except:
-                pass
-        
-        # Only include partner_logo if it exists and can be encoded
-        partner_logo = None
-        if db_page.partner_logo:
-            try:
-                partner_logo = base64.b64encode(db_page.partner_logo).decode('utf-8')
-            except:
-                pass
-        
-        return {
-            "id": db_page.id,
-            "main_title": db_page.main_title or "Falnote",
-            "main_subtitle": db_page.main_subtitle or "Future Growth Strategy",
-            "content": content,
-            "modified_by": db_page.modified_by or "system",
-            "background_image": bg_image,
-            "partner_logo": partner_logo,
-            "created_at": db_page.created_at.isoformat() if db_page.created_at else None,
-            "updated_at": db_page.updated_at.isoformat() if db_page.updated_at else None
-        }
+        await _commit_versioned(db)
+        await response_cache.invalidate(PAGE_RESOURCE)
+        await _collab_reset("page")
+        await db.refresh(db_page)
+        return model_response(schemas.PageDataResponse, db_page,
+                              {"ETag": item_etag("page", db_page.id, db_page.version)})
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         if DEBUG:
             print(f"[DEBUG] Error updating page data: {str(e)}")
         import traceback
@@ -178,208 +381,595 @@ def update_page_data(page_data: schemas.PageDataUpdate, db: Session = Depends(ge
         raise
 
 @app.post("/api/page-data/image")
-async def upload_page_image(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_page_image(file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
     """Upload background image"""
-    content = await file.read()
+    image = await save_upload(db, file)
     
-    db_page = db.query(models.PageData).first()
+    db_page = await db.scalar(select(models.PageData).limit(1))
     if not db_page:
         db_page = models.PageData()
         db.add(db_page)
     
-    db_page.background_image = content
-    db.commit()
+    db_page.background_image_id = image.hash
+    db_page.background_image = None
+    await db.commit()
+    await response_cache.invalidate(PAGE_RESOURCE)
+    pipeline.schedule_warm(image.hash, image.content_type)
     
-    return {"message": "Image uploaded successfully"}
+    return {"message": "Image uploaded successfully", "image": db_page.background_image_id}
 
 @app.post("/api/page-data/partner-logo")
-async def upload_partner_logo(file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_partner_logo(file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
     """Upload partner hotel logo"""
-    content = await file.read()
+    image = await save_upload(db, file)
     
-    db_page = db.query(models.PageData).first()
+    db_page = await db.scalar(select(models.PageData).limit(1))
     if not db_page:
         db_page = models.PageData()
         db.add(db_page)
     
-    db_page.partner_logo = content
-    db.commit()
+    db_page.partner_logo_id = image.hash
+    db_page.partner_logo = None
+    await db.commit()
+    await response_cache.invalidate(PAGE_RESOURCE)
+    pipeline.schedule_warm(image.hash, image.content_type)
     
-    return {"message": "Partner logo uploaded successfully"}
+    return {"message": "Partner logo uploaded successfully", "image": db_page.partner_logo_id}
 
 @app.post("/api/project-cards/{card_id}/image")
-async def upload_card_image(card_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_card_image(card_id: int, file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
     """Upload image for a project card"""
-    content = await file.read()
+    image = await save_upload(db, file)
     
-    db_card = db.query(models.ProjectCard).filter(models.ProjectCard.id == card_id).first()
+    db_card = await db.get(models.ProjectCard, card_id)
     if not db_card:
         # Create new card if it doesn't exist
         db_card = models.ProjectCard(id=card_id)
         db.add(db_card)
     
-    db_card.image = content
-    db.commit()
-    db.refresh(db_card)
+    db_card.image_id = image.hash
+    db_card.image = None
+    await db.commit()
+    await response_cache.invalidate(CARDS_RESOURCE)
+    pipeline.schedule_warm(image.hash, image.content_type)
+    await db.refresh(db_card)
     
     return {
         "message": "Card image uploaded successfully",
         "card_id": card_id,
-        "image": base64.b64encode(db_card.image).decode('utf-8') if db_card.image else None
+        "image": db_card.image_id
     }
 
-@app.get("/api/project-cards")
-def get_project_cards(db: Session = Depends(get_db)):
-    """Get all project cards"""
-    cards = db.query(models.ProjectCard).order_by(models.ProjectCard.order).all()
-    
-    response = []
-    for card in cards:
-        # Parse formatting from JSON string
-        formatting = {}
-        if card.formatting:
-            try:
-                formatting = json.loads(card.formatting)
-            except (json.JSONDecodeError, TypeError):
-                formatting = {}
-        
-        card_data = {
-            "id": card.id,
-            "title": card.title,
-            "description": card.description,
-            "order": card.order,
-            "formatting": formatting,
-            "image": base64.b64encode(card.image).decode('utf-8') if card.image else None,
-            "created_at": card.created_at,
-            "updated_at": card.updated_at
-        }
-        response.append(card_data)
-    
-    return response
+CARD_KEYSET = (models.ProjectCard.order, models.ProjectCard.id)
+# Events without a parsed starts_at come after every dated one
+EVENT_KEYSET = (models.Event.starts_at, models.Event.id)
+
+@app.get("/api/project-cards", response_model=list[schemas.ProjectCardResponse])
+async def get_project_cards(
+    request: Request,
+    fields: Optional[str] = None,
+    include_images: bool = True,
+    limit: Optional[int] = Query(None, ge=1, le=LIST_MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get project cards, selecting only the columns the requested fields need.
+
+    ``?limit=`` / ``?after=`` page through them in (order, id) order;
+    ``?format=ndjson`` (or Accept: application/x-ndjson) streams every card.
+    """
+    selected = _select_fields(CARD_FIELDS, fields, include_images)
+    variant = ",".join(selected)
+    await _settle_edits()
+
+    def serialize(rows) -> list:
+        return [_project(row, CARD_FIELDS, selected) for row in rows]
+
+    # Plain column rows: no ORM identity map to grow while paging or streaming
+    statement = select(*dict.fromkeys([CARD_FIELDS[name][0] for name in selected] + list(CARD_KEYSET)))
+    if wants_ndjson(request, format):
+        return ndjson_response(statement, CARD_KEYSET, serialize)
+
+    async def digest() -> bytes:
+        return (await collection_digest(db, models.ProjectCard)).encode()
+
+    paged = limit is not None or after is not None
+    etag = collection_etag(
+        "project-cards",
+        (await response_cache.get_or_build(CARDS_RESOURCE, "digest", digest)).decode(),
+        f"{variant}|{limit}|{after}" if paged else variant,
+    )
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    if paged:
+        return await keyset_page(request, db, statement, CARD_KEYSET, limit or LIST_PAGE_SIZE, after, serialize, headers)
+
+    async def build() -> bytes:
+        return dumps(serialize((await db.execute(statement.order_by(*CARD_KEYSET))).all()))
+
+    body = await response_cache.get_or_build(CARDS_RESOURCE, variant, build)
+    return json_response(body, headers=headers)
 
 @app.post("/api/project-cards", response_model=schemas.ProjectCardResponse)
-def create_project_card(card: schemas.ProjectCardCreate, db: Session = Depends(get_db)):
+async def create_project_card(card: schemas.ProjectCardCreate, db: AsyncSession = Depends(get_db)):
     """Create a new project card"""
     db_card = models.ProjectCard(**card.dict())
     db.add(db_card)
-    db.commit()
-    db.refresh(db_card)
-    return db_card
+    await db.commit()
+    await response_cache.invalidate(CARDS_RESOURCE)
+    await db.refresh(db_card)
+    return model_response(schemas.ProjectCardResponse, db_card)
 
 @app.put("/api/project-cards/{card_id}", response_model=schemas.ProjectCardResponse)
-def update_project_card(card_id: int, card: schemas.ProjectCardUpdate, db: Session = Depends(get_db)):
-    """Update a project card"""
-    db_card = db.query(models.ProjectCard).filter(models.ProjectCard.id == card_id).first()
+async def update_project_card(card_id: int, card: schemas.ProjectCardUpdate, request: Request, db: AsyncSession = Depends(get_db)):
+    """Update a project card; honours If-Match for optimistic concurrency"""
+    collab.release(doc_prefix("project-card", card_id))
+    await write_behind.flush()
+    db_card = await db.get(models.ProjectCard, card_id)
     if not db_card:
-        return {"error": "Card not found"}
+        raise HTTPException(status_code=404, detail="Card not found")
+    check_if_match(request, "project-card", db_card.id, db_card.version)
     
     update_data = card.dict(exclude_unset=True)
     
-    # Handle formatting - convert dict to JSON string
-    if 'formatting' in update_data and update_data['formatting'] is not None:
-        db_card.formatting = json.dumps(update_data['formatting'])
-        del update_data['formatting']
-    
-    # Update other fields
     for key, value in update_data.items():
         if value is not None:
             setattr(db_card, key, value)
     
-    db.commit()
-    db.refresh(db_card)
-    
-    # Return with parsed formatting
-    formatting = {}
-    if db_card.formatting:
-        try:
-            formatting = json.loads(db_card.formatting)
-        except (json.JSONDecodeError, TypeError):
-            formatting = {}
-    
-    return {
-        "id": db_card.id,
-        "title": db_card.title,
-        "description": db_card.description,
-        "order": db_card.order,
-        "formatting": formatting,
-        "image": base64.b64encode(db_card.image).decode('utf-8') if db_card.image else None,
-        "created_at": db_card.created_at,
-        "updated_at": db_card.updated_at
+    await _commit_versioned(db)
+    await response_cache.invalidate(CARDS_RESOURCE)
+    await _collab_reset("project-card", card_id)
+    await db.refresh(db_card)
+    return model_response(schemas.ProjectCardResponse, db_card,
+                          {"ETag": item_etag("project-card", db_card.id, db_card.version)})
+
+# Fields a PATCH document exposes, and the schema that validates the result
+PATCHABLE = {
+    "page": (("main_title", "main_subtitle", "content"), schemas.PageDataUpdate),
+    "project-card": (("title", "description", "order", "formatting"), schemas.ProjectCardUpdate),
+}
+
+async def _read_patch(request: Request):
+    """Return (content type, patch body) for a JSON Patch or Merge Patch request"""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in (JSON_PATCH, MERGE_PATCH):
+        raise HTTPException(
+            status_code=415,
+            detail=f"Use {JSON_PATCH} or {MERGE_PATCH}",
+            headers={"Accept-Patch": f"{JSON_PATCH}, {MERGE_PATCH}"},
+        )
+    try:
+        return content_type, await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Patch body is not valid JSON")
+
+async def _patch_row(request: Request, response: Response, db: AsyncSession, entity: str, row):
+    """Apply the request's patch to a row, commit, and broadcast only the patch"""
+    content_type, patch = await _read_patch(request)
+    check_if_match(request, entity, row.id, row.version)
+    fields, schema = PATCHABLE[entity]
+    document = {
+        field: _parse_json(getattr(row, field)) if field in ("content", "formatting") else getattr(row, field)
+        for field in fields
     }
+    try:
+        patched = apply_json_patch(document, patch) if content_type == JSON_PATCH else merge_patch(document, patch)
+    except PatchTestFailed as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except PatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if not isinstance(patched, dict) or set(patched) - set(fields):
+        raise HTTPException(status_code=422, detail=f"Patched document may only contain: {', '.join(fields)}")
+    # A merge-patch null or a JSON Patch "remove" on a whole field: the
+    # columns are not nullable, so refuse rather than report a no-op
+    removed = [field for field in fields if field not in patched]
+    if removed:
+        raise HTTPException(status_code=422, detail=f"Fields cannot be removed: {', '.join(removed)}")
+    try:
+        schema.model_validate(patched)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+    changed = [field for field in fields if field in patched and patched[field] != document[field]]
+    if changed:
+        for field in changed:
+            setattr(row, field, patched[field])
+        await _commit_versioned(db)
+        await response_cache.invalidate(PAGE_RESOURCE if entity == "page" else CARDS_RESOURCE)
+        await _collab_reset(entity, row.id)
+        # Peers get the patch itself, never the whole document
+        session_id = request.headers.get("x-session-id")
+        await manager.broadcast({
+            "type": "patch",
+            "session_id": session_id,
+            "data": {
+                "entity": entity,
+                "id": row.id,
+                "version": row.version,
+                "format": "json-patch" if content_type == JSON_PATCH else "merge-patch",
+                "patch": patch,
+            },
+        }, exclude_session=session_id)
+
+    response.headers["ETag"] = item_etag(entity, row.id, row.version)
+    return {"id": row.id, "version": row.version, "changed": changed}
+
+@app.patch("/api/page-data")
+async def patch_page_data(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    """Apply a JSON Patch / Merge Patch to main_title, main_subtitle and content"""
+    collab.release(doc_prefix("page"))
+    await write_behind.flush()
+    db_page = await db.scalar(select(models.PageData).limit(1).with_for_update())
+    if not db_page:
+        raise HTTPException(status_code=404, detail="Page data not found")
+    return await _patch_row(request, response, db, "page", db_page)
+
+@app.patch("/api/project-cards/{card_id}")
+async def patch_project_card(card_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    """Apply a JSON Patch / Merge Patch to a card's title, description, order and formatting"""
+    collab.release(doc_prefix("project-card", card_id))
+    await write_behind.flush()
+    db_card = await db.get(models.ProjectCard, card_id, with_for_update=True)
+    if not db_card:
+        raise HTTPException(status_code=404, detail="Card not found")
+    return await _patch_row(request, response, db, "project-card", db_card)
 
 @app.delete("/api/project-cards/{card_id}")
-def delete_project_card(card_id: int, db: Session = Depends(get_db)):
+async def delete_project_card(card_id: int, db: AsyncSession = Depends(get_db)):
     """Delete a project card"""
-    db_card = db.query(models.ProjectCard).filter(models.ProjectCard.id == card_id).first()
+    db_card = await db.get(models.ProjectCard, card_id)
     if not db_card:
-        return {"error": "Card not found"}
+        raise HTTPException(status_code=404, detail="Card not found")
     
-    db.delete(db_card)
-    db.commit()
+    await db.delete(db_card)
+    await db.commit()
+    await response_cache.invalidate(CARDS_RESOURCE)
+    await _collab_reset("project-card", card_id)
     return {"message": "Card deleted"}
 
+async def _run_batch(request: Request, db: AsyncSession, entity: str, model, schema, batch,
+                     creates: list, updates: list, reorder: Optional[list] = None):
+    """Apply a batch in one transaction, then announce it with a single broadcast"""
+    if len(batch.create) + len(batch.update) + len(batch.delete) > BATCH_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"A batch may hold at most {BATCH_MAX_ROWS} rows")
+    try:
+        created, updated = await db.run_sync(apply_batch, model, creates, updates, batch.delete, reorder)
+        created_ids = [row.id for row in created]
+        await _commit_versioned(db)
+    except HTTPException:
+        await db.rollback()
+        raise
+    if created_ids or updated or batch.delete:
+        session_id = request.headers.get("x-session-id")
+        await manager.broadcast({
+            "type": "data_updated",
+            "session_id": session_id,
+            "data": {"entity": entity, "created": created_ids, "updated": updated, "deleted": batch.delete},
+        }, exclude_session=session_id)
+    return json_response({
+        "created": dump_model(list[schema], await load_rows(db, model, created_ids)),
+        "updated": dump_model(list[schema], await load_rows(db, model, updated)),
+        "deleted": batch.delete,
+    })
+
+@app.patch("/api/project-cards:batch")
+async def batch_project_cards(batch: schemas.ProjectCardBatch, request: Request, db: AsyncSession = Depends(get_db)):
+    """Create, update, delete and reorder cards in one transaction.
+
+    ``reorder`` lists card ids in their new order (``order`` becomes 1..n,
+    unlisted cards follow in their current order). Update items may carry
+    the ``version`` the client saw; any stale, missing or repeated id fails
+    the whole batch. Peers get one ``data_updated`` message listing the ids.
+    """
+    touched = [update.id for update in batch.update] + batch.delete
+    collab.release(tuple(doc_prefix("project-card", card_id) for card_id in touched))
+    await write_behind.flush()
+    # Like PUT: fields sent as null are left alone
+    updates = [{key: value for key, value in update.model_dump(exclude_unset=True).items()
+                if value is not None or key == "version"} for update in batch.update]
+    response = await _run_batch(request, db, "project-card", models.ProjectCard, schemas.ProjectCardResponse,
+                                batch, [card.model_dump() for card in batch.create], updates, batch.reorder)
+    await response_cache.invalidate(CARDS_RESOURCE)
+    if touched:
+        await _collab_reset("project-card", *touched)
+    return response
+
+@app.api_route("/api/images/{image_id}", methods=["GET", "HEAD"])
+async def get_image(
+    image_id: str,
+    request: Request,
+    w: Optional[int] = Query(None, gt=0),
+    format: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Serve image bytes by content hash with ETag, 304 and Range support.
+
+    ``?w=`` returns a resized derivative snapped to a width bucket, encoded as
+    ``?format=webp|jpeg`` or negotiated from the Accept header.
+    """
+    # images.data is only non-empty for rows the blob-store migration has not reached
+    image = await db.get(models.Image, image_id, options=[undefer(models.Image.data)])
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if w is None:
+        return image_response(request, image)
+
+    width = pick_width(w)
+    fmt = negotiate_format(format, request.headers.get("accept", ""))
+    derivative = await pipeline.derivative(image.hash, image.content_type, width, fmt)
+    if derivative is None:
+        return image_response(request, image)
+    path, size = derivative
+    return content_response(
+        request,
+        etag_for(f"{image.hash}-{width}.{fmt}"),
+        size,
+        FORMATS[fmt],
+        lambda start, end: iter_file_range(path, start, end),
+        extra_headers=None if format else {"Vary": "Accept"},
+    )
+
 @app.get("/api/events", response_model=list[schemas.EventResponse])
-def get_events(event_type: str = None, db: Session = Depends(get_db)):
-    """Get all events, optionally filtered by type"""
-    query = db.query(models.Event)
-    if event_type:
-        query = query.filter(models.Event.event_type == event_type)
-    return query.all()
+async def get_events(
+    request: Request,
+    event_type: str = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    location: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=LIST_MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Get events, optionally filtered by type, time range and location.
+
+    ``?start=`` / ``?end=`` bound ``starts_at`` (start inclusive, end
+    exclusive; naive times are UTC), ``?location=`` matches part of the
+    location, case-insensitively. ``?limit=`` / ``?after=`` page through
+    the events in (starts_at, id) order, undated events last;
+    ``?format=ndjson`` (or Accept: application/x-ndjson) streams every event.
+    """
+    criteria = [models.Event.event_type == event_type] if event_type else []
+    if start is not None:
+        criteria.append(models.Event.starts_at >= to_utc(start))
+    if end is not None:
+        criteria.append(models.Event.starts_at < to_utc(end))
+    if location:
+        criteria.append(models.Event.location.icontains(location, autoescape=True))
+    statement = select(*models.Event.__table__.columns).where(*criteria)
+
+    def serialize(rows) -> list:
+        return dump_model(list[schemas.EventResponse], rows)
+
+    if wants_ndjson(request, format):
+        return ndjson_response(statement, EVENT_KEYSET, serialize, nulls_last=True)
+    paged = limit is not None or after is not None
+    variant = "|".join(str(value or "") for value in (event_type, start, end, location))
+    if paged:
+        variant += f"|{limit}|{after}"
+    etag = collection_etag("events", await collection_digest(db, models.Event, *criteria), variant)
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    if paged:
+        return await keyset_page(request, db, statement, EVENT_KEYSET, limit or LIST_PAGE_SIZE, after, serialize, headers,
+                                 nulls_last=True)
+    events = (await db.scalars(select(models.Event).where(*criteria))).all()
+    return model_response(list[schemas.EventResponse], events, headers)
+
+@app.get("/api/search")
+async def search_text(
+    q: str = Query(..., min_length=1, max_length=200),
+    entity: Optional[str] = Query(None, pattern="^(page|project-card|event)$"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    """Full-text search over event names, card titles/descriptions and page text.
+
+    Returns the texts containing every word of ``q``, best match first, as
+    ``{entity, id, field, key, text, rank}``; ``key`` names the page
+    content key for page content matches.
+    """
+    await _settle_edits()
+    return json_response(await search(db, q, entity, limit))
 
 @app.post("/api/events", response_model=schemas.EventResponse)
-def create_event(event: schemas.EventCreate, db: Session = Depends(get_db)):
+async def create_event(event: schemas.EventCreate, db: AsyncSession = Depends(get_db)):
     """Create a new event"""
     db_event = models.Event(**event.dict())
     db.add(db_event)
-    db.commit()
-    db.refresh(db_event)
-    return db_event
+    await db.commit()
+    await db.refresh(db_event)
+    return model_response(schemas.EventResponse, db_event)
 
 @app.put("/api/events/{event_id}", response_model=schemas.EventResponse)
-def update_event(event_id: int, event: schemas.EventUpdate, db: Session = Depends(get_db)):
-    """Update an event"""
-    db_event = db.query(models.Event).filter(models.Event.id == event_id).first()
+async def update_event(event_id: int, event: schemas.EventUpdate, request: Request, db: AsyncSession = Depends(get_db)):
+    """Update an event; honours If-Match for optimistic concurrency"""
+    db_event = await db.get(models.Event, event_id)
     if not db_event:
-        return {"error": "Event not found"}
+        raise HTTPException(status_code=404, detail="Event not found")
+    check_if_match(request, "event", db_event.id, db_event.version)
     
     for key, value in event.dict(exclude_unset=True).items():
         setattr(db_event, key, value)
     
-    db.commit()
-    db.refresh(db_event)
-    return db_event
+    await _commit_versioned(db)
+    await db.refresh(db_event)
+    return model_response(schemas.EventResponse, db_event, {"ETag": item_etag("event", db_event.id, db_event.version)})
 
 @app.delete("/api/events/{event_id}")
-def delete_event(event_id: int, db: Session = Depends(get_db)):
+async def delete_event(event_id: int, db: AsyncSession = Depends(get_db)):
     """Delete an event"""
-    db_event = db.query(models.Event).filter(models.Event.id == event_id).first()
+    db_event = await db.get(models.Event, event_id)
     if not db_event:
-        return {"error": "Event not found"}
+        raise HTTPException(status_code=404, detail="Event not found")
     
-    db.delete(db_event)
-    db.commit()
+    await db.delete(db_event)
+    await db.commit()
     return {"message": "Event deleted"}
 
+@app.post("/api/events:batch")
+async def batch_events(batch: schemas.EventBatch, request: Request, db: AsyncSession = Depends(get_db)):
+    """Create, update and delete events in one transaction (e.g. importing a season's schedule).
+
+    Update items may carry the ``version`` the client saw; any stale,
+    missing or repeated id fails the whole batch. Peers get one
+    ``data_updated`` message listing the ids.
+    """
+    return await _run_batch(request, db, "event", models.Event, schemas.EventResponse, batch,
+                            [event.model_dump() for event in batch.create],
+                            [update.model_dump(exclude_unset=True) for update in batch.update])
+
+SYNC_MODELS = {
+    "page": (models.PageData, lambda p: _project(p, PAGE_FIELDS, list(PAGE_FIELDS))),
+    "project-card": (models.ProjectCard, lambda c: _project(c, CARD_FIELDS, list(CARD_FIELDS))),
+    "event": (models.Event, lambda e: dump_model(schemas.EventResponse, e)),
+}
+
+@app.get("/api/changes/cursor")
+async def get_change_cursor(db: AsyncSession = Depends(get_db)):
+    """Current change-log position; read it before loading data to sync from later"""
+    await _settle_edits()
+    return {"cursor": await current_cursor(db)}
+
+@app.get("/api/changes")
+async def get_changes(since: Optional[int] = None, db: AsyncSession = Depends(get_db)):
+    """Rows changed after ``since``, or a full snapshot if the log no longer reaches back that far"""
+    await _settle_edits()
+    cursor, changed = await changes_since(db, since) if since is not None else (await current_cursor(db), None)
+
+    if changed is None:
+        page = await db.scalar(select(models.PageData).limit(1))
+        cards = (await db.scalars(select(models.ProjectCard).order_by(models.ProjectCard.order))).all()
+        events = (await db.scalars(select(models.Event).order_by(models.Event.id))).all()
+        return json_response({
+            "cursor": cursor,
+            "snapshot": True,
+            "page_data": SYNC_MODELS["page"][1](page) if page else None,
+            "project_cards": [SYNC_MODELS["project-card"][1](card) for card in cards],
+            "events": [SYNC_MODELS["event"][1](event) for event in events],
+        })
+
+    result = []
+    for entity, ops in changed.items():
+        model, serialize = SYNC_MODELS[entity]
+        upserted = ids_with_op(ops, "upsert")
+        rows = (await db.scalars(select(model).where(model.id.in_(upserted)))).all() if upserted else []
+        found = {row.id for row in rows}
+        result.extend({"entity": entity, "id": row.id, "op": "upsert", "data": serialize(row)} for row in rows)
+        # Upserted rows that are gone again were deleted after the cursor was taken
+        result.extend({"entity": entity, "id": entity_id, "op": "delete"}
+                      for entity_id in ids_with_op(ops, "delete") + [i for i in upserted if i not in found])
+    return json_response({"cursor": cursor, "snapshot": False, "changes": result})
+
 @app.get("/api/status")
-def get_status(db: Session = Depends(get_db)):
+async def get_status():
     """Get API status and connection info"""
     return {
         "status": "ok",
         "active_connections": manager.get_active_clients_count(),
+        "websocket": manager.stats(),
+        "batching": batcher.stats(),
+        "write_behind": write_behind.stats(),
+        "collab": collab.stats(),
+        "cache": response_cache.stats(),
+        "profiler": profiler.stats(),
         "debug": DEBUG
     }
 
+@app.get("/api/status/pool")
+async def get_pool_status_endpoint():
+    """Database pool occupancy, checkout latency and wait statistics"""
+    return get_pool_status()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition of every metric in this process"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints answer 404 unless PROFILE_ADMIN_TOKEN is set, and 401 without it"""
+    if not PROFILE_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, PROFILE_ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Missing or wrong X-Admin-Token")
+
+def _collapsed_response(profile, name: str) -> Response:
+    return Response(content=profile.collapsed(), media_type="text/plain; charset=utf-8", headers={
+        "Content-Disposition": f'attachment; filename="{name}.collapsed"',
+        "X-Profile-Samples": str(profile.samples),
+    })
+
+@app.post("/api/admin/profile", status_code=202, dependencies=[Depends(require_admin)])
+async def start_profile(seconds: float = Query(30, gt=0, le=600), interval_ms: float = Query(None, ge=1, le=1000),
+                        idle: bool = False):
+    """Sample every thread for ``seconds``; download the result from GET once it ends"""
+    if not profiler.start_session(seconds, interval_ms, idle):
+        raise HTTPException(status_code=409, detail="A profiling session is already running")
+    return profiler.stats()["session"]
+
+@app.delete("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def stop_profile():
+    """End the running session early and download it"""
+    profile = profiler.stop_session()
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No profiling session has run")
+    return _collapsed_response(profile, f"profile-{profile.started_at:%Y%m%dT%H%M%S}")
+
+@app.get("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def get_profile():
+    """The last finished session as collapsed stacks (flamegraph.pl, speedscope)"""
+    if profiler.session is not None:
+        raise HTTPException(status_code=409, detail=f"Session still running: {profiler.stats()['session']}")
+    profile = profiler.last_session
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No profiling session has run")
+    return _collapsed_response(profile, f"profile-{profile.started_at:%Y%m%dT%H%M%S}")
+
+@app.get("/api/admin/slow-requests", dependencies=[Depends(require_admin)])
+async def get_slow_requests():
+    """Requests slower than PROFILE_SLOW_MS, newest first, with their SQL"""
+    return json_response({**profiler.stats(), "requests": profiler.slow_requests()})
+
+@app.get("/api/admin/slow-requests/{capture_id}/profile", dependencies=[Depends(require_admin)])
+async def get_slow_request_profile(capture_id: int):
+    capture = profiler.slow_request(capture_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail="Slow request not found (it may have been evicted)")
+    return _collapsed_response(capture.profile, f"slow-request-{capture.id}")
+
+async def _invalidate_entities(entities: set):
+    """Drop cached responses for entities written outside a REST handler"""
+    resources = {"page": PAGE_RESOURCE, "project-card": CARDS_RESOURCE}
+    await response_cache.invalidate(*(resources[entity] for entity in entities if entity in resources))
+
 @app.on_event("startup")
 async def startup_event():
     print("Application started")
+    try:
+        await manager.start_backplane(create_backplane())
+    except Exception as e:
+        # Keep serving this node's clients; other workers just won't see them
+        print(f"⚠ WebSocket backplane unavailable, broadcasting locally only: {e}")
+    await manager.start_heartbeat(heartbeat)
+    await write_behind.start(on_flush=_invalidate_entities)
+    collab.set_saver(write_behind.apply)
+    await collab.start()
+    if collab.disabled:
+        print(f"⚠ {collab.disabled}; collab_sync and CRDT frames are answered with collab_error")
+    if profiler.capturing:
+        profiler.start()
     
-    # Initialize default project cards if they don't exist
+    # Schema setup runs once on the sync engine, before any requests are served
     from database import SessionLocal
     db = SessionLocal()
     try:
         # Create database tables
         models.Base.metadata.create_all(bind=engine)
         print("Database tables created/verified")
+        run_migrations(engine, db)
         
         existing_cards = db.query(models.ProjectCard).count()
         if existing_cards == 0:
@@ -401,8 +991,15 @@ async def startup_event():
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await batcher.flush_all()
+    await collab.stop()
+    # Buffered edits must reach the database before the process exits
+    await write_behind.stop()
+    await manager.shutdown()
+    pipeline.shutdown()
+    profiler.stop()
     print("Application shutdown")
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE)
@@ -0,0 +1,214 @@
+"""Minimal in-process metrics: counters, gauges and latency histograms.
+
+Metrics are cheap to update (a lock and a few additions) so they can sit on
+hot paths; they are read by the status endpoints. Every metric registers
+itself by name, and ``render`` writes the registry out in the Prometheus
+text format for ``/metrics``, so nothing is formatted until a scrape.
+"""
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Sequence, Tuple
+
+# Seconds; tuned for request, query and socket-send latencies
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bytes, for response and message sizes
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+# Plain counts, e.g. queries per request or recipients per broadcast
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 250, 1000)
+
+# name -> metric; a metric created again under the same name (a new manager
+# instance, say) replaces the old one
+REGISTRY: Dict[str, object] = {}
+
+
+class Counter:
+    TYPE = "counter"
+
+    def __init__(self, name: str, help: str = "", register: bool = True):
+        self.name = name
+        self.help = help
+        self._value = 0
+        self._lock = threading.Lock()
+        if register:
+            REGISTRY[name] = self
+
+    def inc(self, amount: int = 1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+
+class Histogram:
+    TYPE = "histogram"
+
+    def __init__(self, name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS, register: bool = True):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+        self._lock = threading.Lock()
+        if register:
+            REGISTRY[name] = self
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+            if value > self._max:
+                self._max = value
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket that contains it"""
+        with self._lock:
+            counts, total, largest = list(self._counts), self._count, self._max
+        if total == 0:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(self.buckets[index], largest) if index < len(self.buckets) else largest
+        return largest
+
+    def cumulative_buckets(self):
+        """(upper bound, cumulative count) pairs ending with +Inf"""
+        return self.snapshot()[0]
+
+    def snapshot(self) -> Tuple[list, float, int]:
+        """Cumulative buckets, sum and count read together"""
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        running, result = 0, []
+        for bound, bucket in zip(list(self.buckets) + [float("inf")], counts):
+            running += bucket
+            result.append((bound, running))
+        return result, total, count
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def summary(self, scale: float = 1000.0, unit: str = "ms") -> Dict[str, float]:
+        """Count, mean and bucketed quantiles, scaled (seconds -> ms by default)"""
+        count = self._count
+        return {
+            "count": count,
+            f"mean_{unit}": round(self._sum / count * scale, 3) if count else 0.0,
+            f"p50_{unit}": round(self.quantile(0.50) * scale, 3),
+            f"p95_{unit}": round(self.quantile(0.95) * scale, 3),
+            f"p99_{unit}": round(self.quantile(0.99) * scale, 3),
+            f"max_{unit}": round(self._max * scale, 3),
+        }
+
+
+class Gauge:
+    """A value read from its owner at scrape time, e.g. open connections"""
+    TYPE = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], float], register: bool = True):
+        self.name = name
+        self.help = help
+        self.read = read
+        if register:
+            REGISTRY[name] = self
+
+    @property
+    def value(self) -> float:
+        return self.read()
+
+
+class Family:
+    """One metric per combination of label values, created on first use.
+
+    Label values must come from a small set (route templates, status codes,
+    statement verbs), since every combination is kept for the process lifetime.
+    """
+
+    def __init__(self, metric: type, name: str, help: str, labelnames: Sequence[str], **options):
+        self.metric = metric
+        self.TYPE = metric.TYPE
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._options = options
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY[name] = self
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self.metric(self.name, self.help, register=False, **self._options)
+                    self._children[values] = child
+        return child
+
+    def children(self):
+        with self._lock:
+            return list(self._children.items())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+def _labels(pairs: Sequence[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _samples(metric, name: str, pairs: Sequence[Tuple[str, str]]):
+    if isinstance(metric, Histogram):
+        buckets, total, count = metric.snapshot()
+        for bound, cumulative in buckets:
+            yield f"{name}_bucket{_labels([*pairs, ('le', _number(float(bound)))])} {cumulative}"
+        yield f"{name}_sum{_labels(pairs)} {_number(total)}"
+        yield f"{name}_count{_labels(pairs)} {count}"
+    else:
+        yield f"{name}{_labels(pairs)} {_number(metric.value)}"
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format (0.0.4)"""
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        help_text = metric.help.replace("\\", "\\\\").replace("\n", "\\n")
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric.TYPE}")
+        if isinstance(metric, Family):
+            for values, child in metric.children():
+                lines.extend(_samples(child, name, list(zip(metric.labelnames, values))))
+        else:
+            try:
+                lines.extend(_samples(metric, name, ()))
+            except Exception as e:
+                # A gauge whose owner has gone away should not break the scrape
+                print(f"⚠ Could not read metric {name}: {e!r}")
+                lines.pop()
+                lines.pop()
+    return "\n".join(lines) + "\n"
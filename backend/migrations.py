@@ -0,0 +1,195 @@
+"""Lightweight, idempotent schema migrations run at startup.
+
+``Base.metadata.create_all`` only creates missing tables, so columns added to
+existing models are applied here with plain ``ALTER TABLE`` statements.
+"""
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+import models
+from blob_store import blob_store
+from images import store_image
+from search import backfill_search_index, create_fulltext_index, parse_event_time
+
+# table -> [(column, DDL type)]
+ADDED_COLUMNS = {
+    "page_data": [
+        ("background_image_id", "VARCHAR(64)"),
+        ("partner_logo_id", "VARCHAR(64)"),
+        ("version", "INTEGER NOT NULL DEFAULT 1"),
+    ],
+    "project_cards": [
+        ("image_id", "VARCHAR(64)"),
+        ("version", "INTEGER NOT NULL DEFAULT 1"),
+    ],
+    "events": [
+        ("version", "INTEGER NOT NULL DEFAULT 1"),
+        ("starts_at", "TIMESTAMP WITH TIME ZONE"),
+    ],
+}
+
+
+def add_missing_columns(engine: Engine):
+    """Add any columns from ADDED_COLUMNS that the live schema lacks"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            if table not in existing_tables:
+                continue
+            present = {column["name"] for column in inspector.get_columns(table)}
+            for name, ddl_type in columns:
+                if name not in present:
+                    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl_type}'))
+                    print(f"[MIGRATION] Added {table}.{name}")
+
+
+# JSON documents that used to be Text columns holding JSON strings
+JSON_COLUMNS = [("page_data", "content"), ("project_cards", "formatting")]
+
+
+def convert_json_columns(engine: Engine):
+    """Turn the legacy Text JSON columns into JSONB on Postgres.
+
+    Empty values become ``{}`` first, on every backend, so they decode as
+    JSON. SQLite keeps storing JSON as text, which the JSON type reads as-is.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    with engine.begin() as conn:
+        for table, column in JSON_COLUMNS:
+            if table not in existing_tables:
+                continue
+            if engine.dialect.name == "postgresql":
+                column_type = next(c["type"] for c in inspector.get_columns(table) if c["name"] == column)
+                if isinstance(column_type, JSONB):
+                    continue
+                conn.execute(text(f"UPDATE {table} SET {column} = '{{}}' WHERE {column} IS NULL OR btrim({column}) = ''"))
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb"))
+                print(f"[MIGRATION] Converted {table}.{column} to JSONB")
+            else:
+                conn.execute(text(f"UPDATE {table} SET {column} = '{{}}' WHERE {column} IS NULL OR trim({column}) = ''"))
+
+
+# Keyset pagination compares (key, id) tuples, which skip NULL keys
+SORT_KEY_DEFAULTS = [("project_cards", '"order"', "0"), ("events", "date_time", "''")]
+
+
+def backfill_sort_keys(engine: Engine):
+    existing_tables = set(inspect(engine).get_table_names())
+    with engine.begin() as conn:
+        for table, column, default in SORT_KEY_DEFAULTS:
+            if table in existing_tables:
+                conn.execute(text(f"UPDATE {table} SET {column} = {default} WHERE {column} IS NULL"))
+
+
+def backfill_event_times(engine: Engine, batch: int = 5000) -> int:
+    """Parse events.date_time into starts_at for rows written before the column existed.
+
+    Rows whose date_time is not a recognisable date keep a NULL starts_at
+    and are simply looked at again on the next start.
+    """
+    events = models.Event.__table__
+    parsed, last_id = 0, 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(events.c.id, events.c.date_time)
+                .where(events.c.starts_at.is_(None), events.c.date_time != "", events.c.id > last_id)
+                .order_by(events.c.id).limit(batch)
+            ).all()
+            if not rows:
+                return parsed
+            last_id = rows[-1].id
+            values = [{"row_id": row.id, "starts_at": parse_event_time(row.date_time)} for row in rows]
+            values = [value for value in values if value["starts_at"] is not None]
+            if values:
+                conn.execute(update(events).where(events.c.id == bindparam("row_id")), values)
+                parsed += len(values)
+
+
+def create_missing_indexes(engine: Engine):
+    """Create indexes declared on models whose tables predate them"""
+    existing_tables = set(inspect(engine).get_table_names())
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {index["name"] for index in inspect(engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in present:
+                index.create(bind=engine)
+                print(f"[MIGRATION] Created index {index.name}")
+
+
+def relax_constraints(engine: Engine):
+    """Allow images.data to be emptied once its bytes live in the blob store"""
+    if engine.dialect.name == "postgresql" and "images" in inspect(engine).get_table_names():
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE images ALTER COLUMN data DROP NOT NULL"))
+
+
+def migrate_inline_images(db: Session) -> int:
+    """Move image bytes stored inline on page/card rows into the blob store"""
+    moved = 0
+    for page in db.query(models.PageData).all():
+        if page.background_image and not page.background_image_id:
+            page.background_image_id = store_image(db, page.background_image)
+            page.background_image = None
+            moved += 1
+        if page.partner_logo and not page.partner_logo_id:
+            page.partner_logo_id = store_image(db, page.partner_logo)
+            page.partner_logo = None
+            moved += 1
+    for card in db.query(models.ProjectCard).filter(models.ProjectCard.image.isnot(None)).all():
+        if not card.image_id:
+            card.image_id = store_image(db, card.image)
+            card.image = None
+            moved += 1
+    db.commit()
+    return moved
+
+
+def migrate_image_rows_to_blob_store(db: Session) -> int:
+    """Copy bytes held in images.data into the blob store and clear the column"""
+    moved = 0
+    # One row at a time so a large backlog never sits in memory at once
+    while True:
+        image = db.query(models.Image).filter(models.Image.data.isnot(None)).first()
+        if image is None:
+            break
+        blob_store.put_bytes(image.data)
+        image.size = len(image.data)
+        image.data = None
+        db.commit()
+        moved += 1
+    return moved
+
+
+def run_migrations(engine: Engine, db: Session):
+    add_missing_columns(engine)
+    convert_json_columns(engine)
+    backfill_sort_keys(engine)
+    parsed = backfill_event_times(engine)
+    if parsed:
+        print(f"[MIGRATION] Parsed date_time of {parsed} events into starts_at")
+    create_missing_indexes(engine)
+    create_fulltext_index(engine)
+    indexed = backfill_search_index(engine)
+    if indexed:
+        print(f"[MIGRATION] Indexed {indexed} texts for search")
+    relax_constraints(engine)
+    moved = migrate_inline_images(db) + migrate_image_rows_to_blob_store(db)
+    if moved:
+        print(f"[MIGRATION] Moved {moved} stored images to the blob store")
+
+
+if __name__ == "__main__":
+    # Run the migrations without starting the API: `python migrations.py`
+    from database import engine, SessionLocal
+    models.Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        run_migrations(engine, session)
+    finally:
+        session.close()
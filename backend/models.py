@@ -1,20 +1,32 @@
-from sqlalchemy import Column, String, DateTime, LargeBinary, Integer, Text
+from sqlalchemy import JSON, Column, String, DateTime, Index, LargeBinary, Integer, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from database import Base
 
+# JSONB on Postgres (patchable in place), JSON text elsewhere
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
 class PageData(Base):
     __tablename__ = "page_data"
 
     id = Column(Integer, primary_key=True, index=True)
     main_title = Column(String, default="Falnote")
     main_subtitle = Column(String, default="Future Growth Strategy")
-    content = Column(Text, default="{}")  # JSON string
-    background_image = Column(LargeBinary, nullable=True)
-    partner_logo = Column(LargeBinary, nullable=True)
+    content = Column(JSONDocument, default=dict)
+    # Legacy inline image bytes; deferred so ordinary queries never fetch them
+    background_image = deferred(Column(LargeBinary, nullable=True))
+    partner_logo = deferred(Column(LargeBinary, nullable=True))
+    background_image_id = Column(String(64), nullable=True)  # images.hash
+    partner_logo_id = Column(String(64), nullable=True)  # images.hash
     card_images = Column(Text, default="{}")  # JSON string
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
     modified_by = Column(String, default="system")
+    # Incremented on every UPDATE; drives ETags and If-Match concurrency checks
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
 class ProjectCard(Base):
     __tablename__ = "project_cards"
@@ -22,19 +34,68 @@ class ProjectCard(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     description = Column(Text)
-    image = Column(LargeBinary, nullable=True)
-    formatting = Column(Text, default="{}")  # JSON string for formatting
+    image = deferred(Column(LargeBinary, nullable=True))  # legacy inline bytes
+    image_id = Column(String(64), nullable=True)  # images.hash
+    formatting = Column(JSONDocument, default=dict)
     order = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
+    # Keyset pagination order of the card list
+    __table_args__ = (Index("ix_project_cards_order_id", "order", "id"),)
 
 class Event(Base):
     __tablename__ = "events"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    date_time = Column(String)
+    date_time = Column(String)  # as entered by the user
+    starts_at = Column(DateTime(timezone=True), nullable=True)  # date_time parsed, UTC (see search.py)
     location = Column(String)
     event_type = Column(String)  # "sportsplex" or "school"
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
+    __table_args__ = (
+        Index("ix_events_starts_at_id", "starts_at", "id"),  # keyset pagination order
+        Index("ix_events_type_starts_at", "event_type", "starts_at"),  # type + date range filters
+    )
+
+class SearchDocument(Base):
+    """One searchable text of a page, card or event, kept current by search.py"""
+    __tablename__ = "search_documents"
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String(32), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    field = Column(String(32), nullable=False)
+    key = Column(String, nullable=True)  # page content key
+    body = Column(Text, nullable=False)
+
+    __table_args__ = (Index("ix_search_documents_entity", "entity", "entity_id"),)
+
+class Image(Base):
+    """Metadata for a content-addressed image; the bytes live in the blob store"""
+    __tablename__ = "images"
+
+    hash = Column(String(64), primary_key=True)
+    content_type = Column(String, default="application/octet-stream")
+    size = Column(Integer, default=0)
+    data = deferred(Column(LargeBinary, nullable=True))  # legacy inline bytes, emptied by migrations
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ChangeLog(Base):
+    """One row per insert/update/delete of a synced entity, for /api/changes"""
+    __tablename__ = "change_log"
+    # AUTOINCREMENT keeps SQLite from reusing sequence numbers after compaction
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String(32), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String(8), nullable=False)  # "insert", "update" or "delete"
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,104 @@
+"""Keyset (cursor) pagination and NDJSON streaming for list endpoints.
+
+A page is ``ORDER BY <key> LIMIT n`` starting strictly after the last row of
+the previous page, so each page is an index range scan however deep it is,
+and rows inserted meanwhile never shift later pages. The cursor handed to
+clients is that last row's key, base64-encoded. A leading key column that
+may be NULL (``nulls_last``) sorts its NULL rows after every other row.
+
+NDJSON exports fetch rows from a server-side cursor in LIST_STREAM_BATCH
+chunks and write each chunk as it arrives, so memory stays flat whatever
+the table size. They open their own session: request dependencies are torn
+down before a streaming body is sent.
+"""
+import base64
+import binascii
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Sequence
+import orjson
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import Select, and_, or_, tuple_
+from config import LIST_STREAM_BATCH
+from database import session_scope
+from serialization import dumps, json_response
+
+NDJSON = "application/x-ndjson"
+
+Serializer = Callable[[Sequence[Any]], List[Any]]  # rows -> JSON-ready items
+
+
+def wants_ndjson(request: Request, format: Optional[str]) -> bool:
+    if format is not None:
+        return format == "ndjson"
+    return NDJSON in request.headers.get("accept", "")
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(list(values))).decode().rstrip("=")
+
+
+def decode_cursor(token: str, keys: Sequence, nulls_last: bool = False) -> list:
+    """Key values from a cursor, checked against the key columns' types (400 otherwise)"""
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Malformed cursor")
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise HTTPException(status_code=400, detail="Malformed cursor")
+    for index, (value, key) in enumerate(zip(values, keys)):
+        if value is None and nulls_last and index == 0:
+            continue
+        expected = key.type.python_type
+        if expected is datetime and isinstance(value, str):
+            # orjson writes datetimes as RFC 3339 strings
+            try:
+                values[index] = value = datetime.fromisoformat(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Malformed cursor")
+        if type(value) is not expected:
+            raise HTTPException(status_code=400, detail="Malformed cursor")
+    return values
+
+
+def _order(keys: Sequence, nulls_last: bool) -> list:
+    return [keys[0].asc().nulls_last(), *keys[1:]] if nulls_last else list(keys)
+
+
+def _after(keys: Sequence, values: Sequence, nulls_last: bool):
+    """Rows strictly after ``values`` in key order"""
+    if not nulls_last:
+        return tuple_(*keys) > tuple_(*values)
+    if values[0] is None:
+        return and_(keys[0].is_(None), tuple_(*keys[1:]) > tuple_(*values[1:]))
+    return or_(tuple_(*keys) > tuple_(*values), keys[0].is_(None))
+
+
+async def keyset_page(request: Request, db, statement: Select, keys: Sequence, limit: int,
+                      after: Optional[str], serialize: Serializer, headers: Optional[dict] = None,
+                      nulls_last: bool = False) -> Response:
+    """One page of ``statement`` ordered by ``keys``; the next cursor goes in X-Next-Cursor and Link"""
+    if after:
+        statement = statement.where(_after(keys, decode_cursor(after, keys, nulls_last), nulls_last))
+    rows = (await db.execute(statement.order_by(*_order(keys, nulls_last)).limit(limit + 1))).all()
+    headers = dict(headers or {})
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = encode_cursor([getattr(rows[-1], key.key) for key in keys])
+        headers["X-Next-Cursor"] = cursor
+        headers["Link"] = f'<{request.url.include_query_params(after=cursor)}>; rel="next"'
+    return json_response(serialize(rows), headers=headers)
+
+
+def ndjson_response(statement: Select, keys: Sequence, serialize: Serializer,
+                    headers: Optional[dict] = None, nulls_last: bool = False) -> StreamingResponse:
+    """Every row of ``statement`` in key order, one JSON document per line"""
+    statement = statement.order_by(*_order(keys, nulls_last)).execution_options(yield_per=LIST_STREAM_BATCH)
+
+    async def lines():
+        async with session_scope() as db:
+            result = await db.stream(statement)
+            async for rows in result.partitions():
+                yield b"".join(dumps(item) + b"\n" for item in serialize(rows))
+
+    return StreamingResponse(lines(), media_type=NDJSON, headers=headers)
@@ -0,0 +1,353 @@
+"""Stack-sampling profiler: slow-request capture and whole-process sessions.
+
+One daemon thread wakes every PROFILE_INTERVAL_MS and records Python stacks;
+nothing is traced or hooked per function call, so the cost is the sampling
+itself and stays off the request path.
+
+Slow requests (PROFILE_SLOW_MS): ``ProfilingMiddleware`` registers each
+in-flight request's task. Every tick samples it where it is: the event loop
+thread's real stack while the task is running, otherwise the chain of
+coroutines it is suspended in, plus the worker thread's stack while one of
+its SQL statements executes there. The statements themselves are recorded
+with their durations. When the request finishes under the threshold its
+samples are dropped; otherwise it goes into a ring buffer of the newest
+PROFILE_SLOW_KEEP.
+
+Sessions: ``start_session`` samples every thread for a fixed time (the
+WebSocket loop included) until it runs out or ``stop_session`` ends it.
+
+Both produce collapsed stacks, ``frame;frame;frame count`` per line, root
+first, which flamegraph.pl, speedscope and inferno read as is.
+"""
+import asyncio
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional, Set
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from config import PROFILE_INTERVAL_MS, PROFILE_SLOW_KEEP, PROFILE_SLOW_MS
+from instrumentation import route_label
+
+MAX_STATEMENTS = 100  # per captured request; later ones are only counted
+MAX_STATEMENT_LENGTH = 2000
+# Leaf frames of threads parked waiting for work, left out of sessions by default
+IDLE_FRAMES = {("threading.py", "wait"), ("queue.py", "get"), ("selectors.py", "select"),
+               ("threading.py", "_wait_for_tstate_lock")}
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+_labels: Dict[object, str] = {}  # code object -> frame label, written by the sampler thread only
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        if path.startswith(BACKEND_DIR):
+            path = os.path.relpath(path, BACKEND_DIR)
+        elif "site-packages" in path:
+            path = path.split("site-packages" + os.sep, 1)[-1]
+        else:
+            path = os.path.basename(path)
+        name = getattr(code, "co_qualname", code.co_name)
+        label = _labels[code] = f"{name} ({path}:{code.co_firstlineno})".replace(";", ":")
+    return label
+
+
+def thread_stack(frame, root=None) -> List[str]:
+    """Labels from the outermost frame (or ``root``) down to ``frame``"""
+    stack = []
+    while frame is not None:
+        stack.append(_label(frame.f_code))
+        if frame is root:
+            break
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def await_stack(coro) -> List[str]:
+    """Labels of a suspended task's coroutines, outermost first"""
+    stack = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        stack.append(_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return stack
+
+
+class Profile:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = datetime.now(timezone.utc)
+        self.ended_at: Optional[datetime] = None
+
+    def add(self, stack: List[str]):
+        self.stacks[";".join(stack)] += 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Capture:
+    """One in-flight request; kept only if it turns out slow"""
+    _ids = itertools.count(1)
+
+    def __init__(self, scope, interval: float):
+        self.id = next(self._ids)
+        self.method = scope.get("method")
+        query = scope.get("query_string", b"").decode("latin-1")
+        self.path = scope.get("path", "") + (f"?{query}" if query else "")
+        self.route: Optional[str] = None
+        self.status = 500
+        self.task = asyncio.current_task()
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.root = self.task.get_coro().cr_frame if self.task is not None else None
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.profile = Profile(interval)
+        self.statements: List[dict] = []
+        self.statement_count = 0
+        self.db_seconds = 0.0
+        # Worker threads running one of this request's statements right now
+        self.threads: Set[int] = set()
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "at": self.profile.started_at.isoformat(),
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "duration_ms": round(self.duration * 1000, 3),
+            "db_ms": round(self.db_seconds * 1000, 3),
+            "statements": self.statement_count,
+            "samples": self.profile.samples,
+            "sql": self.statements,
+        }
+
+
+current_capture: ContextVar[Optional[Capture]] = ContextVar("current_capture", default=None)
+
+
+class Profiler:
+    def __init__(self, slow_ms: float = PROFILE_SLOW_MS, keep: int = PROFILE_SLOW_KEEP,
+                 interval_ms: float = PROFILE_INTERVAL_MS):
+        self.slow_seconds = slow_ms / 1000
+        self.interval = interval_ms / 1000
+        self.slow: Deque[Capture] = deque(maxlen=keep)
+        self.active: Dict[int, Capture] = {}
+        self.session: Optional[Profile] = None
+        self.session_ends = 0.0
+        self.session_idle = False
+        self.last_session: Optional[Profile] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def capturing(self) -> bool:
+        return self.slow_seconds > 0
+
+    def start(self):
+        """Start the sampler thread (idempotent)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        with self._lock:
+            self._finish_session()
+
+    def _run(self):
+        while True:
+            session = self.session
+            if self._stop.wait(session.interval if session is not None else self.interval):
+                return
+            try:
+                self._tick()
+            except Exception as e:
+                print(f"[PROFILER] Sample failed: {e!r}")
+
+    def _tick(self):
+        with self._lock:
+            if not self.active and self.session is None:
+                return
+            frames = sys._current_frames()
+            for capture in self.active.values():
+                capture.profile.add(self._request_stack(capture, frames))
+            if self.session is not None:
+                self._sample_session(frames)
+                if time.monotonic() >= self.session_ends:
+                    self._finish_session()
+
+    @staticmethod
+    def _request_stack(capture: Capture, frames) -> List[str]:
+        if capture.task is None:
+            return ["(no task)"]
+        if asyncio.current_task(capture.loop) is capture.task and capture.loop_thread in frames:
+            return thread_stack(frames[capture.loop_thread], capture.root)
+        stack = await_stack(capture.task.get_coro())
+        for ident in list(capture.threads):
+            if ident in frames:
+                stack.append("(worker thread)")
+                stack.extend(thread_stack(frames[ident]))
+                break
+        return stack
+
+    def _sample_session(self, frames):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        me = threading.get_ident()
+        for ident, frame in frames.items():
+            if ident == me:
+                continue
+            if not self.session_idle and (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES:
+                continue
+            self.session.add([f"thread {names.get(ident, ident)}"] + thread_stack(frame))
+
+    # Slow-request capture
+
+    def begin(self, scope) -> Capture:
+        capture = Capture(scope, self.interval)
+        with self._lock:
+            self.active[capture.id] = capture
+        return capture
+
+    def end(self, capture: Capture):
+        capture.duration = time.perf_counter() - capture.started
+        with self._lock:
+            self.active.pop(capture.id, None)
+        if capture.duration >= self.slow_seconds:
+            capture.task = capture.loop = capture.root = None
+            self.slow.append(capture)
+            print(f"[PROFILER] Slow request {capture.method} {capture.path}: "
+                  f"{capture.duration * 1000:.0f} ms, {capture.statement_count} statements")
+
+    def slow_requests(self) -> List[dict]:
+        return [capture.summary() for capture in reversed(self.slow)]
+
+    def slow_request(self, capture_id: int) -> Optional[Capture]:
+        return next((capture for capture in self.slow if capture.id == capture_id), None)
+
+    # Whole-process sessions
+
+    def start_session(self, seconds: float, interval_ms: Optional[float] = None, idle: bool = False) -> bool:
+        """Sample every thread for ``seconds``; False if a session is already running"""
+        with self._lock:
+            if self.session is not None:
+                return False
+            self.session = Profile((interval_ms or self.interval * 1000) / 1000)
+            self.session_ends = time.monotonic() + seconds
+            self.session_idle = idle
+        self.start()
+        return True
+
+    def stop_session(self) -> Optional[Profile]:
+        """End the running session early; returns the finished profile"""
+        with self._lock:
+            self._finish_session()
+            return self.last_session
+
+    def _finish_session(self):
+        if self.session is not None:
+            self.session.ended_at = datetime.now(timezone.utc)
+            self.last_session, self.session = self.session, None
+
+    def stats(self) -> dict:
+        session = self.session
+        return {
+            "slow_ms": self.slow_seconds * 1000,
+            "interval_ms": self.interval * 1000,
+            "in_flight": len(self.active),
+            "slow_requests": len(self.slow),
+            "session": None if session is None else {
+                "started_at": session.started_at.isoformat(),
+                "ends_in_s": round(max(0.0, self.session_ends - time.monotonic()), 1),
+                "interval_ms": session.interval * 1000,
+                "samples": session.samples,
+            },
+        }
+
+
+class ProfilingMiddleware:
+    """Register every HTTP request with the profiler for slow-request capture"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        capture = profiler.begin(scope)
+        token = current_capture.set(capture)
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                capture.status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            current_capture.reset(token)
+            capture.route = route_label(scope)
+            profiler.end(capture)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    capture = current_capture.get()
+    if capture is None or context is None:
+        return
+    context._profile_start = time.perf_counter()
+    ident = threading.get_ident()
+    if ident != capture.loop_thread:
+        capture.threads.add(ident)
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    capture = current_capture.get()
+    start = getattr(context, "_profile_start", None)
+    if capture is None or start is None:
+        return
+    elapsed = time.perf_counter() - start
+    capture.threads.discard(threading.get_ident())
+    capture.statement_count += 1
+    capture.db_seconds += elapsed
+    if len(capture.statements) < MAX_STATEMENTS:
+        capture.statements.append({"sql": statement[:MAX_STATEMENT_LENGTH], "ms": round(elapsed * 1000, 3),
+                                   "executemany": executemany})
+
+
+def _failed_execute(exception_context):
+    capture = current_capture.get()
+    if capture is not None:
+        capture.threads.discard(threading.get_ident())
+
+
+def install_sql_hooks():
+    """Record the statements of captured requests (idempotent)"""
+    if not event.contains(Engine, "before_cursor_execute", _before_execute):
+        event.listen(Engine, "before_cursor_execute", _before_execute)
+        event.listen(Engine, "after_cursor_execute", _after_execute)
+        event.listen(Engine, "handle_error", _failed_execute)
+
+
+profiler = Profiler()
@@ -1,7 +1,6 @@
-from pydantic import BaseModel, field_serializer, field_validator
+from pydantic import BaseModel, Field, field_serializer, field_validator
 from datetime import datetime
-from typing import Optional, Dict
-import base64
+from typing import Any, Optional, Dict, List
 import json
 
 class PageDataBase(BaseModel):
@@ -25,10 +24,18 @@ class PageDataResponse(BaseModel):
     main_subtitle: Optional[str] = None
     content: Optional[Dict] = {}
     modified_by: Optional[str] = None
-    background_image: Optional[str] = None
-    partner_logo: Optional[str] = None
+    # Image IDs (content hashes) resolvable via GET /api/images/{id}
+    background_image: Optional[str] = Field(default=None, validation_alias="background_image_id")
+    partner_logo: Optional[str] = Field(default=None, validation_alias="partner_logo_id")
     created_at: datetime
     updated_at: datetime
+    version: int = 1
+
+    @field_validator('main_title', 'main_subtitle', 'modified_by', mode='before')
+    @classmethod
+    def empty_text(cls, v):
+        # Same as GET /api/page-data: missing text is ""
+        return v or ""
 
     @field_validator('content', mode='before')
     @classmethod
@@ -42,6 +49,7 @@ class PageDataResponse(BaseModel):
 
     class Config:
         from_attributes = True
+        populate_by_name = True
 
 class ProjectCardBase(BaseModel):
     title: str
@@ -57,15 +65,27 @@ class ProjectCardUpdate(BaseModel):
     formatting: Optional[Dict] = None
     order: Optional[int] = None
 
+class ProjectCardBatchUpdate(ProjectCardUpdate):
+    id: int
+    version: Optional[int] = None  # rejects the batch (412) if the row has moved on
+
+class ProjectCardBatch(BaseModel):
+    """PATCH /api/project-cards:batch; applied in one transaction"""
+    create: List[ProjectCardCreate] = []
+    update: List[ProjectCardBatchUpdate] = []
+    delete: List[int] = []
+    reorder: Optional[List[int]] = None  # card ids in their new order, applied last
+
 class ProjectCardResponse(BaseModel):
     id: int
     title: str
     description: str
-    image: Optional[str] = None
+    image: Optional[str] = Field(default=None, validation_alias="image_id")
     formatting: Optional[Dict] = {}
     order: int = 0
     created_at: datetime
     updated_at: datetime
+    version: int = 1
 
     @field_validator('formatting', mode='before')
     @classmethod
@@ -79,6 +99,7 @@ class ProjectCardResponse(BaseModel):
 
     class Config:
         from_attributes = True
+        populate_by_name = True
 
 class EventBase(BaseModel):
     name: str
@@ -95,15 +116,50 @@ class EventUpdate(BaseModel):
     location: Optional[str] = None
     event_type: Optional[str] = None
 
+class EventBatchUpdate(EventUpdate):
+    id: int
+    version: Optional[int] = None  # rejects the batch (412) if the row has moved on
+
+class EventBatch(BaseModel):
+    """POST /api/events:batch; applied in one transaction"""
+    create: List[EventCreate] = []
+    update: List[EventBatchUpdate] = []
+    delete: List[int] = []
+
 class EventResponse(EventBase):
     id: int
+    starts_at: Optional[datetime] = None  # date_time parsed, when it is a recognisable date
     created_at: datetime
     updated_at: datetime
+    version: int = 1
 
     class Config:
         from_attributes = True
 
+class EditOperation(BaseModel):
+    """A field edit sent over the WebSocket and persisted by the write-behind buffer"""
+    entity: str  # "page" or "project-card"
+    id: Optional[int] = None  # card id; the page is a single row
+    field: str
+    key: Optional[str] = None  # sets one key of a JSON field (e.g. content)
+    value: Any = None
+
 class WebSocketMessage(BaseModel):
+    """Envelope of every WebSocket message.
+
+    Field order fixes the one-byte keys of the binary protocol (see wire.py):
+    append new fields, never reorder or remove them.
+    """
     type: str
-    data: Dict
-    session_id: str
+    data: Optional[Any] = None
+    session_id: Optional[str] = None
+    timestamp: Optional[str] = None
+    room: Optional[str] = None
+    messages: Optional[List["WebSocketMessage"]] = None  # "batch" frames
+    rooms: Optional[List[str]] = None  # subscribe / unsubscribe
+    doc: Optional[str] = None  # collaborative document id
+    vector: Optional[Dict[str, int]] = None  # collab_sync state vector
+    detail: Optional[Any] = None  # *_error messages
+
+    class Config:
+        extra = "allow"
@@ -0,0 +1,246 @@
+"""Full-text search over event names, card titles/descriptions and page text.
+
+Every searchable text is a ``search_documents`` row: one per event name, card
+title, card description, page title/subtitle and page content key. A
+Session ``after_flush`` hook rewrites the rows of each page, card or event
+whose searched fields a flush touched, in the same transaction, so the index
+follows every writer (REST handlers, PATCH, the write-behind buffer).
+
+Matching is done by the database:
+
+- Postgres: a GIN index on ``to_tsvector(SEARCH_LANGUAGE, body)``, queried
+  with ``plainto_tsquery`` and ranked by ``ts_rank``
+- SQLite: an FTS5 table over ``search_documents`` (porter stemming), kept in
+  sync by triggers and ranked by bm25
+- anything else: a LIKE scan, so the endpoint still works
+
+All three match documents containing every word of the query.
+
+This module also keeps ``Event.starts_at``, the parsed form of the
+free-form ``date_time`` string, which date-range filters use.
+"""
+import json
+import re
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, column, delete, event, func, insert, inspect, literal_column, select, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from config import SEARCH_LANGUAGE
+from database import engine
+import models
+
+Document = Tuple[str, Optional[str], str]  # (field, key, body)
+
+# model -> (entity name, searched fields)
+SEARCHED = {
+    models.PageData: ("page", ("main_title", "main_subtitle", "content")),
+    models.ProjectCard: ("project-card", ("title", "description")),
+    models.Event: ("event", ("name",)),
+}
+
+FTS_TABLE = "search_fts"
+fts = table(FTS_TABLE, column("rowid"))
+fts_ready = False  # set once the SQLite FTS5 table exists
+# Expression of the Postgres GIN index; queries must use exactly this form
+TS_VECTOR = func.to_tsvector(literal_column(f"'{SEARCH_LANGUAGE}'::regconfig"), models.SearchDocument.body)
+
+# Formats tried after ISO 8601, for dates typed by hand
+DATE_FORMATS = (
+    "%Y-%m-%d %H:%M", "%m/%d/%Y %I:%M %p", "%m/%d/%Y %H:%M", "%m/%d/%Y",
+    "%B %d, %Y %I:%M %p", "%B %d, %Y", "%b %d, %Y %I:%M %p", "%b %d, %Y",
+)
+
+
+def to_utc(value: datetime) -> datetime:
+    """Naive datetimes are taken to be UTC"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def parse_event_time(value: Optional[str]) -> Optional[datetime]:
+    """``Event.date_time`` as a UTC datetime, or None if it is not a recognisable date"""
+    value = (value or "").strip()
+    if not re.search(r"\d", value):
+        # "TBD" and friends: skip the strptime attempts, which are slow to fail
+        return None
+    try:
+        return to_utc(datetime.fromisoformat(value))
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return to_utc(datetime.strptime(value, date_format))
+        except ValueError:
+            continue
+    return None
+
+
+@event.listens_for(models.Event.date_time, "set")
+def _parse_date_time(target, value, oldvalue, initiator):
+    target.starts_at = parse_event_time(value)
+
+
+def _content(value) -> dict:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return {}
+    return value if isinstance(value, dict) else {}
+
+
+def documents(model, obj) -> List[Document]:
+    """The searchable texts of a page, card or event (a row or an instance of ``model``)"""
+    entity, fields = SEARCHED[model]
+    found = []
+    for field in fields:
+        if field == "content":
+            found.extend(("content", key, value) for key, value in _content(obj.content).items()
+                         # *_formatting keys hold style JSON, not text
+                         if isinstance(value, str) and value.strip() and not key.endswith("_formatting"))
+            continue
+        value = getattr(obj, field)
+        if isinstance(value, str) and value.strip():
+            found.append((field, None, value))
+    return found
+
+
+def _rows(entity: str, entity_id: int, docs: List[Document]) -> List[Dict]:
+    return [{"entity": entity, "entity_id": entity_id, "field": field, "key": key, "body": body}
+            for field, key, body in docs]
+
+
+@event.listens_for(Session, "after_flush")
+def _update_index(session: Session, flush_context):
+    stale, fresh = [], []
+    for op, objects in (("insert", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for obj in objects:
+            searched = SEARCHED.get(type(obj))
+            if searched is None:
+                continue
+            entity, fields = searched
+            if op == "update":
+                state = inspect(obj)
+                if not any(state.attrs[field].history.has_changes() for field in fields):
+                    continue
+            if op != "insert":
+                stale.append((entity, obj.id))
+            if op != "delete":
+                fresh.extend(_rows(entity, obj.id, documents(type(obj), obj)))
+    if not stale and not fresh:
+        return
+
+    connection = session.connection()
+    for entity in {entity for entity, _ in stale}:
+        ids = [entity_id for stale_entity, entity_id in stale if stale_entity == entity]
+        connection.execute(delete(models.SearchDocument).where(
+            models.SearchDocument.entity == entity, models.SearchDocument.entity_id.in_(ids)))
+    if fresh:
+        connection.execute(insert(models.SearchDocument), fresh)
+
+
+def create_fulltext_index(engine: Engine):
+    """Create the dialect's full-text index over search_documents (idempotent)"""
+    global fts_ready
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_search_documents_fts_{SEARCH_LANGUAGE} ON search_documents "
+                f"USING gin (to_tsvector('{SEARCH_LANGUAGE}'::regconfig, body))"
+            ))
+        elif engine.dialect.name == "sqlite":
+            triggers = set(conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'search_documents'"
+            )).scalars())
+            try:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                    "body, content='search_documents', content_rowid='id', tokenize='porter unicode61')"
+                ))
+            except OperationalError as e:
+                print(f"⚠ SQLite lacks FTS5, search falls back to LIKE scans: {e}")
+                return
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents BEGIN "
+                f"INSERT INTO {FTS_TABLE}(rowid, body) VALUES (new.id, new.body); END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body); END"
+            ))
+            conn.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents BEGIN "
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body); "
+                f"INSERT INTO {FTS_TABLE}(rowid, body) VALUES (new.id, new.body); END"
+            ))
+            if len(triggers) < 3:
+                # Rows written while the triggers were missing (or a recreated table)
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+            fts_ready = True
+
+
+def backfill_search_index(engine: Engine) -> int:
+    """Index every page, card and event if search_documents is empty"""
+    document = models.SearchDocument.__table__
+    with engine.begin() as conn:
+        if conn.scalar(select(func.count()).select_from(document)):
+            return 0
+        # Events and cards in bulk, without loading rows into Python
+        for model, entity, fields in ((models.Event, "event", ("name",)),
+                                      (models.ProjectCard, "project-card", ("title", "description"))):
+            for field in fields:
+                column = getattr(model, field)
+                conn.execute(insert(document).from_select(
+                    ["entity", "entity_id", "field", "body"],
+                    select(literal_column(f"'{entity}'"), model.id, literal_column(f"'{field}'"), column)
+                    .where(column.isnot(None), func.trim(column) != ""),
+                ))
+        page = conn.execute(select(models.PageData.id, models.PageData.main_title,
+                                   models.PageData.main_subtitle, models.PageData.content)).first()
+        if page is not None:
+            docs = documents(models.PageData, page)
+            if docs:
+                conn.execute(insert(document), _rows("page", page.id, docs))
+        return conn.scalar(select(func.count()).select_from(document))
+
+
+def _terms(query: str) -> List[str]:
+    return re.findall(r"\w+", query.lower())
+
+
+async def search(db, query: str, entity: Optional[str] = None, limit: int = 20) -> List[Dict]:
+    """Documents containing every word of ``query``, best match first"""
+    terms = _terms(query)
+    if not terms:
+        return []
+    document = models.SearchDocument
+    columns = (document.entity, document.entity_id, document.field, document.key, document.body)
+    criteria = [document.entity == entity] if entity else []
+
+    if engine.dialect.name == "postgresql":
+        ts_query = func.plainto_tsquery(literal_column(f"'{SEARCH_LANGUAGE}'::regconfig"), " ".join(terms))
+        rank = func.ts_rank(TS_VECTOR, ts_query).label("rank")
+        statement = (select(*columns, rank).where(TS_VECTOR.op("@@")(ts_query), *criteria)
+                     .order_by(rank.desc()).limit(limit))
+    elif fts_ready:
+        # Each term quoted, so FTS5 operators in the query are taken literally
+        match = " ".join(f'"{term}"' for term in terms)
+        rank = (-func.bm25(literal_column(FTS_TABLE))).label("rank")
+        statement = (select(*columns, rank)
+                     .select_from(document)
+                     .join(fts, fts.c.rowid == document.id)
+                     .where(literal_column(FTS_TABLE).op("MATCH")(match), *criteria)
+                     .order_by(rank.desc()).limit(limit))
+    else:
+        rank = literal_column("0").label("rank")
+        statement = (select(*columns, rank)
+                     .where(and_(*(document.body.icontains(term, autoescape=True) for term in terms)), *criteria)
+                     .order_by(document.entity, document.entity_id).limit(limit))
+
+    rows = (await db.execute(statement)).all()
+    return [{"entity": row.entity, "id": row.entity_id, "field": row.field, "key": row.key,
+             "text": row.body, "rank": round(float(row.rank), 6)} for row in rows]
+
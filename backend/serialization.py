@@ -0,0 +1,67 @@
+"""JSON response bodies serialized with orjson.
+
+Handlers return ``json_response`` / ``model_response`` (or cached bytes) so
+FastAPI's jsonable_encoder never walks the payload. ORM rows are shaped by
+the response models in schemas.py through one cached TypeAdapter per model
+(``from_attributes``), so every endpoint emits the same fields the OpenAPI
+schema documents.
+
+With METRICS_ENABLED both steps are timed: ``serialize_seconds{stage="model"}``
+is the response-model pass, ``stage="encode"`` the orjson encoding.
+"""
+import functools
+import time
+from typing import Any, Mapping, Optional
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter
+from config import METRICS_ENABLED
+from metrics import Family, Histogram
+
+OPTIONS = orjson.OPT_NON_STR_KEYS
+
+serialize_seconds = Family(Histogram, "serialize_seconds", "Time to shape and encode response bodies", ("stage",))
+_encode_time = serialize_seconds.labels("encode")
+_model_time = serialize_seconds.labels("model")
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    if not METRICS_ENABLED:
+        return orjson.dumps(content, default=_default, option=OPTIONS)
+    start = time.perf_counter()
+    body = orjson.dumps(content, default=_default, option=OPTIONS)
+    _encode_time.observe(time.perf_counter() - start)
+    return body
+
+
+@functools.lru_cache(maxsize=None)
+def adapter(schema: Any) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+def dump_model(schema: Any, obj: Any) -> Any:
+    """``obj`` (a row, or rows for ``list[Model]``) as plain data shaped by ``schema``"""
+    type_adapter = adapter(schema)
+    if not METRICS_ENABLED:
+        return type_adapter.dump_python(type_adapter.validate_python(obj, from_attributes=True))
+    start = time.perf_counter()
+    data = type_adapter.dump_python(type_adapter.validate_python(obj, from_attributes=True))
+    _model_time.observe(time.perf_counter() - start)
+    return data
+
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[Mapping[str, str]] = None) -> Response:
+    body = content if isinstance(content, bytes) else dumps(content)
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def model_response(schema: Any, obj: Any, headers: Optional[Mapping[str, str]] = None) -> Response:
+    return json_response(dumps(dump_model(schema, obj)), headers=headers)
@@ -0,0 +1,19 @@
+import os
+import tempfile
+
+import pytest
+
+# A throwaway SQLite database and blob directory, set before config is imported
+_workdir = tempfile.mkdtemp(prefix="falnote-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ["BLOB_STORE_PATH"] = os.path.join(_workdir, "blobs")
+
+
+@pytest.fixture(scope="session")
+def client():
+    """The API with startup run once; the module-level singletons bind to its event loop"""
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,103 @@
+import pytest
+
+EVENT_TYPE = "bulk-test"
+
+
+def _new_event(name: str) -> dict:
+    return {"name": name, "date_time": "2024-10-01 19:00", "location": "Stage", "event_type": EVENT_TYPE}
+
+
+def _events(client) -> dict:
+    return {event["id"]: event for event in client.get("/api/events", params={"event_type": EVENT_TYPE}).json()}
+
+
+def _cards(client) -> list:
+    return client.get("/api/project-cards").json()
+
+
+@pytest.fixture
+def events(client):
+    response = client.post("/api/events:batch", json={"create": [_new_event("First"), _new_event("Second")]})
+    assert response.status_code == 200, response.text
+    return response.json()["created"]
+
+
+def test_batch_applies_every_item(client, events):
+    first, second = events
+    response = client.post("/api/events:batch", json={
+        "create": [_new_event("Third")],
+        "update": [{"id": first["id"], "name": "First, renamed", "version": first["version"]}],
+        "delete": [second["id"]],
+    })
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [event["name"] for event in body["created"]] == ["Third"]
+    assert [(event["id"], event["version"]) for event in body["updated"]] == [(first["id"], first["version"] + 1)]
+    assert body["deleted"] == [second["id"]]
+    stored = _events(client)
+    assert stored[first["id"]]["name"] == "First, renamed"
+    assert second["id"] not in stored
+
+
+@pytest.mark.parametrize("bad_item, status", [
+    (lambda first: {"delete": [999_999]}, 404),
+    (lambda first: {"update": [{"id": 999_999, "name": "Ghost"}]}, 404),
+    (lambda first: {"delete": [first["id"]]}, 422),  # also updated
+], ids=["missing delete", "missing update", "repeated id"])
+def test_one_bad_item_rolls_back_the_batch(client, events, bad_item, status):
+    first, second = events
+    before = _events(client)
+    batch = {
+        "create": [_new_event("Never created")],
+        "update": [{"id": first["id"], "name": "Never renamed"}],
+        "delete": [second["id"]],
+    }
+    for key, items in bad_item(first).items():
+        batch[key] = batch[key] + items
+    response = client.post("/api/events:batch", json=batch)
+    assert response.status_code == status
+    assert _events(client) == before
+
+
+def test_stale_item_version_is_412_and_writes_nothing(client, events):
+    first, second = events
+    assert client.put(f"/api/events/{first['id']}", json={"name": "Moved on"}).status_code == 200
+    before = _events(client)
+    response = client.post("/api/events:batch", json={
+        "update": [{"id": second["id"], "name": "Fresh", "version": second["version"]},
+                   {"id": first["id"], "name": "Stale", "version": first["version"]}],
+    })
+    assert response.status_code == 412
+    assert str(first["id"]) in response.json()["detail"]
+    assert _events(client) == before
+
+
+def test_card_batch_checks_item_versions(client):
+    card = next(card for card in _cards(client) if card["id"] == 3)
+    response = client.patch("/api/project-cards:batch", json={
+        "update": [{"id": 3, "title": "Stale", "version": card["version"] - 1}],
+    })
+    assert response.status_code == 412
+    assert next(card for card in _cards(client) if card["id"] == 3)["title"] == card["title"]
+
+
+def test_reorder_persists_the_new_positions(client):
+    ids = [card["id"] for card in _cards(client)]
+    moved = [ids[-1], ids[0]]
+    response = client.patch("/api/project-cards:batch", json={"reorder": moved})
+    assert response.status_code == 200, response.text
+
+    cards = _cards(client)
+    assert [card["id"] for card in cards] == moved + [card_id for card_id in ids if card_id not in moved]
+    assert [card["order"] for card in cards] == list(range(1, len(cards) + 1))
+    # Re-sending the same order changes nothing
+    response = client.patch("/api/project-cards:batch", json={"reorder": moved})
+    assert response.json()["updated"] == []
+
+
+@pytest.mark.parametrize("reorder, status", [([1, 1], 422), ([999_999], 404)])
+def test_invalid_reorder_is_rejected(client, reorder, status):
+    before = _cards(client)
+    response = client.patch("/api/project-cards:batch", json={"reorder": reorder})
+    assert response.status_code == status
+    assert _cards(client) == before
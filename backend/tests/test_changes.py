@@ -0,0 +1,72 @@
+import changes
+
+
+def _cursor(client) -> int:
+    return client.get("/api/changes/cursor").json()["cursor"]
+
+
+def _changes(client, since: int) -> dict:
+    response = client.get("/api/changes", params={"since": since})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _event(client, name: str) -> dict:
+    response = client.post("/api/events", json={"name": name, "date_time": "2024-09-01 18:00",
+                                                "location": "Room 1", "event_type": "sync-test"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_changes_since_returns_only_the_delta(client):
+    client.get("/api/page-data")
+    since = _cursor(client)
+    created = _event(client, "Kickoff")
+    assert client.put("/api/project-cards/2", json={"description": "Changed for sync"}).status_code == 200
+
+    body = _changes(client, since)
+    assert body["snapshot"] is False
+    assert body["cursor"] > since
+    by_key = {(change["entity"], change["id"]): change for change in body["changes"]}
+    assert set(by_key) == {("event", created["id"]), ("project-card", 2)}
+    assert by_key[("event", created["id"])]["op"] == "upsert"
+    assert by_key[("event", created["id"])]["data"]["name"] == "Kickoff"
+    assert by_key[("project-card", 2)]["data"]["description"] == "Changed for sync"
+
+    # Nothing new since the returned cursor
+    assert _changes(client, body["cursor"]) == {"cursor": body["cursor"], "snapshot": False, "changes": []}
+
+
+def test_each_row_reports_its_final_state(client):
+    since = _cursor(client)
+    kept, dropped = _event(client, "Kept"), _event(client, "Dropped")
+    assert client.put(f"/api/events/{kept['id']}", json={"name": "Kept, renamed"}).status_code == 200
+    assert client.delete(f"/api/events/{dropped['id']}").status_code == 200
+
+    body = _changes(client, since)
+    assert sorted((change["id"], change["op"]) for change in body["changes"]) == [
+        (kept["id"], "upsert"), (dropped["id"], "delete"),
+    ]
+    assert next(change for change in body["changes"] if change["op"] == "upsert")["data"]["name"] == "Kept, renamed"
+
+
+def test_since_before_the_compacted_log_falls_back_to_a_snapshot(client, monkeypatch):
+    monkeypatch.setattr(changes, "CHANGE_LOG_RETENTION", 2)
+    monkeypatch.setattr(changes, "CHANGE_LOG_COMPACT_EVERY", 1)
+    since = _cursor(client)
+    created = [_event(client, f"Compacted {index}") for index in range(4)]
+
+    body = _changes(client, since)
+    assert body["snapshot"] is True
+    assert body["cursor"] == _cursor(client)
+    assert {event["id"] for event in created} <= {event["id"] for event in body["events"]}
+    assert body["page_data"] is not None
+    assert len(body["project_cards"]) >= 3
+
+    # The entries the compaction kept still answer incrementally
+    assert _changes(client, body["cursor"] - 1)["snapshot"] is False
+
+
+def test_unknown_cursor_falls_back_to_a_snapshot(client):
+    assert _changes(client, _cursor(client) + 1000)["snapshot"] is True
+    assert client.get("/api/changes").json()["snapshot"] is True
@@ -0,0 +1,158 @@
+import asyncio
+import itertools
+import random
+import time
+
+import pytest
+
+from collab import (
+    CollabDocument, CollabEngine, CollabError, Sequence, UPDATE_OPS, decode_update, encode_snapshot,
+    encode_update, parse_doc_id,
+)
+
+DOC_ID = "page:content:notes"
+BASE = "shared notes"
+
+
+def _replica(site: str) -> Sequence:
+    sequence = Sequence(site)
+    sequence.load_text(BASE, "~base")
+    return sequence
+
+
+def _engine_with_document(text: str = BASE):
+    engine = CollabEngine(snapshot_every=10_000)
+    saved = []
+    engine.set_saver(lambda op, session_id: saved.append(op.value))
+    engine.documents[DOC_ID] = CollabDocument(DOC_ID, parse_doc_id(DOC_ID), text)
+    return engine, saved
+
+
+def _concurrent_edits():
+    """Three editors change the same text without seeing each other's edits"""
+    alice, bob, carol = _replica("alice"), _replica("bob"), _replica("carol")
+    return [
+        alice.local_insert(0, "my ") + alice.local_delete(3, 6),
+        bob.local_insert(0, "our ") + bob.local_insert(len(BASE) + 4, "!"),
+        carol.local_delete(0, 7) + carol.local_insert(5, " and more"),
+    ]
+
+
+def test_concurrent_edits_converge_in_any_order():
+    batches = _concurrent_edits()
+    texts = set()
+    for order in itertools.permutations(batches):
+        replica = _replica("observer")
+        for batch in order:
+            replica.apply(batch)
+        texts.add(replica.text())
+    assert len(texts) == 1
+
+
+def test_operations_out_of_causal_order_wait_for_their_dependencies():
+    ops = [op for batch in _concurrent_edits() for op in batch]
+    expected = _replica("observer")
+    expected.apply(ops)
+    for seed in range(20):
+        shuffled = ops[:]
+        random.Random(seed).shuffle(shuffled)
+        replica = _replica("observer")
+        replica.apply(shuffled)
+        assert replica.pending == 0
+        assert replica.text() == expected.text()
+
+
+def test_duplicates_are_ignored():
+    batch = _concurrent_edits()[0]
+    replica = _replica("observer")
+    assert replica.apply(batch) == batch
+    assert replica.apply(batch) == []
+
+
+def test_update_round_trip():
+    writer = _replica("writer")
+    ops = writer.local_insert(0, "héllo 😀 ") + writer.local_insert(3, "xy") + writer.local_delete(1, 4)
+    kind, decoded = decode_update(encode_update(ops))
+    assert kind == "ops"
+    assert decoded == ops
+
+
+def test_snapshot_round_trip():
+    writer = _replica("writer")
+    writer.apply(_concurrent_edits()[2])
+    writer.local_insert(2, "zz")
+    kind, (items, vector) = decode_update(encode_snapshot(writer))
+    assert kind == "snapshot"
+    assert vector == writer.vector
+    assert [(item.id, item.deleted) for item in items] == [(item.id, item.deleted) for item in writer.items]
+    reader = Sequence("reader")
+    reader.load_snapshot(items, vector)
+    assert reader.text() == writer.text()
+
+
+def test_compact_keeps_the_text():
+    async def run():
+        engine, saved = _engine_with_document()
+        for batch in _concurrent_edits():
+            await engine.apply_update(DOC_ID, encode_update(batch), "s1")
+        document = engine.documents[DOC_ID]
+        before = document.sequence.text()
+        engine.compact(document)
+        return before, document, saved
+
+    before, document, saved = asyncio.run(run())
+    assert document.sequence.text() == before
+    assert document.log == []
+    assert saved == [before]
+    # A client joining afterwards gets a snapshot with the same text
+    replica = Sequence("late")
+    replica.load_snapshot(*decode_update(encode_snapshot(document.sequence))[1])
+    assert replica.text() == before
+
+
+def _forged_delete(count: int) -> bytes:
+    """One delete op of a single range of ``count`` ids: a few bytes on the wire"""
+    out = bytearray([UPDATE_OPS, 2, 1, ord("a"), 1, ord("b"), 1, 2, 0, 5, 1, 1, 1])
+    while count >= 0x80:
+        out.append((count & 0x7F) | 0x80)
+        count >>= 7
+    out.append(count)
+    return bytes(out)
+
+
+def test_oversized_delete_count_is_rejected_quickly():
+    async def run():
+        engine, _ = _engine_with_document()
+        start = time.perf_counter()
+        with pytest.raises(CollabError):
+            await engine.apply_update(DOC_ID, _forged_delete(50_000_000), "s1")
+        return time.perf_counter() - start
+
+    assert len(_forged_delete(50_000_000)) < 20
+    assert asyncio.run(run()) < 0.5
+    with pytest.raises(CollabError):
+        decode_update(_forged_delete(len(BASE) + 1), max_items=len(BASE))
+    assert len(decode_update(_forged_delete(len(BASE)), max_items=len(BASE))[1][0][2]) == len(BASE)
+
+
+def test_counts_beyond_the_frame_are_rejected():
+    # 1,000,000 sites announced in a six-byte update
+    with pytest.raises(CollabError):
+        decode_update(bytes([UPDATE_OPS, 0xC0, 0x84, 0x3D, 1, ord("a")]))
+
+
+def test_clients_cannot_send_snapshots():
+    async def run():
+        engine, _ = _engine_with_document()
+        with pytest.raises(CollabError, match="only send operations"):
+            await engine.apply_update(DOC_ID, encode_snapshot(_replica("x")), "s1")
+
+    asyncio.run(run())
+
+
+def test_insert_must_sort_after_its_origin():
+    writer = _replica("writer")
+    (op,) = writer.local_insert(2, "x")
+    forged = ("i", (1, "writer"), op[2], "x")  # clock 1, origin clock 2
+    with pytest.raises(CollabError):
+        decode_update(encode_update([forged]))
@@ -0,0 +1,118 @@
+import pytest
+
+from conditional import item_etag
+from json_patch import JSON_PATCH, MERGE_PATCH, PatchError, PatchTestFailed, apply_json_patch, merge_patch
+
+DOCUMENT = {"title": "Plan", "formatting": {"bold": True, "tags": ["a", "b"]}}
+
+
+def test_add_replace_remove():
+    patched = apply_json_patch(DOCUMENT, [
+        {"op": "add", "path": "/formatting/color", "value": "red"},
+        {"op": "add", "path": "/formatting/tags/-", "value": "c"},
+        {"op": "add", "path": "/formatting/tags/0", "value": "z"},
+        {"op": "replace", "path": "/title", "value": "Roadmap"},
+        {"op": "remove", "path": "/formatting/bold"},
+    ])
+    assert patched == {"title": "Roadmap", "formatting": {"color": "red", "tags": ["z", "a", "b", "c"]}}
+    # The input is never modified
+    assert DOCUMENT == {"title": "Plan", "formatting": {"bold": True, "tags": ["a", "b"]}}
+
+
+def test_move_copy_test():
+    patched = apply_json_patch(DOCUMENT, [
+        {"op": "test", "path": "/formatting/tags/1", "value": "b"},
+        {"op": "copy", "from": "/title", "path": "/formatting/label"},
+        {"op": "move", "from": "/formatting/tags/0", "path": "/formatting/tags/-"},
+    ])
+    assert patched["formatting"] == {"bold": True, "tags": ["b", "a"], "label": "Plan"}
+
+
+def test_escaped_pointer_tokens():
+    patched = apply_json_patch({"a/b": 1, "m~n": 2}, [
+        {"op": "replace", "path": "/a~1b", "value": 10},
+        {"op": "remove", "path": "/m~0n"},
+    ])
+    assert patched == {"a/b": 10}
+
+
+@pytest.mark.parametrize("operations", [
+    [{"op": "replace", "path": "/missing", "value": 1}],
+    [{"op": "add", "path": "title", "value": 1}],
+    [{"op": "add", "path": "/formatting/tags/5", "value": 1}],
+    [{"op": "add", "path": "/formatting/tags/01", "value": 1}],
+    [{"op": "move", "from": "/formatting", "path": "/formatting/inner"}],
+    [{"op": "copy", "path": "/title"}],
+    [{"op": "frobnicate", "path": "/title"}],
+    {"op": "add", "path": "/title", "value": 1},
+])
+def test_invalid_operations_raise(operations):
+    with pytest.raises(PatchError):
+        apply_json_patch(DOCUMENT, operations)
+
+
+def test_failed_test_is_its_own_error():
+    with pytest.raises(PatchTestFailed):
+        apply_json_patch(DOCUMENT, [{"op": "test", "path": "/title", "value": "Other"}])
+
+
+def test_a_failing_patch_applies_nothing():
+    document = {"title": "Plan"}
+    with pytest.raises(PatchError):
+        apply_json_patch(document, [{"op": "replace", "path": "/title", "value": "New"},
+                                    {"op": "remove", "path": "/missing"}])
+    assert document == {"title": "Plan"}
+
+
+def test_merge_patch():
+    patched = merge_patch(DOCUMENT, {"title": "Roadmap", "formatting": {"bold": None, "color": "red"}})
+    assert patched == {"title": "Roadmap", "formatting": {"tags": ["a", "b"], "color": "red"}}
+    # Arrays are replaced, not merged; a non-object patch replaces the target
+    assert merge_patch(DOCUMENT, {"formatting": {"tags": ["x"]}})["formatting"]["tags"] == ["x"]
+    assert merge_patch(DOCUMENT, ["x"]) == ["x"]
+
+
+def _patch_card(client, body, content_type):
+    return client.patch("/api/project-cards/1", json=body, headers={"Content-Type": content_type})
+
+
+def _card(client, card_id: int) -> dict:
+    return next(card for card in client.get("/api/project-cards").json() if card["id"] == card_id)
+
+
+def test_patch_endpoint_applies_and_bumps_version(client):
+    version = _card(client, 1)["version"]
+    response = _patch_card(client, [{"op": "replace", "path": "/description", "value": "Patched"}], JSON_PATCH)
+    assert response.status_code == 200, response.text
+    assert response.json()["changed"] == ["description"]
+    assert response.json()["version"] == version + 1
+    assert response.headers["ETag"] == item_etag("project-card", 1, version + 1)
+    assert _card(client, 1)["description"] == "Patched"
+
+
+def test_patch_endpoint_failed_test_is_409(client):
+    response = _patch_card(client, [{"op": "test", "path": "/title", "value": "not the title"}], JSON_PATCH)
+    assert response.status_code == 409
+
+
+def test_patch_endpoint_invalid_pointer_is_422(client):
+    response = _patch_card(client, [{"op": "replace", "path": "title", "value": "x"}], JSON_PATCH)
+    assert response.status_code == 422
+    response = _patch_card(client, [{"op": "remove", "path": "/formatting/missing"}], JSON_PATCH)
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("body, content_type", [
+    ({"title": None}, MERGE_PATCH),
+    ([{"op": "remove", "path": "/description"}], JSON_PATCH),
+])
+def test_patch_endpoint_refuses_removing_a_field(client, body, content_type):
+    response = _patch_card(client, body, content_type)
+    assert response.status_code == 422
+    assert "cannot be removed" in response.json()["detail"]
+
+
+def test_patch_endpoint_merge_null_deletes_a_nested_key(client):
+    assert _patch_card(client, {"formatting": {"color": "red", "size": 2}}, MERGE_PATCH).status_code == 200
+    assert _patch_card(client, {"formatting": {"color": None}}, MERGE_PATCH).status_code == 200
+    assert _card(client, 1)["formatting"] == {"size": 2}
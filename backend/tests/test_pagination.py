@@ -0,0 +1,92 @@
+import base64
+
+import pytest
+
+from pagination import encode_cursor
+
+EVENT_TYPE = "paging-test"
+
+
+def _pages(client, url, limit, **params):
+    """Every page of a keyset-paged list, following X-Next-Cursor"""
+    pages, after = [], None
+    while True:
+        response = client.get(url, params={**params, "limit": limit, **({"after": after} if after else {})})
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        after = response.headers.get("X-Next-Cursor")
+        if after is None:
+            return pages
+
+
+@pytest.fixture(scope="module")
+def events(client):
+    """Events sharing start times, plus undated ones that sort last"""
+    dates = ["2024-06-01 10:00"] * 4 + ["2024-05-01 09:00"] * 3 + ["TBD"] * 4 + ["2024-07-01"]
+    created = []
+    for index, date_time in enumerate(dates):
+        response = client.post("/api/events", json={"name": f"Event {index}", "date_time": date_time,
+                                                    "location": "Hall", "event_type": EVENT_TYPE})
+        assert response.status_code == 200, response.text
+        created.append(response.json())
+    return created
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5, 100])
+def test_event_pages_visit_every_row_once(client, events, limit):
+    pages = _pages(client, "/api/events", limit, event_type=EVENT_TYPE)
+    ids = [event["id"] for page in pages for event in page]
+    assert sorted(ids) == sorted(event["id"] for event in events)
+    assert len(ids) == len(set(ids))
+    assert all(len(page) <= limit for page in pages)
+    # (starts_at, id) order with the undated events last
+    keys = [(event["starts_at"] is None, event["starts_at"] or "", event["id"]) for page in pages for event in page]
+    assert keys == sorted(keys)
+
+
+@pytest.fixture(scope="module")
+def tied_cards(client):
+    """Cards sharing the seeded cards' order values"""
+    for index in range(5):
+        response = client.post("/api/project-cards", json={"title": f"Tied {index}", "description": "", "order": 2})
+        assert response.status_code == 200, response.text
+
+
+@pytest.mark.parametrize("limit", [1, 2, 4])
+def test_card_pages_visit_every_row_once(client, tied_cards, limit):
+    expected = [card["id"] for card in client.get("/api/project-cards").json()]
+    ids = [card["id"] for page in _pages(client, "/api/project-cards", limit) for card in page]
+    assert ids == expected
+    assert len(ids) == len(set(ids))
+
+
+def _token(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("url, cursor", [
+    ("/api/project-cards", "!!!not-base64"),
+    ("/api/project-cards", _token(b"{not json")),
+    ("/api/project-cards", _token(b'{"order": 1}')),
+    ("/api/project-cards", encode_cursor([1])),
+    ("/api/project-cards", encode_cursor([1, 2, 3])),
+    ("/api/project-cards", encode_cursor(["1", 2])),
+    ("/api/project-cards", encode_cursor([None, 2])),
+    ("/api/project-cards", encode_cursor([1.5, 2])),
+    ("/api/events", encode_cursor(["not a date", 2])),
+    ("/api/events", encode_cursor(["2024-06-01T10:00:00", "2"])),
+    ("/api/events", encode_cursor([20240601, 2])),
+])
+def test_malformed_or_tampered_cursor_is_400(client, url, cursor):
+    response = client.get(url, params={"limit": 2, "after": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Malformed cursor"
+
+
+def test_event_cursor_past_the_undated_rows(client, events):
+    # A cursor sitting on an undated event continues among the undated ones only
+    undated = sorted(event["id"] for event in events if event["starts_at"] is None)
+    response = client.get("/api/events", params={"event_type": EVENT_TYPE, "limit": 10,
+                                                 "after": encode_cursor([None, undated[0]])})
+    assert response.status_code == 200
+    assert [event["id"] for event in response.json()] == undated[1:]
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+import wire
+from websocket_manager import encode
+
+TIMESTAMP = "2024-05-01T12:30:00.250000+00:00"
+EPOCH_MS = 1714566600250
+
+MESSAGES = [
+    {"type": "edit", "data": {"entity": "page", "field": "content", "key": "notes", "value": "Hi"},
+     "session_id": "s1", "timestamp": TIMESTAMP, "room": "page"},
+    {"type": "data_updated", "data": {"entity": "project-card", "id": 3}, "session_id": "s1"},
+    {"type": "image_updated", "data": {"image_url": "/api/images/abc"}, "session_id": "s2"},
+    {"type": "patch", "data": {"op": "replace", "path": "/title", "value": "New"}, "room": "project-card:1"},
+    {"type": "user_disconnected", "session_id": "s3"},
+    {"type": "ping", "data": {"id": 7}},
+    {"type": "pong", "data": {"id": 7}},
+    {"type": "subscribe", "rooms": ["page", "project-card:7"]},
+    {"type": "unsubscribe", "rooms": ["page"]},
+    {"type": "collab_sync", "doc": "page:content:notes", "vector": {"~": 12, "abc": 3}},
+    {"type": "collab_reset", "doc": "project-card:1:description"},
+    {"type": "collab_error", "doc": None, "detail": "Unknown document"},
+    {"type": "edit_error", "detail": "Unknown field", "data": {"entity": "page", "field": "nope"}},
+    {"type": "error", "detail": "Malformed message: Expecting value"},
+    {"type": "custom", "data": [1, 2.5, None, True], "extra_field": {"kept": "by name"}},
+]
+
+
+@pytest.mark.parametrize("message", MESSAGES, ids=lambda message: message["type"])
+def test_json_round_trip(message):
+    assert json.loads(encode(message)) == message
+
+
+@pytest.mark.parametrize("message", MESSAGES, ids=lambda message: message["type"])
+def test_msgpack_round_trip(message):
+    expected = dict(message, timestamp=EPOCH_MS) if "timestamp" in message else message
+    assert wire.decode_binary(wire.encode_binary(message)) == expected
+
+
+def test_msgpack_batch_round_trip():
+    batch = {"type": "batch", "timestamp": TIMESTAMP, "messages": MESSAGES[:3]}
+    decoded = wire.decode_binary(wire.encode_binary(batch))
+    assert decoded["timestamp"] == EPOCH_MS
+    assert decoded["messages"] == [dict(MESSAGES[0], timestamp=EPOCH_MS)] + MESSAGES[1:3]
+
+
+def test_known_fields_use_one_byte_keys():
+    assert len(wire.encode_binary({"type": "ping"})) < len(json.dumps({"type": "ping"}))
+
+
+@pytest.mark.parametrize("frame", [
+    b"\xc1",  # never used in msgpack
+    b"\x92\x01",  # array of two with one element
+    wire.encode_binary({"type": "ping"})[:-2],
+    b"\x93\x01\x80\x00",  # three-element envelope
+    b"\x92\x02\x81\xa4type\xa4ping",  # unknown wire version
+    b"\x92\x01\x81\x7f\xa4ping",  # field key past the schema
+])
+def test_decode_rejects_malformed_frames(frame):
+    with pytest.raises(wire.WireError):
+        wire.decode_binary(frame)
+
+
+def test_negotiate():
+    assert wire.negotiate(["other", wire.MSGPACK, wire.JSON]) == wire.MSGPACK
+    assert wire.negotiate([wire.JSON]) == wire.JSON
+    assert wire.negotiate(["other"]) is None
+
+
+def test_malformed_text_frame_gets_an_error_reply(client):
+    with client.websocket_connect("/ws/wire-json") as websocket:
+        for frame in ("{not json", "[1, 2]"):
+            websocket.send_text(frame)
+            reply = websocket.receive_json()
+            assert reply["type"] == "error"
+            assert reply["detail"].startswith("Malformed message")
+        # The connection still serves requests afterwards
+        websocket.send_json({"type": "collab_sync"})
+        assert websocket.receive_json()["type"] == "collab_error"
+
+
+def test_malformed_binary_frame_gets_an_error_reply(client):
+    with client.websocket_connect("/ws/wire-msgpack", subprotocols=[wire.MSGPACK]) as websocket:
+        assert websocket.accepted_subprotocol == wire.MSGPACK
+        websocket.send_bytes(b"\xc1")
+        reply = wire.decode_binary(websocket.receive_bytes())
+        assert reply["type"] == "error"
+        assert reply["detail"].startswith("Malformed message")
+        websocket.send_bytes(wire.encode_binary({"type": "collab_sync"}))
+        assert wire.decode_binary(websocket.receive_bytes())["type"] == "collab_error"
@@ -0,0 +1,57 @@
+import asyncio
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import schemas  # noqa: E402
+from write_behind import WriteBehindBuffer  # noqa: E402
+
+
+def edit(value: str) -> schemas.EditOperation:
+    return schemas.EditOperation(entity="page", field="main_title", value=value)
+
+
+def test_stop_waits_for_a_running_flush():
+    async def run():
+        buffer = WriteBehindBuffer(interval_ms=10, max_lag_ms=10)
+        written = []
+
+        async def slow_write(batch):
+            await asyncio.sleep(0.2)
+            written.append(batch[("page", None)].fields["main_title"])
+            return {"page"}
+
+        buffer._write_once = slow_write
+        await buffer.start()
+        buffer.apply(edit("first"), "s1")
+        await asyncio.sleep(0.05)  # the flusher has taken the batch
+        assert buffer.pending_rows == 0
+        await buffer.stop()
+        return buffer, written
+
+    buffer, written = asyncio.run(run())
+    assert written == ["first"]
+    assert buffer.pending_rows == 0
+
+
+def test_cancelled_flush_keeps_its_batch():
+    async def run():
+        buffer = WriteBehindBuffer()
+
+        async def hanging_write(batch):
+            await asyncio.sleep(10)
+
+        buffer._write_once = hanging_write
+        buffer.apply(edit("kept"), "s1")
+        flush = asyncio.get_running_loop().create_task(buffer.flush())
+        await asyncio.sleep(0.05)
+        flush.cancel()
+        try:
+            await flush
+        except asyncio.CancelledError:
+            pass
+        return buffer
+
+    buffer = asyncio.run(run())
+    assert buffer.pending_rows == 1
+    assert buffer._pending[("page", None)].fields == {"main_title": "kept"}
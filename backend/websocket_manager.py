@@ -1,43 +1,281 @@
 import json
 import asyncio
-from typing import Set, Dict
+import itertools
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Set, Tuple, Union
 from fastapi import WebSocket
+from backplane import Backplane
+from config import WS_BACKPRESSURE_POLICY, WS_PER_MESSAGE_DEFLATE, WS_SEND_QUEUE_SIZE, WS_SEND_TIMEOUT
+from metrics import COUNT_BUCKETS, Counter, Gauge, Histogram
+import wire
+
+POLICIES = ("drop_oldest", "coalesce", "disconnect")
+# "Something changed, resync" notices: only the newest one per sender matters
+NOTIFICATION_TYPES = {"data_updated", "image_updated", "user_disconnected"}
+
+
+def coalesce_key_for(message: dict) -> Optional[str]:
+    if message.get("type") in NOTIFICATION_TYPES:
+        return f"{message['type']}:{message.get('session_id')}"
+    return None
+
+
+def room_for(entity: str, entity_id: Optional[int] = None) -> str:
+    """Room name for one synced row ("project-card:7") or a whole entity ("page")"""
+    return entity if entity_id is None else f"{entity}:{entity_id}"
+
+
+def encode(message: dict) -> str:
+    """Serialize the way WebSocket.send_json does, once per broadcast"""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+class ClientConnection:
+    """One socket's bounded outbound queue, drained by its own writer task.
+
+    A slow client only ever delays its own queue; when the queue is full the
+    manager's back-pressure policy decides what gives.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, websocket: WebSocket, session_id: str, manager: "ConnectionManager",
+                 protocol: Optional[str] = None):
+        # Unique per socket: several tabs may share one session_id
+        self.id = next(self._ids)
+        self.websocket = websocket
+        self.session_id = session_id
+        self.manager = manager
+        self.binary = protocol == wire.MSGPACK
+        self.rooms: Set[str] = set()
+        # (coalesce key, encoded text or binary frame, enqueued at)
+        self.queue: Deque[Tuple[Optional[str], Union[str, bytes], float]] = deque()
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.writer = asyncio.get_running_loop().create_task(self._write_loop())
+
+    def enqueue(self, text: Union[str, bytes], coalesce_key: Optional[str] = None) -> bool:
+        """Queue a message; returns False if the client must be disconnected"""
+        if self.closed:
+            return True
+        item = (coalesce_key, text, time.perf_counter())
+        if len(self.queue) >= self.manager.queue_size:
+            policy = self.manager.policy
+            if policy == "disconnect":
+                return False
+            if policy == "coalesce" and coalesce_key is not None:
+                for index, (key, _, _) in enumerate(self.queue):
+                    if key == coalesce_key:
+                        # Keep the queue position, deliver only the newest payload
+                        self.queue[index] = item
+                        self.manager.coalesced.inc()
+                        return True
+            self.queue.popleft()
+            self.manager.dropped.inc()
+        self.queue.append(item)
+        self._ready.set()
+        return True
+
+    def send(self, message: dict) -> bool:
+        """Queue a message encoded in this connection's protocol"""
+        frame = wire.encode_binary(message) if self.binary else encode(message)
+        return self.enqueue(frame, coalesce_key_for(message))
+
+    async def _write_loop(self):
+        while True:
+            await self._ready.wait()
+            while self.queue:
+                _, text, enqueued_at = self.queue.popleft()
+                try:
+                    send = self.websocket.send_bytes if isinstance(text, bytes) else self.websocket.send_text
+                    await asyncio.wait_for(send(text), WS_SEND_TIMEOUT)
+                except Exception as e:
+                    print(f"Error sending message to {self.session_id}: {e!r}")
+                    self.manager.send_failures.inc()
+                    self.manager.disconnect(self)
+                    return
+                self.manager.frames_out.inc()
+                self.manager.delivery_latency.observe(time.perf_counter() - enqueued_at)
+            self._ready.clear()
+
+    def close(self):
+        self.closed = True
+        self.queue.clear()
+        if self.writer is not asyncio.current_task():
+            self.writer.cancel()
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Set[tuple[WebSocket, str]] = set()
-        self.connection_data: Dict[str, dict] = {}
-
-    async def connect(self, websocket: WebSocket, session_id: str):
-        await websocket.accept()
-        self.active_connections.add((websocket, session_id))
-        self.connection_data[session_id] = {"connected_at": asyncio.get_event_loop().time()}
-        print(f"Client {session_id} connected. Total connections: {len(self.active_connections)}")
-
-    def disconnect(self, websocket: WebSocket, session_id: str):
-        self.active_connections.discard((websocket, session_id))
-        if session_id in self.connection_data:
-            del self.connection_data[session_id]
-        print(f"Client {session_id} disconnected. Total connections: {len(self.active_connections)}")
-
-    async def broadcast(self, message: dict, exclude_session: str = None):
-        """Send message to all connected clients except the one that sent it"""
-        disconnected = []
-        
-        # Create a copy to avoid "Set changed size during iteration" error
-        for websocket, session_id in list(self.active_connections):
-            if exclude_session and session_id == exclude_session:
+    """Registry of live connections, indexed by connection id, session and room.
+
+    Adding or removing a connection touches only its own index entries, and a
+    room-scoped broadcast visits only that room's members.
+    """
+
+    def __init__(self, queue_size: int = WS_SEND_QUEUE_SIZE, policy: str = WS_BACKPRESSURE_POLICY):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown WS_BACKPRESSURE_POLICY: {policy}")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.connections: Dict[int, ClientConnection] = {}
+        self.sessions: Dict[str, Set[ClientConnection]] = {}
+        self.rooms: Dict[str, Set[ClientConnection]] = {}
+        # Per-connection metadata, keyed by connection id
+        self.connection_data: Dict[int, dict] = {}
+        self._closing: Set[asyncio.Task] = set()
+        self.backplane: Optional[Backplane] = None
+        self.heartbeat = None  # HeartbeatScheduler, see heartbeat.py
+        self.delivery_latency = Histogram("ws_delivery_seconds", "Time from broadcast to a completed send")
+        self.dropped = Counter("ws_dropped_total", "Queued messages dropped for slow clients")
+        self.coalesced = Counter("ws_coalesced_total", "Queued messages replaced by a newer one")
+        self.slow_disconnects = Counter("ws_slow_disconnects_total", "Clients disconnected for a full queue")
+        self.frames_in = Counter("ws_received_frames_total", "Frames received from clients")
+        self.frames_out = Counter("ws_sent_frames_total", "Frames sent to clients")
+        self.send_failures = Counter("ws_send_failures_total", "Sends that failed or timed out")
+        self.fan_out_time = Histogram("ws_fan_out_seconds", "Time to queue one broadcast for its recipients")
+        self.fan_out_size = Histogram("ws_fan_out_recipients", "Connections one broadcast was queued for",
+                                      buckets=COUNT_BUCKETS)
+        self.active = Gauge("ws_connections", "Open WebSocket connections", lambda: len(self.connections))
+
+    async def connect(self, websocket: WebSocket, session_id: str, rooms: Iterable[str] = ()) -> ClientConnection:
+        protocol = wire.negotiate(websocket.scope.get("subprotocols", ()))
+        await websocket.accept(subprotocol=protocol)
+        connection = ClientConnection(websocket, session_id, self, protocol)
+        self.connections[connection.id] = connection
+        self.sessions.setdefault(session_id, set()).add(connection)
+        extensions = dict(websocket.headers).get("sec-websocket-extensions", "")
+        self.connection_data[connection.id] = {
+            "session_id": session_id,
+            "connected_at": asyncio.get_event_loop().time(),
+            "protocol": protocol or wire.JSON,
+            # uvicorn accepts permessage-deflate whenever the client offers it
+            "deflate": WS_PER_MESSAGE_DEFLATE and "permessage-deflate" in extensions,
+        }
+        for room in rooms:
+            self.join(connection, room)
+        if self.heartbeat is not None:
+            self.heartbeat.add(connection)
+        print(f"Client {session_id} connected. Total connections: {len(self.connections)}")
+        return connection
+
+    def disconnect(self, connection: ClientConnection):
+        if self.connections.pop(connection.id, None) is None:
+            return
+        connection.close()
+        if self.heartbeat is not None:
+            self.heartbeat.remove(connection)
+        for room in list(connection.rooms):
+            self.leave(connection, room)
+        self._discard(self.sessions, connection.session_id, connection)
+        self.connection_data.pop(connection.id, None)
+        print(f"Client {connection.session_id} disconnected. Total connections: {len(self.connections)}")
+
+    def join(self, connection: ClientConnection, room: str):
+        self.rooms.setdefault(room, set()).add(connection)
+        connection.rooms.add(room)
+
+    def leave(self, connection: ClientConnection, room: str):
+        self._discard(self.rooms, room, connection)
+        connection.rooms.discard(room)
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[ClientConnection]], key: str, connection: ClientConnection):
+        members = index.get(key)
+        if members is not None:
+            members.discard(connection)
+            if not members:
+                del index[key]
+
+    async def start_backplane(self, backplane: Backplane):
+        """Exchange broadcasts with the managers of other workers and nodes"""
+        await backplane.start(self._deliver_remote)
+        self.backplane = backplane
+
+    async def start_heartbeat(self, heartbeat):
+        """Ping every connection from one scheduler task and reap the silent ones"""
+        self.heartbeat = heartbeat
+        for connection in self.connections.values():
+            heartbeat.add(connection)
+        await heartbeat.start()
+
+    async def _deliver_remote(self, envelope: dict):
+        self._fan_out(envelope["text"], envelope.get("room"), envelope.get("exclude"), envelope.get("key"))
+
+    async def broadcast(self, message: dict, exclude_session: str = None, room: Optional[str] = None,
+                        coalesce_key: Optional[str] = None):
+        """Queue a message for every client (or a room's members) except the sender's session.
+
+        The message is encoded once, handed to each local client's writer task
+        and published once to the backplane for the clients of other nodes; no
+        socket is awaited.
+        """
+        text = encode(message)
+        if coalesce_key is None:
+            coalesce_key = coalesce_key_for(message)
+        self._fan_out(text, room, exclude_session, coalesce_key, message)
+        if self.backplane is not None:
+            await self.backplane.publish(self.backplane.envelope(text, room, exclude_session, coalesce_key))
+
+    def _fan_out(self, text: Union[str, bytes], room: Optional[str], exclude_session: Optional[str],
+                 coalesce_key: Optional[str], message: Optional[dict] = None):
+        start = time.perf_counter()
+        queued = 0
+        recipients = self.connections.values() if room is None else self.rooms.get(room, ())
+        excluded = self.sessions.get(exclude_session, ()) if exclude_session else ()
+        overflowing = []
+        binary = None
+        # Enqueueing never awaits, so the indexes cannot change under this loop
+        for connection in recipients:
+            if connection in excluded:
                 continue
-            
-            try:
-                await websocket.send_json(message)
-            except Exception as e:
-                print(f"Error sending message to {session_id}: {e}")
-                disconnected.append((websocket, session_id))
-        
-        # Remove disconnected clients
-        for ws, sid in disconnected:
-            self.disconnect(ws, sid)
+            frame = text
+            if connection.binary and isinstance(text, str):
+                # Encoded at most once per broadcast, like the JSON text
+                if binary is None:
+                    binary = wire.encode_binary(message if message is not None else json.loads(text))
+                frame = binary
+            if not connection.enqueue(frame, coalesce_key):
+                overflowing.append(connection)
+            queued += 1
+        self.fan_out_time.observe(time.perf_counter() - start)
+        self.fan_out_size.observe(queued)
+
+        for connection in overflowing:
+            print(f"Disconnecting slow client {connection.session_id}: send queue full")
+            self.slow_disconnects.inc()
+            self.disconnect(connection)
+            self.close_later(connection.websocket)
+
+    def broadcast_binary(self, frame: bytes, room: str, exclude_session: Optional[str] = None):
+        """Queue a binary frame for a room's members on this node.
+
+        Binary frames are not published to the backplane: collaborative
+        documents only exist when this is the sole process (see collab.py).
+        """
+        self._fan_out(frame, room, exclude_session, None)
+
+    async def broadcast_to_room(self, room: str, message: dict, exclude_session: str = None):
+        await self.broadcast(message, exclude_session=exclude_session, room=room)
+
+    async def send_to_session(self, session_id: str, message: dict):
+        """Queue a message for every connection (tab) of one session on this node"""
+        for connection in self.sessions.get(session_id, ()):
+            connection.send(message)
+
+    def close_later(self, websocket: WebSocket, code: int = 1013):
+        """Close a socket that is already disconnected, without waiting for it"""
+        task = asyncio.get_running_loop().create_task(self._close_socket(websocket, code))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_socket(websocket: WebSocket, code: int = 1013):
+        try:
+            # 1013 (default): try again later
+            await websocket.close(code=code)
+        except Exception:
+            pass
 
     async def send_to_client(self, websocket: WebSocket, message: dict):
         """Send message to specific client"""
@@ -47,6 +285,39 @@ class ConnectionManager:
             print(f"Error sending message to client: {e}")
 
     def get_active_clients_count(self) -> int:
-        return len(self.active_connections)
+        return len(self.connections)
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "sessions": len(self.sessions),
+            "rooms": len(self.rooms),
+            "binary_clients": sum(1 for connection in self.connections.values() if connection.binary),
+            "deflate_clients": sum(1 for data in self.connection_data.values() if data.get("deflate")),
+            "queued": sum(len(connection.queue) for connection in self.connections.values()),
+            "delivery": self.delivery_latency.summary(),
+            "dropped": self.dropped.value,
+            "coalesced": self.coalesced.value,
+            "slow_disconnects": self.slow_disconnects.value,
+            "frames_in": self.frames_in.value,
+            "frames_out": self.frames_out.value,
+            "send_failures": self.send_failures.value,
+            "fan_out": {**self.fan_out_time.summary(), "mean_recipients": round(
+                self.fan_out_size.sum / self.fan_out_size.count, 1) if self.fan_out_size.count else 0.0},
+            "backplane": self.backplane.stats() if self.backplane else None,
+            "heartbeat": self.heartbeat.stats() if self.heartbeat else None,
+        }
+
+    async def shutdown(self):
+        """Stop every writer task and close the sockets"""
+        if self.heartbeat is not None:
+            await self.heartbeat.stop()
+        if self.backplane is not None:
+            await self.backplane.stop()
+            self.backplane = None
+        for connection in list(self.connections.values()):
+            self.disconnect(connection)
+            await self._close_socket(connection.websocket)
 
 manager = ConnectionManager()
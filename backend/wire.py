@@ -0,0 +1,88 @@
+"""WebSocket wire formats, negotiated per connection with Sec-WebSocket-Protocol.
+
+``falnote.json`` (also what clients asking for nothing get) is the original
+JSON text frames. ``falnote.msgpack.v1`` sends binary MessagePack frames
+holding ``[version, {key: value}]``: fields of schemas.WebSocketMessage are
+keyed by their position in the model, so ``type``, ``data`` and
+``session_id`` cost one byte each, and timestamps travel as epoch
+milliseconds. Keys the schema does not know keep their name. Binary
+collaboration frames (collab.py) pass through unchanged under either.
+
+Compression is separate: uvicorn negotiates permessage-deflate with clients
+that offer it unless WS_PER_MESSAGE_DEFLATE is off.
+"""
+from datetime import datetime
+from typing import Any, Iterable, Optional
+import schemas
+
+try:
+    import msgpack
+except ImportError:  # msgpack missing: only JSON is offered
+    msgpack = None
+
+JSON = "falnote.json"
+MSGPACK = "falnote.msgpack.v1"
+WIRE_VERSION = 1
+FIELDS = list(schemas.WebSocketMessage.model_fields)
+FIELD_KEYS = {name: index for index, name in enumerate(FIELDS)}
+
+
+class WireError(ValueError):
+    pass
+
+
+def negotiate(offered: Iterable[str]) -> Optional[str]:
+    """The first offered subprotocol this server speaks, or None for plain JSON"""
+    for protocol in offered:
+        if protocol == JSON or (protocol == MSGPACK and msgpack is not None):
+            return protocol
+    return None
+
+
+def _epoch_ms(timestamp: str) -> Any:
+    try:
+        return round(datetime.fromisoformat(timestamp).timestamp() * 1000)
+    except ValueError:
+        return timestamp
+
+
+def _compact(message: dict) -> dict:
+    compact = {}
+    for key, value in message.items():
+        if key == "timestamp" and isinstance(value, str):
+            value = _epoch_ms(value)
+        elif key == "messages" and isinstance(value, list):
+            value = [_compact(item) if isinstance(item, dict) else item for item in value]
+        compact[FIELD_KEYS.get(key, key)] = value
+    return compact
+
+
+def _expand(compact: dict) -> dict:
+    message = {}
+    for key, value in compact.items():
+        if isinstance(key, int):
+            if key >= len(FIELDS):
+                raise WireError(f"Unknown field key {key}")
+            key = FIELDS[key]
+        if key == "messages" and isinstance(value, list):
+            value = [_expand(item) if isinstance(item, dict) else item for item in value]
+        message[key] = value
+    return message
+
+
+def encode_binary(message: dict) -> bytes:
+    return msgpack.packb([WIRE_VERSION, _compact(message)], use_bin_type=True)
+
+
+def decode_binary(frame: bytes) -> dict:
+    if msgpack is None:
+        raise WireError("Binary protocol is not available")
+    try:
+        envelope = msgpack.unpackb(frame, raw=False, strict_map_key=False)
+    except (ValueError, msgpack.UnpackException) as e:
+        raise WireError(f"Malformed frame: {e}") from e
+    if not isinstance(envelope, list) or len(envelope) != 2 or not isinstance(envelope[1], dict):
+        raise WireError("Malformed envelope")
+    if envelope[0] != WIRE_VERSION:
+        raise WireError(f"Unsupported wire version {envelope[0]}")
+    return _expand(envelope[1])
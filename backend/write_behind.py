@@ -0,0 +1,252 @@
+"""Write-behind persistence for edits made over the WebSocket.
+
+Edit operations are validated and merged into an in-memory buffer of dirty
+fields per row, so a burst of keystrokes on one field collapses to its
+latest value. A background task writes the buffer in a single transaction
+once editing pauses for WRITE_BEHIND_INTERVAL_MS, and at least every
+WRITE_BEHIND_MAX_LAG_MS while it continues. REST reads of the edited data
+flush first, so nothing acknowledged is ever served stale. A failed (or
+cancelled) flush keeps its edits for the next attempt, and shutdown lets a
+running flush finish before draining whatever is left.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm.exc import StaleDataError
+from config import WRITE_BEHIND_INTERVAL_MS, WRITE_BEHIND_MAX_LAG_MS
+from database import session_scope
+from metrics import Counter, Histogram
+import models
+import schemas
+
+# entity -> {field: type}; dict fields are JSON document columns
+EDITABLE = {
+    "page": {"main_title": str, "main_subtitle": str, "content": dict},
+    "project-card": {"title": str, "description": str, "formatting": dict, "order": int},
+}
+
+RowKey = Tuple[str, Optional[int]]
+FlushHook = Callable[[Set[str]], Awaitable[None]]
+
+
+class EditError(ValueError):
+    pass
+
+
+class PendingRow:
+    """Latest unsaved values for one row"""
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.keys: Dict[str, Dict[str, Any]] = {}  # JSON field -> {key: value}
+        self.modified_by: Optional[str] = None
+        self.since = time.monotonic()
+
+    def merge_older(self, older: "PendingRow"):
+        """Fold in edits from a failed flush without overriding newer ones"""
+        self.fields = {**older.fields, **self.fields}
+        for field, keys in older.keys.items():
+            if field not in self.fields:
+                self.keys[field] = {**keys, **self.keys.get(field, {})}
+        self.modified_by = self.modified_by or older.modified_by
+        self.since = min(self.since, older.since)
+
+
+class WriteBehindBuffer:
+    def __init__(self, interval_ms: float = WRITE_BEHIND_INTERVAL_MS, max_lag_ms: float = WRITE_BEHIND_MAX_LAG_MS):
+        self.interval = interval_ms / 1000
+        self.max_lag = max_lag_ms / 1000
+        self._pending: Dict[RowKey, PendingRow] = {}
+        self._last_edit = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self._on_flush: Optional[FlushHook] = None
+        self.ops = Counter("write_behind_ops_total", "Edit operations accepted")
+        self.flushes = Counter("write_behind_flushes_total", "Transactions committed by the flusher")
+        self.rows_written = Counter("write_behind_rows_total", "Rows updated by the flusher")
+        self.failures = Counter("write_behind_failures_total", "Flushes that failed and were retried")
+        self.flush_time = Histogram("write_behind_flush_seconds", "Duration of one flush transaction")
+
+    def apply(self, op: schemas.EditOperation, session_id: str):
+        """Validate an edit and merge it into the buffer"""
+        if op.entity not in EDITABLE:
+            raise EditError(f"Unknown entity: {op.entity}")
+        fields = EDITABLE[op.entity]
+        if op.field not in fields:
+            raise EditError(f"Field {op.field!r} of {op.entity} cannot be edited")
+        if op.entity != "page" and op.id is None:
+            raise EditError(f"{op.entity} edits need an id")
+        expected = fields[op.field]
+        if op.key is not None:
+            if expected is not dict:
+                raise EditError(f"Field {op.field!r} has no keys")
+        elif not isinstance(op.value, expected) or isinstance(op.value, bool) and expected is int:
+            raise EditError(f"Field {op.field!r} expects {expected.__name__}")
+
+        row_key = (op.entity, op.id if op.entity != "page" else None)
+        row = self._pending.get(row_key)
+        if row is None:
+            row = self._pending[row_key] = PendingRow()
+        if op.key is not None:
+            if op.field in row.fields:
+                # A whole-value edit is already pending: apply the key to it
+                row.fields[op.field] = {**row.fields[op.field], op.key: op.value}
+            else:
+                row.keys.setdefault(op.field, {})[op.key] = op.value
+        else:
+            row.fields[op.field] = op.value
+            row.keys.pop(op.field, None)
+        row.modified_by = session_id
+        self._last_edit = time.monotonic()
+        self.ops.inc()
+
+    @property
+    def pending_rows(self) -> int:
+        return len(self._pending)
+
+    async def start(self, on_flush: Optional[FlushHook] = None):
+        """Start the flusher; ``on_flush`` gets the entities written by each flush"""
+        self._on_flush = on_flush
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            if not self._pending:
+                continue
+            now = time.monotonic()
+            oldest = min(row.since for row in self._pending.values())
+            if now - self._last_edit >= self.interval or now - oldest >= self.max_lag:
+                try:
+                    await self.flush()
+                except Exception as e:
+                    print(f"[WRITE-BEHIND] Flush failed, retrying: {e!r}")
+
+    async def flush(self):
+        """Write every buffered edit in one transaction"""
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            start = time.perf_counter()
+            try:
+                written = await self._write(batch)
+            except BaseException:
+                # Cancellation included: the batch must never leave the buffer unwritten
+                self.failures.inc()
+                for row_key, row in batch.items():
+                    newer = self._pending.get(row_key)
+                    if newer is None:
+                        self._pending[row_key] = row
+                    else:
+                        newer.merge_older(row)
+                raise
+            self.flush_time.observe(time.perf_counter() - start)
+            self.flushes.inc()
+            self.rows_written.inc(len(batch))
+        if self._on_flush is not None:
+            await self._on_flush(written)
+
+    async def _write(self, batch: Dict[RowKey, PendingRow]) -> Set[str]:
+        try:
+            return await self._write_once(batch)
+        except StaleDataError:
+            # A REST write bumped a version under us: reload and reapply once
+            return await self._write_once(batch)
+
+    async def _write_once(self, batch: Dict[RowKey, PendingRow]) -> Set[str]:
+        async with session_scope() as db:
+            try:
+                written = await self._apply_batch(db, batch)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        return written
+
+    @staticmethod
+    async def _apply_batch(db, batch: Dict[RowKey, PendingRow]) -> Set[str]:
+        page_edits = batch.get(("page", None))
+        card_ids = [row_id for entity, row_id in batch if entity == "project-card"]
+        written = set()
+
+        if page_edits is not None:
+            page = await db.scalar(select(models.PageData).limit(1))
+            if page is None:
+                page = models.PageData()
+                db.add(page)
+            _assign(page, page_edits)
+            page.modified_by = page_edits.modified_by
+            written.add("page")
+
+        if card_ids:
+            cards = (await db.scalars(select(models.ProjectCard).where(models.ProjectCard.id.in_(card_ids)))).all()
+            for card in cards:
+                _assign(card, batch[("project-card", card.id)])
+                written.add("project-card")
+            missing = set(card_ids) - {card.id for card in cards}
+            if missing:
+                print(f"[WRITE-BEHIND] Dropped edits for deleted cards {sorted(missing)}")
+
+        await db.flush()
+        return written
+
+    async def stop(self, attempts: int = 3):
+        """Stop the flusher and write out everything still buffered.
+
+        The flusher is asked to stop rather than cancelled, so a flush that is
+        already running completes (or fails and keeps its batch) first.
+        """
+        if self._task is not None:
+            self._stopping.set()
+            try:
+                await self._task
+            except Exception as e:
+                print(f"[WRITE-BEHIND] Flusher stopped with an error: {e!r}")
+            self._task = None
+        for attempt in range(1, attempts + 1):
+            try:
+                await self.flush()
+                return
+            except Exception as e:
+                print(f"[WRITE-BEHIND] Final flush attempt {attempt} failed: {e!r}")
+                await asyncio.sleep(0.5 * attempt)
+        print(f"[WRITE-BEHIND] Lost unsaved edits for {len(self._pending)} rows")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        oldest = min((row.since for row in self._pending.values()), default=None)
+        return {
+            "pending_rows": len(self._pending),
+            "lag_ms": round((now - oldest) * 1000, 1) if oldest is not None else 0.0,
+            "ops": self.ops.value,
+            "flushes": self.flushes.value,
+            "rows_written": self.rows_written.value,
+            "failures": self.failures.value,
+            "flush": self.flush_time.summary(),
+        }
+
+
+def _assign(row, edits: PendingRow):
+    for field, value in edits.fields.items():
+        setattr(row, field, value)
+    for field, keys in edits.keys.items():
+        # A new dict, so the JSON column registers the change
+        current = dict(getattr(row, field) or {})
+        for key, value in keys.items():
+            if value is None:
+                current.pop(key, None)
+            else:
+                current[key] = value
+        setattr(row, field, current)
+
+
+write_behind = WriteBehindBuffer()
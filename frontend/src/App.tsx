@@ -1,11 +1,11 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import './styles/App.css'
 import Header from './components/Header'
 import EditDialog from './components/EditDialog'
 import ImageModal from './components/ImageModal'
 import FormattingToolbar from './components/FormattingToolbar'
 import TableSection from './components/TableSection'
-import { pageDataApi, projectCardsApi } from './api'
+import { pageDataApi, projectCardsApi, changesApi, imageUrl } from './api'
 import { useWebSocket } from './hooks'
 import type { PageData, ProjectCard } from './types'
 import { API_BASE_URL } from './types'
@@ -54,97 +54,138 @@ function App() {
   // UI state
   const [isSaving, setIsSaving] = useState(false)
 
+  // Change-log position our data reflects; null until the first load has it
+  const changeCursor = useRef<number | null>(null)
+  const cardsRef = useRef<ProjectCard[]>([])
+
   const { send } = useWebSocket(sessionId, (data) => {
-    if ((data.type === 'data_updated' || data.type === 'image_updated') && data.session_id !== sessionId) {
-      // Reload data from backend
-      loadPageData()
-      loadProjectCards()
+    if ((data.type === 'data_updated' || data.type === 'image_updated' || data.type === 'patch') && data.session_id !== sessionId) {
+      syncChanges()
     }
-  })
+  }, () => syncChanges())
 
   useEffect(() => {
     console.log('[App] Component mounted, loading data')
-    loadPageData()
-    loadProjectCards()
+    loadAll()
   }, [])
 
+  const loadAll = async () => {
+    // Take the cursor first so nothing that commits during the load is skipped
+    try {
+      changeCursor.current = (await changesApi.cursor()).data.cursor
+    } catch {
+      changeCursor.current = null
+    }
+    await Promise.all([loadPageData(), loadProjectCards()])
+  }
+
+  // Fetch only what changed since our cursor (after a reconnect or a peer's edit)
+  const syncChanges = async () => {
+    if (changeCursor.current === null) {
+      return loadAll()
+    }
+    try {
+      const { data } = await changesApi.since(changeCursor.current)
+      if (data.snapshot) {
+        if (data.page_data) applyPageData(data.page_data)
+        applyProjectCards(data.project_cards)
+      } else {
+        const pageChange = data.changes.filter((c: any) => c.entity === 'page' && c.op === 'upsert').pop()
+        if (pageChange) applyPageData(pageChange.data)
+        const cardChanges = data.changes.filter((c: any) => c.entity === 'project-card')
+        if (cardChanges.length > 0) {
+          const cards = new Map(cardsRef.current.map((card) => [card.id, card]))
+          cardChanges.forEach((c: any) => (c.op === 'delete' ? cards.delete(c.id) : cards.set(c.id, c.data)))
+          applyProjectCards(Array.from(cards.values()).sort((a, b) => a.order - b.order))
+        }
+      }
+      changeCursor.current = data.cursor
+    } catch (error) {
+      console.error('Failed to sync changes, reloading:', error)
+      await loadAll()
+    }
+  }
+
   const loadPageData = async () => {
     try {
       setLoadError(null)
       console.log('[App] Loading page data from API...')
       const response = await pageDataApi.get()
       console.log('[App] Page data loaded:', response.data)
-      setPageData(response.data)
-      setEditTitle(response.data.main_title || '')
-      setEditSubtitle(response.data.main_subtitle || '')
-      setEditContent(response.data.content || {})
-      setPartnerLogo(response.data.partner_logo || null)
-      // Load formatting from content
-      const fmt: Record<string, TextFormatting> = {}
-      Object.keys(response.data.content || {}).forEach((key) => {
-        if (key.endsWith('_formatting')) {
-          try {
-            fmt[key] = JSON.parse(response.data.content[key])
-          } catch {
-            fmt[key] = {}
-          }
-        }
-      })
-      // Load title and subtitle formatting
-      if (response.data.content?.['main_title_formatting']) {
+      applyPageData(response.data)
+    } catch (error: any) {
+      const msg = error?.message || 'Unknown error'
+      console.error('Failed to load page data:', error)
+      setLoadError(`Failed to load page: ${msg}`)
+    }
+  }
+
+  const applyPageData = (data: any) => {
+    setPageData(data)
+    setEditTitle(data.main_title || '')
+    setEditSubtitle(data.main_subtitle || '')
+    setEditContent(data.content || {})
+    setPartnerLogo(data.partner_logo || null)
+    // Load formatting from content
+    const fmt: Record<string, TextFormatting> = {}
+    Object.keys(data.content || {}).forEach((key) => {
+      if (key.endsWith('_formatting')) {
         try {
-          fmt['main_title_formatting'] = JSON.parse(response.data.content['main_title_formatting'])
+          fmt[key] = JSON.parse(data.content[key])
         } catch {
-          fmt['main_title_formatting'] = {}
+          fmt[key] = {}
         }
       }
-      if (response.data.content?.['main_subtitle_formatting']) {
-        try {
-          fmt['main_subtitle_formatting'] = JSON.parse(response.data.content['main_subtitle_formatting'])
-        } catch {
-          fmt['main_subtitle_formatting'] = {}
-        }
+    })
+    // Load title and subtitle formatting
+    if (data.content?.['main_title_formatting']) {
+      try {
+        fmt['main_title_formatting'] = JSON.parse(data.content['main_title_formatting'])
+      } catch {
+        fmt['main_title_formatting'] = {}
       }
-      setFormatting(fmt)
-      
-      // Load table data
-      if (response.data.content?.['section5_table_data']) {
-        try {
-          const tableData = JSON.parse(response.data.content['section5_table_data'])
-          setTableRows(tableData.rows || [])
-          setTableColumns(tableData.columns || ['Column 1', 'Column 2', 'Column 3'])
-        } catch {
-          setTableRows([])
-        }
+    }
+    if (data.content?.['main_subtitle_formatting']) {
+      try {
+        fmt['main_subtitle_formatting'] = JSON.parse(data.content['main_subtitle_formatting'])
+      } catch {
+        fmt['main_subtitle_formatting'] = {}
       }
-      
-      if (response.data.content?.['section5_title']) {
-        setTableTitle(response.data.content['section5_title'])
+    }
+    setFormatting(fmt)
+    
+    // Load table data
+    if (data.content?.['section5_table_data']) {
+      try {
+        const tableData = JSON.parse(data.content['section5_table_data'])
+        setTableRows(tableData.rows || [])
+        setTableColumns(tableData.columns || ['Column 1', 'Column 2', 'Column 3'])
+      } catch {
+        setTableRows([])
       }
-      
-      // Load table formatting
-      const tableFmt: Record<string, TextFormatting> = {}
-      if (response.data.content?.['section5_title_formatting']) {
-        try {
-          tableFmt['section5_title_formatting'] = JSON.parse(response.data.content['section5_title_formatting'])
-        } catch {
-          tableFmt['section5_title_formatting'] = {}
-        }
+    }
+    
+    if (data.content?.['section5_title']) {
+      setTableTitle(data.content['section5_title'])
+    }
+    
+    // Load table formatting
+    const tableFmt: Record<string, TextFormatting> = {}
+    if (data.content?.['section5_title_formatting']) {
+      try {
+        tableFmt['section5_title_formatting'] = JSON.parse(data.content['section5_title_formatting'])
+      } catch {
+        tableFmt['section5_title_formatting'] = {}
       }
-      if (response.data.content?.['section5_cell_formatting']) {
-        try {
-          tableFmt['section5_cell_formatting'] = JSON.parse(response.data.content['section5_cell_formatting'])
-        } catch {
-          tableFmt['section5_cell_formatting'] = {}
-        }
+    }
+    if (data.content?.['section5_cell_formatting']) {
+      try {
+        tableFmt['section5_cell_formatting'] = JSON.parse(data.content['section5_cell_formatting'])
+      } catch {
+        tableFmt['section5_cell_formatting'] = {}
       }
-      setTableFormatting(tableFmt)
-
-    } catch (error: any) {
-      const msg = error?.message || 'Unknown error'
-      console.error('Failed to load page data:', error)
-      setLoadError(`Failed to load page: ${msg}`)
     }
+    setTableFormatting(tableFmt)
   }
 
   const loadProjectCards = async () => {
@@ -152,36 +193,41 @@ function App() {
       console.log('[App] Loading project cards from API...')
       const response = await projectCardsApi.getAll()
       console.log('[App] Project cards loaded:', response.data)
-      setProjectCards(response.data || [])
-      // Initialize edit cards state with fresh data - ensure all 3 cards exist
-      const cards: Record<number, { title: string; description: string }> = {}
-      const cardFmt: Record<string, TextFormatting> = {}
-      ;(response.data || []).forEach((card: any) => {
-        cards[card.id] = { 
-          title: card.title || '', 
-          description: card.description || '' 
-        }
-        // Load formatting for each card
-        if (card.formatting && typeof card.formatting === 'object') {
-          if (card.formatting.title) {
-            cardFmt[`card_${card.id}_title`] = card.formatting.title
-          }
-          if (card.formatting.description) {
-            cardFmt[`card_${card.id}_description`] = card.formatting.description
-          }
+      applyProjectCards(response.data || [])
+    } catch (error) {
+      console.error('Failed to load project cards:', error)
+    }
+  }
+
+  const applyProjectCards = (data: ProjectCard[]) => {
+    cardsRef.current = data
+    setProjectCards(data || [])
+    // Initialize edit cards state with fresh data - ensure all 3 cards exist
+    const cards: Record<number, { title: string; description: string }> = {}
+    const cardFmt: Record<string, TextFormatting> = {}
+    ;(data || []).forEach((card: any) => {
+      cards[card.id] = { 
+        title: card.title || '', 
+        description: card.description || '' 
+      }
+      // Load formatting for each card
+      if (card.formatting && typeof card.formatting === 'object') {
+        if (card.formatting.title) {
+          cardFmt[`card_${card.id}_title`] = card.formatting.title
         }
-      })
-      // Ensure we have at least 3 cards in the edit state
-      for (let i = 1; i <= 3; i++) {
-        if (!cards[i]) {
-          cards[i] = { title: '', description: '' }
+        if (card.formatting.description) {
+          cardFmt[`card_${card.id}_description`] = card.formatting.description
         }
       }
-      setEditCards(cards)
-      setCardFormatting(cardFmt)
-    } catch (error) {
-      console.error('Failed to load project cards:', error)
+    })
+    // Ensure we have at least 3 cards in the edit state
+    for (let i = 1; i <= 3; i++) {
+      if (!cards[i]) {
+        cards[i] = { title: '', description: '' }
+      }
     }
+    setEditCards(cards)
+    setCardFormatting(cardFmt)
   }
 
   
@@ -403,7 +449,7 @@ const handleSaveAllChanges = async () => {
         <div
           className="app-background"
           style={{
-            backgroundImage: `url('data:image/png;base64,${pageData.background_image}')`,
+            backgroundImage: `url('${imageUrl(pageData.background_image, 1280)}')`,
             backgroundSize: 'cover',
             backgroundPosition: 'center',
             backgroundAttachment: 'fixed',
@@ -506,10 +552,10 @@ const handleSaveAllChanges = async () => {
                   <div className="snapshot-image-container">
                     {card.image ? (
                       <img
-                        src={`data:image/png;base64,${card.image}`}
+                        src={imageUrl(card.image, 640)}
                         alt={card.title}
                         className="snapshot-image"
-                        onClick={() => card.image && setSelectedImage(`data:image/png;base64,${card.image}`)}
+                        onClick={() => card.image && setSelectedImage(imageUrl(card.image))}
                         style={{ cursor: 'pointer' }}
                       />
                     ) : (
@@ -1,6 +1,11 @@
 import axios from 'axios'
 import { API_BASE_URL } from './types'
 
+// PATCH bodies: an RFC 7396 merge patch object or an RFC 6902 operation array
+const patchHeaders = (patch: any) => ({
+  'Content-Type': Array.isArray(patch) ? 'application/json-patch+json' : 'application/merge-patch+json',
+})
+
 const api = axios.create({
   baseURL: API_BASE_URL,
   headers: {
@@ -11,6 +16,7 @@ const api = axios.create({
 export const pageDataApi = {
   get: () => api.get('/api/page-data'),
   update: (data: any) => api.put('/api/page-data', data),
+  patch: (patch: any) => api.patch('/api/page-data', patch, { headers: patchHeaders(patch) }),
   uploadImage: (file: File) => {
     const formData = new FormData()
     formData.append('file', file)
@@ -31,6 +37,7 @@ export const projectCardsApi = {
   getAll: () => api.get('/api/project-cards'),
   create: (data: any) => api.post('/api/project-cards', data),
   update: (id: number, data: any) => api.put(`/api/project-cards/${id}`, data),
+  patch: (id: number, patch: any) => api.patch(`/api/project-cards/${id}`, patch, { headers: patchHeaders(patch) }),
   delete: (id: number) => api.delete(`/api/project-cards/${id}`),
   uploadImage: (id: number, file: File) => {
     const formData = new FormData()
@@ -48,6 +55,17 @@ export const eventsApi = {
   delete: (id: number) => api.delete(`/api/events/${id}`),
 }
 
+// Images are referenced by content hash; the bytes are served (and cached) separately.
+// Pass a width to get a server-resized derivative instead of the original upload.
+export const imageUrl = (id: string, width?: number) =>
+  `${API_BASE_URL}/api/images/${id}${width ? `?w=${width}` : ''}`
+
+// Delta sync: changes after a change-log cursor, or a full snapshot if it is too old
+export const changesApi = {
+  cursor: () => api.get('/api/changes/cursor'),
+  since: (cursor: number) => api.get('/api/changes', { params: { since: cursor } }),
+}
+
 export const statusApi = {
   get: () => api.get('/api/status'),
 }
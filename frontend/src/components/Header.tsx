@@ -1,4 +1,5 @@
 import React, { useState } from 'react'
+import { imageUrl } from '../api'
 
 interface TextFormatting {
   color?: string
@@ -174,7 +175,7 @@ const Header: React.FC<HeaderProps> = ({
         <img src="/logo1.png" alt="Logo" className="logo" onClick={onEditClick} title="Click to edit" />
         {partnerLogo && (
           <img 
-            src={`data:image/png;base64,${partnerLogo}`} 
+            src={imageUrl(partnerLogo, 320)} 
             alt="Partner Logo" 
             className="logo partner-logo"
             title="Partner Hotel Logo"
@@ -1,10 +1,16 @@
 import { useEffect, useRef, useCallback } from 'react'
 import { WS_BASE_URL } from './types'
 
-export function useWebSocket(sessionId: string, onMessage: (data: any) => void) {
+export function useWebSocket(sessionId: string, onMessage: (data: any) => void, onReconnect?: () => void) {
   const wsRef = useRef<WebSocket | null>(null)
   const reconnectAttempts = useRef(0)
   const maxReconnectAttempts = 3
+  const hasConnected = useRef(false)
+  // Keep the latest callbacks without making connect() (and the socket) depend on them
+  const onMessageRef = useRef(onMessage)
+  const onReconnectRef = useRef(onReconnect)
+  onMessageRef.current = onMessage
+  onReconnectRef.current = onReconnect
 
   const connect = useCallback(() => {
     try {
@@ -15,12 +21,27 @@ export function useWebSocket(sessionId: string, onMessage: (data: any) => void)
       wsRef.current.onopen = () => {
         console.log('[WebSocket] Connected successfully')
         reconnectAttempts.current = 0
+        // Catch up on whatever changed while we were disconnected
+        if (hasConnected.current) {
+          onReconnectRef.current?.()
+        }
+        hasConnected.current = true
       }
 
       wsRef.current.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data)
-          onMessage(data)
+          // Heartbeat: a client that stops answering is disconnected by the server
+          if (data.type === 'ping') {
+            wsRef.current?.send(JSON.stringify({ type: 'pong', data: data.data }))
+            return
+          }
+          // The server batches bursts of messages from one sender into one frame
+          if (data.type === 'batch') {
+            data.messages.forEach((message: any) => onMessageRef.current(message))
+          } else {
+            onMessageRef.current(data)
+          }
         } catch (e) {
           console.error('[WebSocket] Failed to parse message:', e)
         }
@@ -46,7 +67,7 @@ export function useWebSocket(sessionId: string, onMessage: (data: any) => void)
     } catch (e) {
       console.error('[WebSocket] Failed to connect:', e)
     }
-  }, [sessionId, onMessage])
+  }, [sessionId])
 
   useEffect(() => {
     connect()
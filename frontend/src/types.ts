@@ -29,6 +29,7 @@ export interface Event {
   id: number
   name: string
   date_time: string
+  starts_at: string | null  // date_time parsed by the server, when it is a date
   location: string
   event_type: string
   created_at: string